@@ -0,0 +1,123 @@
+from collections import deque
+
+import numpy as np
+
+# width of the bird-eye view the thresholds in pixels are defined for: on pictures of other sizes they are scaled
+REFERENCE_WIDTH = 1280
+
+
+class AdaptiveRate:
+    '''
+    Lowers the rate of the frames going through the whole pipeline while the tracking of the lines is stable.
+    After every detection the fit is checked: if both lines were detected, the lines have barely moved since the
+    previous detection, and the width of the lane hasn't changed, more frames are skipped before the next detection
+    (1, 2, 4... up to max_interval). Otherwise every frame is detected again.
+    On the skipped frames the lines are extrapolated from the last two detections, so every frame is still annotated
+    '''
+
+    def __init__(self, max_interval=4, max_fit_change=3, max_width_change=0.1):
+        '''
+        :param max_interval: maximum number of frames skipped between two detections
+        :param max_fit_change: maximum mean distance in pixels (of a 1280 pixels wide bird-eye view) between the line
+        fitted on the last frame and the line fitted on the previous detection, per frame elapsed between them
+        :param max_width_change: maximum relative change of the width of the lane, compared to the width it had while
+        the tracking was stable
+        '''
+        self.max_interval = max_interval
+        self.max_fit_change = max_fit_change
+        self.max_width_change = max_width_change
+        # number of frames to skip after the last detection, and frames skipped since then
+        self.interval = 0
+        self.skipped = 0
+        # average width of the lane in pixels while the tracking is stable
+        self.lane_width = None
+        # frame index and average fits of the left and right line of the last two stable detections
+        self.detections = deque(maxlen=2)
+        # frame index and lines fitted on the last detection
+        self.last_fitted = None
+        self.detected_frames = 0
+        self.skipped_frames = 0
+
+    def copy(self):
+        '''
+        :return: an AdaptiveRate with the same settings and its own state, e.g. for another video
+        '''
+        return AdaptiveRate(self.max_interval, self.max_fit_change, self.max_width_change)
+
+    def should_detect(self):
+        '''
+        :return: whether the next frame has to go through the whole pipeline
+        '''
+        return self.skipped >= self.interval
+
+    def update(self, left, right, width, frame_index):
+        '''
+        Checks the lines just detected, and decides how many frames to skip before the next detection
+        :param left: the left line, updated with the last frame
+        :param right: the right line, updated with the last frame
+        :param width: width of the bird-eye view
+        :param frame_index: index of the frame
+        :return: Nothing
+        '''
+        self.detected_frames += 1
+        self.skipped = 0
+        stable = self.is_stable(left, right, width, frame_index)
+        self.last_fitted = (frame_index, left.current_plotx, right.current_plotx)
+        if stable:
+            self.interval = min(max(self.interval * 2, 1), self.max_interval)
+            self.detections.append((frame_index, left.best_fit, right.best_fit))
+        else:
+            self.interval = 0
+            self.detections.clear()
+
+    def is_stable(self, left, right, width, frame_index):
+        '''
+        :param left: the left line, updated with the last frame
+        :param right: the right line, updated with the last frame
+        :param width: width of the bird-eye view
+        :param frame_index: index of the frame
+        :return: whether the tracking of the lines is stable
+        '''
+        if (not (left.detected and right.detected) or left.best_plotx is None or right.best_plotx is None or
+                self.last_fitted is None):
+            self.lane_width = None
+            return False
+        last_index, last_left, last_right = self.last_fitted
+        if len(last_left) != len(left.current_plotx):
+            self.lane_width = None
+            return False
+        fit_change = max(np.mean(np.abs(left.current_plotx - last_left)),
+                         np.mean(np.abs(right.current_plotx - last_right))) / max(frame_index - last_index, 1)
+        lane_width = np.mean(right.best_plotx - left.best_plotx)
+        if fit_change > self.max_fit_change * width / float(REFERENCE_WIDTH) or lane_width <= 0:
+            self.lane_width = None
+            return False
+        if self.lane_width is None:
+            # the first good fit only sets the reference width
+            self.lane_width = lane_width
+            return False
+        if abs(lane_width - self.lane_width) > self.max_width_change * self.lane_width:
+            self.lane_width = None
+            return False
+        self.lane_width += 0.1 * (lane_width - self.lane_width)
+        return True
+
+    def extrapolate(self, left, right, frame_index):
+        '''
+        Lines for a skipped frame: the average fits of the last detection, moved by the change between the last
+        two detections
+        :param left: the left line
+        :param right: the right line
+        :param frame_index: index of the skipped frame
+        :return: copies of the left and right lines, whose best fit is extrapolated to the frame
+        '''
+        self.skipped += 1
+        self.skipped_frames += 1
+        if len(self.detections) < 2:
+            return left, right
+        (previous_index, previous_left, previous_right), (last_index, last_left, last_right) = self.detections
+        step = (frame_index - last_index) / float(last_index - previous_index)
+        extrapolated = []
+        for line, previous_fit, last_fit in ((left, previous_left, last_left), (right, previous_right, last_right)):
+            extrapolated.append(line.predicted(last_fit + (last_fit - previous_fit) * step))
+        return extrapolated[0], extrapolated[1]
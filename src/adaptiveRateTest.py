@@ -0,0 +1,64 @@
+from unittest import TestCase
+
+import numpy as np
+
+from adaptiveRate import AdaptiveRate
+from line import Line
+
+
+class AdaptiveRateTest(TestCase):
+    '''
+    Feeds the AdaptiveRate with synthetic lines, detecting only the frames it asks for
+    '''
+    def setUp(self):
+        self.ploty = np.arange(720.)
+        self.left = Line(history=1)
+        self.right = Line(history=1)
+
+    def run_frames(self, adaptive_rate, frames, lane_width=600):
+        '''
+        :return: the indexes of the detected frames, and the x of the bottom of the left line on every frame
+        '''
+        detected = []
+        bottoms = []
+        for frame_index in range(frames):
+            if adaptive_rate.should_detect():
+                # the lane moves right by one pixel per frame
+                self.left.update_fitted(np.array([0., 0., 300. + frame_index]), self.ploty)
+                self.right.update_fitted(np.array([0., 0., 300. + frame_index + lane_width]), self.ploty)
+                adaptive_rate.update(self.left, self.right, 1280, frame_index)
+                left = self.left
+                detected.append(frame_index)
+            else:
+                left, right = adaptive_rate.extrapolate(self.left, self.right, frame_index)
+            bottoms.append(left.best_plotx[-1])
+        return detected, bottoms
+
+    def test_stable_tracking(self):
+        adaptive_rate = AdaptiveRate(max_interval=4)
+        detected, bottoms = self.run_frames(adaptive_rate, 30)
+        # the first 2 frames set the reference, then 1, 2 and 4 frames are skipped
+        self.assertEqual([0, 1, 2, 4, 7, 12, 17, 22, 27], detected)
+        self.assertEqual(9, adaptive_rate.detected_frames)
+        self.assertEqual(21, adaptive_rate.skipped_frames)
+        # once two detections are known, the motion of the lines is extrapolated
+        self.assertEqual(list(range(300 + 4, 330)), bottoms[4:])
+
+    def test_unstable_tracking(self):
+        adaptive_rate = AdaptiveRate(max_interval=4)
+        self.run_frames(adaptive_rate, 10)
+        self.assertGreater(adaptive_rate.interval, 0)
+        # the lane is suddenly narrower: every frame is detected again
+        adaptive_rate.skipped = adaptive_rate.interval
+        self.left.update_fitted(np.array([0., 0., 310.]), self.ploty)
+        self.right.update_fitted(np.array([0., 0., 810.]), self.ploty)
+        adaptive_rate.update(self.left, self.right, 1280, 10)
+        self.assertEqual(0, adaptive_rate.interval)
+        self.assertTrue(adaptive_rate.should_detect())
+
+    def test_lines_not_detected(self):
+        adaptive_rate = AdaptiveRate()
+        self.run_frames(adaptive_rate, 10)
+        self.right.detected = False
+        adaptive_rate.update(self.left, self.right, 1280, 10)
+        self.assertEqual(0, adaptive_rate.interval)
@@ -0,0 +1,87 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+
+class BatchProcessor:
+    '''
+    Detects the lane lines on all the pictures of a directory.
+    Pictures are decoded and encoded by a thread pool, and processed in batches with Pipeline.process_batch, while the
+    results of the previous batch are still being written
+    '''
+
+    def __init__(self, pipeline, batch_size=16, workers=None, extensions=('.jpg', '.jpeg', '.png')):
+        '''
+        :param pipeline: the Pipeline used for all the pictures (its calibration and geometry are shared)
+        :param batch_size: number of pictures processed together
+        :param workers: number of threads, None uses the default of ThreadPoolExecutor
+        :param extensions: extensions of the files that are processed
+        '''
+        self.pipeline = pipeline
+        self.batch_size = batch_size
+        self.workers = workers
+        self.extensions = extensions
+
+    def process_directory(self, input_dir, output_dir):
+        '''
+        Processes the pictures of a directory, writing the annotated pictures with the same name to another directory.
+        A picture that can't be written doesn't stop the others: the failures are raised at the end
+        :param input_dir: File system path of the directory containing the pictures
+        :param output_dir: File system path of the directory where the annotated pictures are written
+        :return: the number of processed pictures
+        '''
+        names = sorted(name for name in os.listdir(input_dir) if name.lower().endswith(self.extensions))
+        os.makedirs(output_dir, exist_ok=True)
+        errors = []
+
+        with ThreadPoolExecutor(max_workers=self.workers) as io_executor:
+            pending_writes = []
+            for start in range(0, len(names), self.batch_size):
+                batch = names[start:start + self.batch_size]
+                images = list(io_executor.map(read_rgb, [os.path.join(input_dir, name) for name in batch]))
+                results = self.pipeline.process_batch(images, self.workers)
+                # don't keep more than one batch waiting to be written
+                errors += wait_writes(pending_writes)
+                pending_writes = [io_executor.submit(write_rgb, os.path.join(output_dir, name), result)
+                                  for name, result in zip(batch, results)]
+            errors += wait_writes(pending_writes)
+        if errors:
+            raise IOError('{} pictures not written: {}'.format(len(errors), '; '.join(errors)))
+        return len(names)
+
+
+def wait_writes(futures):
+    '''
+    :param futures: the futures of the pictures being written
+    :return: the messages of the writes that failed
+    '''
+    errors = []
+    for future in futures:
+        try:
+            future.result()
+        except (IOError, OSError) as e:
+            errors.append(str(e))
+    return errors
+
+
+def read_rgb(path):
+    '''
+    :param path: File system path of a picture
+    :return: the picture as 8 bit RGB, like the frames of the videos
+    '''
+    img = cv2.imread(path, cv2.IMREAD_COLOR)
+    if img is None:
+        raise IOError("can't read " + path)
+    return cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+
+
+def write_rgb(path, img):
+    '''
+    Writes a 8 bit RGB picture
+    :param path: File system path of the picture
+    :param img: the picture
+    :return: Nothing
+    '''
+    if not cv2.imwrite(path, cv2.cvtColor(img, cv2.COLOR_RGB2BGR)):
+        raise IOError("can't write " + path)
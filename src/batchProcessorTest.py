@@ -0,0 +1,48 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+import numpy as np
+
+from batchProcessor import BatchProcessor, read_rgb
+from pipeline import Pipeline
+
+
+class BatchProcessorTest(TestCase):
+    '''
+    Processes a directory of pictures in several batches
+    '''
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.input_dir = os.path.join(self.directory, 'input')
+        self.output_dir = os.path.join(self.directory, 'output')
+        os.makedirs(self.input_dir)
+        self.names = ['straight_lines1.jpg', 'test1.jpg', 'test2.jpg', 'test3.jpg', 'test4.jpg']
+        for name in self.names:
+            shutil.copy(os.path.join('../test_images', name), self.input_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_process_directory(self):
+        processor = BatchProcessor(Pipeline(), batch_size=2, workers=2)
+        self.assertEqual(len(self.names), processor.process_directory(self.input_dir, self.output_dir))
+        self.assertEqual(self.names, sorted(os.listdir(self.output_dir)))
+        for name in self.names:
+            expected = Pipeline().pipeline(read_rgb(os.path.join(self.input_dir, name)))
+            result = read_rgb(os.path.join(self.output_dir, name))
+            self.assertEqual(expected.shape, result.shape)
+            # written as jpg
+            self.assertLess(np.mean(np.abs(expected.astype(int) - result)), 3)
+
+    def test_failed_writes_do_not_stop_the_others(self):
+        # a directory where the picture should be written
+        os.makedirs(os.path.join(self.output_dir, 'test1.jpg'))
+        processor = BatchProcessor(Pipeline(), batch_size=2, workers=2)
+        with self.assertRaises(IOError) as raised:
+            processor.process_directory(self.input_dir, self.output_dir)
+        self.assertIn('test1.jpg', str(raised.exception))
+        for name in self.names:
+            if name != 'test1.jpg':
+                self.assertTrue(os.path.isfile(os.path.join(self.output_dir, name)), name)
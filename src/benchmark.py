@@ -0,0 +1,218 @@
+'''
+Headless benchmark of the stages of the pipeline.
+
+Every stage runs on the pictures of ../test_images/ and on synthetic 720p, 1080p and 4K frames (a test picture scaled
+to the resolution). For every stage and resolution the throughput, the latency percentiles and the peak memory
+allocated by the stage are reported.
+The results can be saved as a baseline, and compared with a previous baseline: the benchmark fails (exit code 1) when
+the median latency of a stage regresses more than a threshold.
+
+usage: python benchmark.py [--iterations 50] [--resolutions 720p,1080p,4k] [--save baseline.json]
+                           [--compare baseline.json] [--threshold 0.2]
+'''
+import argparse
+import glob
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+from cameraCalibrator import CameraCalibrator
+from edgesDetector import EdgesDetector
+from geometryEngine import GeometryEngine
+import linesDetector
+from line import Line
+from perspectiveTransformer import PerspectiveTransformer
+from pictureAnnotator import PictureAnnotator
+from pipeline import Pipeline
+import curvatureDetector
+
+RESOLUTIONS = OrderedDict([('720p', (1280, 720)), ('1080p', (1920, 1080)), ('4k', (3840, 2160))])
+
+
+def load_frames(resolution, pictures_pattern='../test_images/*.jpg'):
+    '''
+    :param resolution: name of the resolution: 'test_images' for the test pictures, or one of RESOLUTIONS
+    :param pictures_pattern: File system path of the test pictures
+    :return: list of RGB frames
+    '''
+    paths = sorted(glob.glob(pictures_pattern))
+    frames = [cv2.cvtColor(cv2.imread(path), cv2.COLOR_BGR2RGB) for path in paths]
+    if resolution == 'test_images':
+        return frames
+    return [cv2.resize(frames[0], RESOLUTIONS[resolution], interpolation=cv2.INTER_LINEAR)]
+
+
+def build_stages(frame, camera_calibrator):
+    '''
+    Prepares the input of every stage for a frame
+    :param frame: a RGB frame
+    :param camera_calibrator: the calibrated CameraCalibrator
+    :return: ordered dictionary of argument-less callables running the stages, by stage name
+    '''
+    height, width = frame.shape[:2]
+    # the calibration and the perspective transformation moved to the resolution of the frame
+    camera_calibrator = camera_calibrator.scaled(width, height)
+    perspective_transformer = PerspectiveTransformer().scaled(width, height)
+    geometry_engine = GeometryEngine(camera_calibrator, perspective_transformer)
+    edges_detector = EdgesDetector(compact=True)
+    picture_annotator = PictureAnnotator(perspective_transformer)
+
+    undistorted = camera_calibrator.undistort(frame)
+    edges = edges_detector.detectEdges(undistorted)
+    warped = perspective_transformer.to_bird_eye(edges)
+    binary_warped = linesDetector.toBinary(warped)
+    left, right, debug_img = linesDetector.fit_polynomial(warped, Line(), Line(), False)
+    if left.best_plotx is None or right.best_plotx is None:
+        # nothing detected on this frame: track two vertical lines
+        ploty = np.linspace(0, height - 1, height)
+        left.update_fitted(np.array([0., 0., width * 0.3]), ploty)
+        right.update_fitted(np.array([0., 0., width * 0.7]), ploty)
+    curvature = curvatureDetector.measure_curvature_real(left, right, width)
+    offset = curvatureDetector.measure_offset_real(left, right, width)
+    scratch_line = Line()
+    current_fit = left.current_fit
+    pipeline = Pipeline(camera_calibrator=camera_calibrator, perspective_transformer=perspective_transformer,
+                        edges_detector=edges_detector, picture_annotator=picture_annotator,
+                        geometry_engine=geometry_engine)
+    # detects the lines at half the resolution, and draws them on the frame
+    half_scale_pipeline = Pipeline(camera_calibrator=camera_calibrator, perspective_transformer=perspective_transformer,
+                                   edges_detector=edges_detector, picture_annotator=picture_annotator,
+                                   geometry_engine=geometry_engine, processing_scale=0.5)
+    # warps only the coordinates of the edges
+    sparse_pipeline = Pipeline(camera_calibrator=camera_calibrator, perspective_transformer=perspective_transformer,
+                               edges_detector=edges_detector, picture_annotator=picture_annotator,
+                               geometry_engine=geometry_engine, sparse=True)
+
+    return OrderedDict([
+        ('CameraCalibrator.undistort', lambda: camera_calibrator.undistort(frame)),
+        ('GeometryEngine.undistort', lambda: geometry_engine.undistort(frame)),
+        ('EdgesDetector.detectEdges', lambda: edges_detector.detectEdges(undistorted)),
+        ('PerspectiveTransformer.to_bird_eye', lambda: perspective_transformer.to_bird_eye(edges)),
+        ('GeometryEngine.to_bird_eye', lambda: geometry_engine.to_bird_eye(edges)),
+        ('find_lane_pixels', lambda: linesDetector.find_lane_pixels(binary_warped, False)),
+        ('convolution_search', lambda: linesDetector.convolution_search(binary_warped, False)),
+        ('find_lane_pixels_from_prior',
+         lambda: linesDetector.find_lane_pixels_from_prior(binary_warped, left, right, False)),
+        ('Line.update_fitted', lambda: scratch_line.update_fitted(current_fit, left.ploty)),
+        ('PictureAnnotator.decorate', lambda: picture_annotator.decorate(frame, left, right, curvature, offset)),
+        ('Pipeline', lambda: pipeline.pipeline(frame)),
+        ('Pipeline(processing_scale=0.5)', lambda: half_scale_pipeline.pipeline(frame)),
+        ('Pipeline(sparse=True)', lambda: sparse_pipeline.pipeline(frame)),
+    ])
+
+
+def measure(function, iterations, warmup=3):
+    '''
+    :param function: argument-less callable
+    :param iterations: number of measured calls
+    :param warmup: number of calls before measuring, e.g. for filling the caches
+    :return: the latencies of the calls in milliseconds, and the peak memory allocated by one call in KiB
+    '''
+    for i in range(warmup):
+        function()
+    latencies = []
+    for i in range(iterations):
+        start = time.perf_counter()
+        function()
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    # measured separately, since tracing the allocations slows the calls down
+    tracemalloc.start()
+    function()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return latencies, peak / 1024.
+
+
+def summarize(latencies, peak_memory_kb):
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return OrderedDict([('throughput', 1000. / np.mean(latencies)), ('mean', float(np.mean(latencies))),
+                        ('p50', float(p50)), ('p95', float(p95)), ('p99', float(p99)),
+                        ('peak_memory_kb', peak_memory_kb)])
+
+
+def run(resolutions, iterations, camera_calibrator=None):
+    '''
+    Benchmarks all the stages
+    :param resolutions: names of the resolutions: 'test_images' and/or the keys of RESOLUTIONS
+    :param iterations: number of measured calls per stage and frame
+    :param camera_calibrator: the CameraCalibrator to use, by default the cached calibration
+    :return: ordered dictionary of the results by "stage@resolution"
+    '''
+    if camera_calibrator is None:
+        camera_calibrator = CameraCalibrator()
+        camera_calibrator.initialize_transformation_matrix()
+    results = OrderedDict()
+    for resolution in resolutions:
+        latencies = OrderedDict()
+        peaks = OrderedDict()
+        for frame in load_frames(resolution):
+            for stage, function in build_stages(frame, camera_calibrator).items():
+                stage_latencies, peak = measure(function, iterations)
+                latencies.setdefault(stage, []).extend(stage_latencies)
+                peaks[stage] = max(peaks.get(stage, 0), peak)
+        for stage in latencies:
+            results[stage + '@' + resolution] = summarize(latencies[stage], peaks[stage])
+    return results
+
+
+def compare(results, baseline, threshold):
+    '''
+    :param results: results of the current run
+    :param baseline: results of a previous run
+    :param threshold: maximum allowed relative increase of the median latency, e.g. 0.2 for 20%
+    :return: list of (name, baseline p50, current p50) of the regressed stages
+    '''
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if reference is not None and result['p50'] > reference['p50'] * (1 + threshold):
+            regressions.append((name, reference['p50'], result['p50']))
+    return regressions
+
+
+def print_results(results):
+    print('{:55s} {:>10s} {:>9s} {:>9s} {:>9s} {:>12s}'.format('stage', 'frames/s', 'p50 ms', 'p95 ms', 'p99 ms',
+                                                              'peak KiB'))
+    for name, result in results.items():
+        print('{:55s} {:10.1f} {:9.2f} {:9.2f} {:9.2f} {:12.0f}'.format(
+            name, result['throughput'], result['p50'], result['p95'], result['p99'], result['peak_memory_kb']))
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Benchmark of the stages of the pipeline')
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--resolutions', default='test_images,' + ','.join(RESOLUTIONS))
+    parser.add_argument('--save', help='File system path where the results are saved as baseline')
+    parser.add_argument('--compare', help='File system path of a baseline to compare the results with')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='maximum allowed relative increase of the median latency')
+    args = parser.parse_args(argv)
+
+    results = run(args.resolutions.split(','), args.iterations)
+    print_results(results)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({'platform': platform.platform(), 'opencv': cv2.__version__, 'numpy': np.__version__,
+                       'iterations': args.iterations, 'results': results}, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.threshold)
+        for name, reference, current in regressions:
+            print('REGRESSION {}: p50 {:.2f} ms -> {:.2f} ms'.format(name, reference, current))
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,50 @@
+import contextlib
+import io
+import json
+import os
+import tempfile
+from unittest import TestCase
+
+from benchmark import compare, main, run
+
+
+class BenchmarkTest(TestCase):
+    '''
+    Checks how the benchmark results are compared with a baseline
+    '''
+    def test_compare(self):
+        baseline = {'detectEdges@720p': {'p50': 10.0}, 'decorate@720p': {'p50': 1.0}}
+        results = {'detectEdges@720p': {'p50': 11.5}, 'decorate@720p': {'p50': 1.3}, 'new@720p': {'p50': 5.0}}
+        self.assertEqual([('decorate@720p', 1.0, 1.3)], compare(results, baseline, 0.2))
+        self.assertEqual([], compare(results, baseline, 0.5))
+
+
+class RunTest(TestCase):
+    '''
+    Runs the benchmark for one iteration at 720p, from Python and from the command line
+    '''
+    def test_run(self):
+        results = run(['720p'], 1)
+        self.assertIn('Pipeline@720p', results)
+        self.assertTrue(all(name.endswith('@720p') for name in results))
+        for result in results.values():
+            self.assertEqual(['throughput', 'mean', 'p50', 'p95', 'p99', 'peak_memory_kb'], list(result))
+
+    def test_command_line(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            baseline_path = os.path.join(tmp, 'baseline.json')
+            with contextlib.redirect_stdout(io.StringIO()):
+                self.assertEqual(0, main(['--iterations', '1', '--resolutions', '720p', '--save', baseline_path]))
+            with open(baseline_path) as f:
+                baseline = json.load(f)
+            self.assertEqual(1, baseline['iterations'])
+            self.assertIn('Pipeline@720p', baseline['results'])
+
+            # a baseline no run can keep up with
+            baseline['results']['Pipeline@720p']['p50'] = 1e-6
+            with open(baseline_path, 'w') as f:
+                json.dump(baseline, f)
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                self.assertEqual(1, main(['--iterations', '1', '--resolutions', '720p', '--compare', baseline_path]))
+            self.assertIn('REGRESSION Pipeline@720p', output.getvalue())
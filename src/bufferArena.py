@@ -0,0 +1,66 @@
+import threading
+
+import numpy as np
+
+
+class BufferArena:
+    '''
+    Arrays reused from frame to frame, so the stages of the pipeline write their results into the same memory
+    (through the dst arguments of OpenCV and the out arguments of NumPy) instead of allocating new pictures every frame.
+    A buffer is allocated the first time it is requested with a given name, shape and type, so there is one set of
+    buffers per resolution. Every thread has its own buffers, so stages running on several frames at the same time
+    don't overwrite each other
+    '''
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # number of buffers allocated by the arena since its creation, and since the beginning of the last frame.
+        # They only count the arena misses: the arrays allocated by the stages outside the arena are not counted
+        self.buffer_allocations = 0
+        self.frame_buffer_allocations = 0
+        self.frames = 0
+
+    def get(self, name, shape, dtype=np.uint8):
+        '''
+        :param name: name of the buffer, unique for the stage using it
+        :param shape: shape of the buffer
+        :param dtype: type of the buffer
+        :return: the buffer, with undefined content
+        '''
+        buffers = self._local.__dict__.setdefault('buffers', {})
+        key = (name, tuple(shape), np.dtype(dtype))
+        buffer = buffers.get(key)
+        if buffer is None:
+            buffer = np.empty(shape, dtype)
+            buffers[key] = buffer
+            with self._lock:
+                self.buffer_allocations += 1
+                self.frame_buffer_allocations += 1
+        return buffer
+
+    def start_frame(self):
+        '''
+        Resets the count of the buffers allocated by the frame
+        :return: Nothing
+        '''
+        with self._lock:
+            self.frames += 1
+            self.frame_buffer_allocations = 0
+
+    def buffer_allocations_per_frame(self):
+        '''
+        :return: the average number of buffers allocated by the arena per frame
+        '''
+        return self.buffer_allocations / float(max(self.frames, 1))
+
+
+def get_buffer(arena, name, shape, dtype=np.uint8):
+    '''
+    :param arena: a BufferArena, or None
+    :return: the buffer of the arena (see BufferArena.get), or None if there is no arena, so the function receiving it
+    as dst or out allocates a new array
+    '''
+    if arena is None:
+        return None
+    return arena.get(name, shape, dtype)
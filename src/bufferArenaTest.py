@@ -0,0 +1,54 @@
+import threading
+from unittest import TestCase
+
+import matplotlib.image as mpimg
+import numpy as np
+
+from bufferArena import BufferArena
+from pipeline import Pipeline
+
+
+class BufferArenaTest(TestCase):
+    '''
+    Checks that the buffers are allocated once per name, shape and type, and once per thread
+    '''
+    def test_buffers_are_reused(self):
+        arena = BufferArena()
+        buffer = arena.get('edges', (720, 1280))
+        self.assertIs(buffer, arena.get('edges', (720, 1280)))
+        self.assertEqual(1, arena.buffer_allocations)
+        # another resolution, and another type
+        self.assertEqual((360, 640), arena.get('edges', (360, 640)).shape)
+        self.assertEqual(np.float32, arena.get('edges', (720, 1280), np.float32).dtype)
+        self.assertIs(buffer, arena.get('edges', (720, 1280)))
+        self.assertEqual(3, arena.buffer_allocations)
+        arena.start_frame()
+        self.assertEqual(0, arena.frame_buffer_allocations)
+
+    def test_threads_have_own_buffers(self):
+        arena = BufferArena()
+        buffers = [arena.get('edges', (10, 10))]
+        thread = threading.Thread(target=lambda: buffers.append(arena.get('edges', (10, 10))))
+        thread.start()
+        thread.join()
+        self.assertIsNot(buffers[0], buffers[1])
+        self.assertEqual(2, arena.buffer_allocations)
+
+
+class PipelineBuffersTest(TestCase):
+    '''
+    Checks that after the first frame the pipeline doesn't allocate new buffers, and that reusing them doesn't change
+    the result
+    '''
+    def test_steady_state(self):
+        frames = [mpimg.imread('../test_images/test' + str(idx) + '.jpg') for idx in [1, 2, 3, 4, 5, 6]]
+        for kwargs in [{}, {'processing_scale': 0.5}, {'sparse': True}]:
+            pipeline = Pipeline(**kwargs)
+            # a new arena for every frame: nothing is reused
+            expected_pipeline = Pipeline(**kwargs)
+            for idx, frame in enumerate(frames):
+                expected_pipeline.buffers = BufferArena()
+                np.testing.assert_array_equal(expected_pipeline.pipeline(frame), pipeline.pipeline(frame))
+                if idx > 0:
+                    self.assertEqual(0, pipeline.buffers.frame_buffer_allocations)
+            self.assertEqual(len(frames), pipeline.buffers.frames)
@@ -1,27 +1,74 @@
 import glob
+import hashlib
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 
 import cv2
 import numpy as np
 
+# bump this when the content of the calibration cache changes, so older caches are ignored
+CACHE_VERSION = 3
+
+# termination criteria of the sub pixel refinement of the chessboard corners
+SUBPIX_CRITERIA = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.001)
+
+
+def find_corners(fname, pattern_size):
+    '''
+    Searches the chessboard corners in a picture.
+    Pictures without a chessboard are rejected quickly with cv2.CALIB_CB_FAST_CHECK, and only the corners of the
+    pictures that pass are refined at sub pixel accuracy
+    :param fname: File system path of a chessboard picture
+    :param pattern_size: number of inner corners per chessboard row and column
+    :return: the corners found (None if the chessboard was not found), and the size (width, height) of the picture
+    '''
+    img = cv2.imread(fname)
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    img_size = (img.shape[1], img.shape[0])
+
+    flags = cv2.CALIB_CB_ADAPTIVE_THRESH + cv2.CALIB_CB_NORMALIZE_IMAGE + cv2.CALIB_CB_FAST_CHECK
+    ret, corners = cv2.findChessboardCorners(gray, pattern_size, flags)
+    if not ret:
+        return None, img_size
+
+    corners = cv2.cornerSubPix(gray, corners, (11, 11), (-1, -1), SUBPIX_CRITERIA)
+    return corners, img_size
+
 
 class CameraCalibrator:
     '''
     Class for correcting the distortion of the pictures taken from the camera.
     '''
 
-    def __init__(self, calibration_pictures_path_pattern='../camera_cal/calibration*.jpg'):
+    def __init__(self, calibration_pictures_path_pattern='../camera_cal/calibration*.jpg', pattern_size=(9, 6),
+                 cache_path='../camera_cal/calibration_cache.npz', workers=None):
         '''
-        :param calibration_pictures_path_pattern: File system path of a set of 9x6 chessboard pictures that will be used for camera calibration
+        :param calibration_pictures_path_pattern: File system path of a set of chessboard pictures that will be used for camera calibration
+        :param pattern_size: number of inner corners per chessboard row and column
+        :param cache_path: File system path where the calibration results are stored, so other processes don't have
+        to compute them again. None disables the cache
+        :param workers: number of processes searching the chessboard corners during calibration.
+        None uses all the CPUs, 1 searches them in the calling process
         '''
         # store mtx and dist in the status of the object, so we don't have to compute them at every iteration
         self.mtx = None
         self.dist = None
+        # size (width, height) of the calibration pictures
+        self.img_size = None
+        # names of the pictures where the chessboard has been found, and their reprojection error in pixels
+        self.calibration_pictures = []
+        self.reprojection_errors = np.array([])
         self.calibration_pictures_path_pattern = calibration_pictures_path_pattern
+        self.pattern_size = tuple(pattern_size)
+        self.cache_path = cache_path
+        self.workers = workers
 
     def undistort(self, img):
         '''
         Corrects the distortion of an image.
-        The first invocation of thi method will take long, since it will lazily initialize the transformation matrix
+        The first invocation of thi method will take long, since it will lazily initialize the transformation matrix,
+        unless calibrate() or load() have been called before
         :param img: distorted picture to be corrected
         :return: the corrected picture
         '''
@@ -32,36 +79,196 @@ class CameraCalibrator:
 
     def initialize_transformation_matrix(self):
         '''
-        Initializes the transformation matrix, using the pictures contained in the path specified above
+        Initializes the transformation matrix, loading it from the cache if it is up to date, otherwise computing it
+        from the pictures contained in the path specified above
         :return: Nothing, it just changes the internal status of the object
         '''
+        if not self.load():
+            self.calibrate()
+
+    def assume_size(self, width, height):
+        '''
+        Sets the size of the calibration pictures when it is unknown, e.g. when mtx and dist are set by hand
+        :param width: width of the pictures the calibration refers to
+        :param height: height of the pictures the calibration refers to
+        :return: Nothing, the size of a calibration computed or loaded from the cache is not changed
+        '''
+        if self.img_size is None:
+            self.img_size = (width, height)
+
+    def scaled(self, width, height):
+        '''
+        Adapts the calibration to pictures of another resolution taken with the same camera, e.g. resized frames.
+        The distortion coefficients don't depend on the resolution, only the camera matrix is scaled
+        :param width: width of the pictures
+        :param height: height of the pictures
+        :return: a calibrated CameraCalibrator for pictures of the given size, without cache. This one if the size is
+        the same as the calibration pictures, or if their size is unknown (e.g. mtx and dist set by hand, see
+        assume_size)
+        '''
+        if self.mtx is None:
+            self.initialize_transformation_matrix()
+        if self.img_size is None or (width, height) == tuple(self.img_size):
+            return self
+        scale_x = width / float(self.img_size[0])
+        scale_y = height / float(self.img_size[1])
+        scaled = CameraCalibrator(self.calibration_pictures_path_pattern, self.pattern_size, cache_path=None,
+                                  workers=self.workers)
+        # focal lengths and principal point, the latter referring to the centers of the pixels like cv2.resize
+        scaled.mtx = np.array(self.mtx, dtype=np.float64)
+        scaled.mtx[0, 0] *= scale_x
+        scaled.mtx[1, 1] *= scale_y
+        scaled.mtx[0, 2] = (scaled.mtx[0, 2] + 0.5) * scale_x - 0.5
+        scaled.mtx[1, 2] = (scaled.mtx[1, 2] + 0.5) * scale_y - 0.5
+        scaled.dist = self.dist
+        scaled.img_size = (width, height)
+        scaled.calibration_pictures = self.calibration_pictures
+        scaled.reprojection_errors = self.reprojection_errors
+        return scaled
+
+    def calibration_pictures_paths(self):
+        '''
+        :return: the sorted paths of the calibration pictures
+        '''
+        return sorted(glob.glob(self.calibration_pictures_path_pattern))
+
+    def cache_key(self):
+        '''
+        :return: a hash of the names, sizes and modification times of the calibration pictures and of the pattern
+        size, identifying the calibration results without reading the pictures
+        '''
+        sha = hashlib.sha1()
+        sha.update(str((CACHE_VERSION, self.pattern_size)).encode())
+        for fname in self.calibration_pictures_paths():
+            stat = os.stat(fname)
+            sha.update(str((os.path.basename(fname), stat.st_size, stat.st_mtime_ns)).encode())
+        return sha.hexdigest()
+
+    def content_key(self):
+        '''
+        :return: a hash of the names and the content of the calibration pictures and of the pattern size, checked
+        when the cache key doesn't match (e.g. the pictures have been copied, changing their modification times)
+        '''
+        sha = hashlib.sha1()
+        sha.update(str((CACHE_VERSION, self.pattern_size)).encode())
+        for fname in self.calibration_pictures_paths():
+            sha.update(os.path.basename(fname).encode())
+            with open(fname, 'rb') as f:
+                sha.update(f.read())
+        return sha.hexdigest()
+
+    def calibrate(self):
+        '''
+        Computes the transformation matrix using the pictures contained in the path specified above, and stores it
+        in the cache
+        :return: the overall RMS reprojection error of the calibration
+        '''
         # prepare object points, like (0,0,0), (1,0,0), (2,0,0) ....,(6,5,0)
-        objp = np.zeros((6 * 9, 3), np.float32)
-        objp[:, :2] = np.mgrid[0:9, 0:6].T.reshape(-1, 2)
+        nx, ny = self.pattern_size
+        objp = np.zeros((ny * nx, 3), np.float32)
+        objp[:, :2] = np.mgrid[0:nx, 0:ny].T.reshape(-1, 2)
 
         # Arrays to store object points and image points from all the images.
         objpoints = []  # 3d points in real world space
         imgpoints = []  # 2d points in image plane.
+        names = []
 
         img_size = []
 
         # Make a list of calibration images
-        images = glob.glob(self.calibration_pictures_path_pattern)
-
-        # Step through the list and search for chessboard corners
-        for idx, fname in enumerate(images):
-            img = cv2.imread(fname)
-            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-
-            # Find the chessboard corners
-            ret, corners = cv2.findChessboardCorners(gray, (9, 6), None)
+        images = self.calibration_pictures_paths()
 
+        # Search the chessboard corners of all the pictures, merging the results in the order of the pictures
+        for fname, (corners, size) in zip(images, self._find_all_corners(images)):
             # If found, add object points, image points
-            if ret == True:
+            if corners is not None:
                 objpoints.append(objp)
-                append = imgpoints.append(corners)
-                img_size = (img.shape[1], img.shape[0])
+                imgpoints.append(corners)
+                names.append(os.path.basename(fname))
+                img_size = size
 
         ret, mtx, dist, rvecs, tvecs = cv2.calibrateCamera(objpoints, imgpoints, img_size, None, None)
-        self.mtx = mtx
         self.dist = dist
+        self.img_size = img_size
+        self.calibration_pictures = names
+        self.reprojection_errors = self._reprojection_errors(objpoints, imgpoints, rvecs, tvecs, mtx, dist)
+        # mtx is assigned last: the other threads take a calibrator whose mtx is set as fully calibrated
+        self.mtx = mtx
+
+        if self.cache_path is not None:
+            self.save()
+        return ret
+
+    def _find_all_corners(self, images):
+        # the results of executor.map keep the order of the pictures, so the calibration is reproducible
+        pattern_sizes = [self.pattern_size] * len(images)
+        if self.workers == 1 or len(images) <= 1:
+            return list(map(find_corners, images, pattern_sizes))
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            return list(executor.map(find_corners, images, pattern_sizes))
+
+    def _reprojection_errors(self, objpoints, imgpoints, rvecs, tvecs, mtx, dist):
+        # average distance in pixels between the detected corners and the corners projected with the calibration
+        errors = []
+        for objp, corners, rvec, tvec in zip(objpoints, imgpoints, rvecs, tvecs):
+            projected, _ = cv2.projectPoints(objp, rvec, tvec, mtx, dist)
+            distances = np.linalg.norm(corners.reshape(-1, 2) - projected.reshape(-1, 2), axis=1)
+            errors.append(np.mean(distances))
+        return np.array(errors)
+
+    def save(self, path=None):
+        '''
+        Stores the calibration results in the cache
+        :param path: where to store them, by default the cache_path specified above
+        :return: Nothing
+        '''
+        path = self.cache_path if path is None else path
+        # write to a temporary file with a unique name first, so concurrent processes and threads never read a half
+        # written cache
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(path) or '.', prefix=os.path.basename(path) + '.',
+                                         suffix='.tmp', delete=False) as f:
+            try:
+                np.savez(f, version=CACHE_VERSION, key=self.cache_key(), content_key=self.content_key(),
+                         mtx=self.mtx, dist=self.dist, img_size=np.array(self.img_size),
+                         calibration_pictures=np.array(self.calibration_pictures),
+                         reprojection_errors=self.reprojection_errors)
+            except BaseException:
+                f.close()
+                os.remove(f.name)
+                raise
+        os.replace(f.name, path)
+
+    def load(self, path=None):
+        '''
+        Loads the calibration results from the cache, if they have been computed with the current version
+        from the same pictures and pattern size. The pictures are only read if their sizes or modification times
+        changed: if their content is the same, the cache is stored again with the new cache key
+        :param path: where to load them from, by default the cache_path specified above
+        :return: True if the calibration has been loaded, False otherwise
+        '''
+        path = self.cache_path if path is None else path
+        if path is None or not os.path.exists(path):
+            return False
+        try:
+            with np.load(path) as cache:
+                if int(cache['version']) != CACHE_VERSION:
+                    return False
+                refresh = str(cache['key']) != self.cache_key()
+                if refresh and str(cache['content_key']) != self.content_key():
+                    return False
+                self.dist = cache['dist']
+                self.img_size = tuple(int(v) for v in cache['img_size'])
+                self.calibration_pictures = [str(name) for name in cache['calibration_pictures']]
+                self.reprojection_errors = cache['reprojection_errors']
+                # assigned last, like in calibrate
+                self.mtx = cache['mtx']
+        except (OSError, ValueError, KeyError):
+            # unreadable or outdated cache, it will be computed again
+            return False
+        if refresh:
+            try:
+                self.save(path)
+            except OSError:
+                # e.g. read-only directory: the pictures will be read again next time
+                pass
+        return True
@@ -1,3 +1,7 @@
+import os
+import shutil
+import tempfile
+import threading
 from unittest import TestCase
 
 import matplotlib
@@ -5,6 +9,7 @@ import matplotlib
 matplotlib.use('TkAgg')
 import matplotlib.pyplot as plt
 import matplotlib.image as mpimg
+import numpy as np
 
 from cameraCalibrator import CameraCalibrator
 
@@ -23,3 +28,92 @@ class findCornersTest(TestCase):
         mpimg.imsave('../output_images/straight_lines1_undistorted.jpg', undistorted)
         plt.imshow(undistorted)
         plt.show()
+
+
+class CalibrationCacheTest(TestCase):
+    '''
+    Checks that the calibration results survive a round trip through the cache
+    '''
+    def test_load_from_cache(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            cache_path = os.path.join(tmp, 'calibration_cache.npz')
+            calibrated = CameraCalibrator(cache_path=cache_path)
+            calibrated.calibrate()
+
+            loaded = CameraCalibrator(cache_path=cache_path)
+            self.assertTrue(loaded.load())
+            np.testing.assert_array_equal(calibrated.mtx, loaded.mtx)
+            np.testing.assert_array_equal(calibrated.dist, loaded.dist)
+            np.testing.assert_array_equal(calibrated.reprojection_errors, loaded.reprojection_errors)
+            self.assertEqual(calibrated.img_size, loaded.img_size)
+            self.assertEqual(calibrated.calibration_pictures, loaded.calibration_pictures)
+
+            # a different pattern size is a different calibration
+            self.assertFalse(CameraCalibrator(pattern_size=(8, 6), cache_path=cache_path).load())
+
+
+class CacheKeyTest(TestCase):
+    '''
+    Checks when the cache is considered up to date, without calibrating
+    '''
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        for idx in [1, 2]:
+            shutil.copy('../camera_cal/calibration' + str(idx) + '.jpg', self.tmp.name)
+        self.cache_path = os.path.join(self.tmp.name, 'calibration_cache.npz')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def calibrator(self):
+        calibrator = CameraCalibrator(os.path.join(self.tmp.name, 'calibration*.jpg'), cache_path=self.cache_path)
+        calibrator.mtx = np.eye(3)
+        calibrator.dist = np.zeros((1, 5))
+        calibrator.img_size = (1280, 720)
+        calibrator.calibration_pictures = ['calibration1.jpg', 'calibration2.jpg']
+        calibrator.reprojection_errors = np.array([0.1, 0.2])
+        return calibrator
+
+    def test_touched_pictures_are_compared_by_content(self):
+        self.calibrator().save()
+        picture = os.path.join(self.tmp.name, 'calibration1.jpg')
+        stat = os.stat(picture)
+        os.utime(picture, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+        loaded = CameraCalibrator(os.path.join(self.tmp.name, 'calibration*.jpg'), cache_path=self.cache_path)
+        self.assertTrue(loaded.load())
+        np.testing.assert_array_equal(np.eye(3), loaded.mtx)
+        # the cache has been stored again with the new modification time
+        with np.load(self.cache_path) as cache:
+            self.assertEqual(loaded.cache_key(), str(cache['key']))
+
+    def test_changed_pictures_invalidate_the_cache(self):
+        self.calibrator().save()
+        with open(os.path.join(self.tmp.name, 'calibration1.jpg'), 'ab') as f:
+            f.write(b'changed')
+        loaded = CameraCalibrator(os.path.join(self.tmp.name, 'calibration*.jpg'), cache_path=self.cache_path)
+        self.assertFalse(loaded.load())
+
+    def test_concurrent_saves(self):
+        calibrators = [self.calibrator() for idx in range(8)]
+        threads = [threading.Thread(target=calibrator.save) for calibrator in calibrators]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertTrue(self.calibrator().load())
+        self.assertEqual([], [name for name in os.listdir(self.tmp.name) if name.endswith('.tmp')])
+
+
+class ParallelCalibrationTest(TestCase):
+    '''
+    Checks that searching the chessboard corners in parallel doesn't change the calibration
+    '''
+    def test_parallel_calibration_is_reproducible(self):
+        sequential = CameraCalibrator(cache_path=None, workers=1)
+        sequential.calibrate()
+        parallel = CameraCalibrator(cache_path=None, workers=2)
+        parallel.calibrate()
+        self.assertEqual(sequential.calibration_pictures, parallel.calibration_pictures)
+        np.testing.assert_array_equal(sequential.mtx, parallel.mtx)
+        np.testing.assert_array_equal(sequential.dist, parallel.dist)
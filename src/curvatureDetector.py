@@ -1,5 +1,7 @@
 import numpy as np
 
+import polynomialFitter
+
 
 def measure_curvature(left, right):
     return measure_curvature_real(left, right)
@@ -8,25 +10,38 @@ def measure_curvature(left, right):
 # Define conversions in x and y from pixels space to meters
 ym_per_pix = (40 / 720)  # meters per pixel in y dimension (in bird-eye view)
 xm_per_pix = (3.7 / 600)  # meters per pixel in x dimension (in bird-eye view)
+# size (width, height) of the bird-eye view the conversions above are defined for
+reference_size = (1280, 720)
 
 
-def measure_curvature_real(left, right):
+def meters_per_pixel(width, height):
+    '''
+    :param width: width of the bird-eye view
+    :param height: height of the bird-eye view
+    :return: the meters per pixel in x and y dimension, for a bird-eye view of the given size
+    '''
+    return xm_per_pix * reference_size[0] / width, ym_per_pix * reference_size[1] / height
+
+
+def measure_curvature_real(left, right, width=reference_size[0]):
     '''
     Calculates the curvature of polynomial functions in meters.
     :param left: the left line, as returned by linesDetector
     :param right: left: the left line, as returned by linesDetector
+    :param width: the width of the bird-eye view (in pixels), its height is the length of the lines
     :return: the curvature radius of the lane defined by the 2 lines at the bottom of the picture, in meters
     '''
 
     ploty = left.ploty
+    xm, ym = meters_per_pixel(width, len(ploty))
 
     # Define y-value where we want radius of curvature
     # We'll choose the maximum y-value, corresponding to the bottom of the image
     y_eval = np.max(ploty)
 
     # compute the average curvature of the last fitted lane lines
-    left_curverad = computeRadiusOfDetectedLane(left, y_eval)
-    right_curverad = computeRadiusOfDetectedLane(right, y_eval)
+    left_curverad = computeRadiusOfDetectedLane(left, y_eval, xm, ym)
+    right_curverad = computeRadiusOfDetectedLane(right, y_eval, xm, ym)
 
     return (left_curverad + right_curverad) / 2
 
@@ -36,7 +51,7 @@ def measure_offset_real(left, right, width):
     Calculates the offset of the camera from the center of the lane lines
     :param left: the left line, as returned by linesDetector
     :param right: left: the left line, as returned by linesDetector
-    :param width: the width of the picture (in meters)
+    :param width: the width of the picture (in pixels)
     :return: the distance of the center of the picture from the c
     '''
     # the x coordinate of the bottom most point of the left line
@@ -45,23 +60,24 @@ def measure_offset_real(left, right, width):
     # the x coordinate of the bottom most point of the right line
     rightcoord = right.best_plotx[right.best_plotx.shape[0] - 1]
 
+    xm, ym = meters_per_pixel(width, len(left.ploty))
+
     # distance between the center of the image and the center of the lane
-    return (rightcoord + leftcoord - width) / 2 * xm_per_pix
+    return (rightcoord + leftcoord - width) / 2 * xm
 
 
-def computeRadiusOfDetectedLane(line, y_eval):
+def computeRadiusOfDetectedLane(line, y_eval, xm=xm_per_pix, ym=ym_per_pix):
     '''
     Computes the curvature radius of an array of 2nd grade polyinoms
     :param recent_fit: list of polynoms, representing the last lane lines that have been fitted
     :param y_eval: y-value where we want radius of curvature
+    :param xm: meters per pixel in x dimension
+    :param ym: meters per pixel in y dimension
     :return: the average curvature radius in meters of the input polynoms
     '''
-    # Transform the detected bird-eye lines coordinates from pixels to meters, and fit a polynomial
-    fit_coeff_real_world = np.polyfit((line.ploty * ym_per_pix), (line.best_plotx * xm_per_pix), 2)
+    # Transform the average polynomial of the last fits from pixels to meters: scaling the axes only scales the
+    # coefficients, so there is no need to fit the points again
+    fit_coeff_real_world = polynomialFitter.to_meters(line.best_fit, xm, ym)
 
     # Calculation of R_curve (radius of curvature)
-    radius = ((1 + (
-                2 * fit_coeff_real_world[0] * y_eval * ym_per_pix + fit_coeff_real_world[1]) ** 2) ** 1.5) / np.absolute \
-                 (2 * fit_coeff_real_world[0])
-
-    return radius
+    return polynomialFitter.curvature_radius(fit_coeff_real_world, y_eval * ym)
@@ -0,0 +1,46 @@
+import os
+
+import cv2
+import numpy as np
+
+
+class DebugArtifactWriter:
+    '''
+    Debug sink of the Pipeline, writing the debug images of every frame to a directory
+    '''
+
+    def __init__(self, directory, every=1):
+        '''
+        :param directory: File system path of the directory where the images are written
+        :param every: only the images of one frame every this many frames are written
+        '''
+        self.directory = directory
+        self.every = every
+        os.makedirs(directory, exist_ok=True)
+
+    def __call__(self, frame_index, artifacts):
+        '''
+        Writes the debug images of a frame, as <directory>/frame_<index>_<name>.png
+        :param frame_index: index of the frame
+        :param artifacts: dictionary of the debug images of the frame, by name. None images are skipped
+        :return: Nothing
+        '''
+        if frame_index % self.every != 0:
+            return
+        for name, img in artifacts.items():
+            if img is None:
+                continue
+            path = os.path.join(self.directory, 'frame_{:06d}_{}.png'.format(frame_index, name))
+            cv2.imwrite(path, self.to_bgr8(img))
+
+    def to_bgr8(self, img):
+        '''
+        :param img: a RGB or single channel image, with values between 0 and 1 or between 0 and 255
+        :return: the image as 8 bit BGR, as expected by cv2.imwrite
+        '''
+        if img.dtype != np.uint8:
+            scale = 255 if img.max() <= 1 else 1
+            img = np.clip(img * scale, 0, 255).astype(np.uint8)
+        if img.ndim == 3:
+            img = cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
+        return img
@@ -0,0 +1,75 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+import matplotlib.image as mpimg
+import numpy as np
+
+from debugArtifactWriter import DebugArtifactWriter
+from pipeline import Pipeline, DIAGNOSTICS_OFF, DIAGNOSTICS_OVERLAY, DIAGNOSTICS_FULL
+
+
+class DebugArtifactWriterTest(TestCase):
+    '''
+    Checks the debug images sent to the debug sink at every diagnostics level, and how they are written
+    '''
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.frames = [mpimg.imread('../test_images/test' + str(idx) + '.jpg') for idx in [1, 4]]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def run_pipeline(self, diagnostics):
+        artifacts = []
+        pipeline = Pipeline(diagnostics=diagnostics,
+                            debug_sink=lambda frame_index, images: artifacts.append((frame_index, images)))
+        for frame in self.frames:
+            pipeline.pipeline(frame)
+        return artifacts
+
+    def test_diagnostics_levels(self):
+        self.assertEqual([], self.run_pipeline(DIAGNOSTICS_OFF))
+
+        overlay = self.run_pipeline(DIAGNOSTICS_OVERLAY)
+        self.assertEqual([0, 1], [frame_index for frame_index, images in overlay])
+        for frame_index, images in overlay:
+            self.assertEqual(['lines'], sorted(images))
+            self.assertEqual((720, 1280, 3), images['lines'].shape)
+
+        full = self.run_pipeline(DIAGNOSTICS_FULL)
+        self.assertEqual([0, 1], [frame_index for frame_index, images in full])
+        for frame_index, images in full:
+            self.assertEqual(['edges', 'lines', 'warped'], sorted(images))
+            self.assertEqual((720, 1280), images['warped'].shape[:2])
+
+    def test_full_diagnostics_images_are_not_reused(self):
+        # the images of the first frame, as they were when it was sent to the sink
+        artifacts = []
+        pipeline = Pipeline(diagnostics=DIAGNOSTICS_FULL,
+                            debug_sink=lambda frame_index, images: artifacts.append(
+                                (images, {name: np.copy(img) for name, img in images.items()})))
+        for frame in self.frames:
+            pipeline.pipeline(frame)
+
+        (first, first_copy), (second, second_copy) = artifacts
+        for name in first:
+            self.assertFalse(np.shares_memory(first[name], second[name]), name)
+            np.testing.assert_array_equal(first_copy[name], first[name])
+
+    def test_writer(self):
+        writer = DebugArtifactWriter(self.directory, every=3)
+        lines = np.zeros((72, 128, 3), dtype=np.uint8)
+        edges = np.ones((72, 128), dtype=np.float64)
+        for frame_index in range(7):
+            writer(frame_index, {'lines': lines, 'edges': edges, 'warped': None})
+
+        # only one frame every 3, and the None images are skipped
+        expected = ['frame_{:06d}_{}.png'.format(frame_index, name) for frame_index in [0, 3, 6]
+                    for name in ['edges', 'lines']]
+        self.assertEqual(sorted(expected), sorted(os.listdir(self.directory)))
+        written = mpimg.imread(os.path.join(self.directory, 'frame_000003_edges.png'))
+        self.assertEqual((72, 128), written.shape[:2])
+        # values between 0 and 1 are scaled to 8 bits
+        self.assertEqual(1., written.max())
@@ -0,0 +1,156 @@
+import threading
+
+import linesDetector
+
+
+class HistogramEngine:
+    '''
+    Searches the lane pixels with sliding windows, starting from the peaks of the histogram of the bottom half of the
+    picture. It doesn't need the lines of the previous frames
+    '''
+    name = 'histogram'
+    # engines of the same quality are interchangeable, a higher quality is preferred whatever its cost
+    quality = 1
+
+    def available(self, left, right):
+        '''
+        :param left: the left line detected so far
+        :param right: the right line detected so far
+        :return: whether the engine can search the lines of the next frame
+        '''
+        return True
+
+    def find_points(self, binary_warped, left, right, debug_image=True,
+                    artificial_point_weight=linesDetector.ARTIFICIAL_POINT_WEIGHT):
+        '''
+        :param binary_warped: a binary image tha represent a bird-eye view of the street
+        :param left: the left line detected so far
+        :param right: the right line detected so far
+        :param debug_image: whether the image for debugging purposes should be built
+        :param artificial_point_weight: weight in the fit of the points added by the engine, if any
+        :return: the (x, y, weights) points of the left and the right line, and the image for debugging purposes
+        (None if not requested)
+        '''
+        return linesDetector.sliding_window_points(binary_warped, debug_image, artificial_point_weight)
+
+
+class PriorEngine(HistogramEngine):
+    '''
+    Searches the lane pixels around the lines detected in the previous frames
+    '''
+    name = 'prior'
+    # tracking the lines of the previous frames is steadier than searching them again
+    quality = 2
+
+    def available(self, left, right):
+        return left.detected and left.best_plotx is not None and right.best_plotx is not None
+
+    def find_points(self, binary_warped, left, right, debug_image=True,
+                    artificial_point_weight=linesDetector.ARTIFICIAL_POINT_WEIGHT):
+        return linesDetector.prior_points(binary_warped, left, right, debug_image)
+
+
+class ConvolutionEngine(HistogramEngine):
+    '''
+    Searches the lane pixels around the centroids found by convolving a window with the layers of the picture.
+    It doesn't need the lines of the previous frames
+    '''
+    name = 'convolution'
+
+    def find_points(self, binary_warped, left, right, debug_image=True,
+                    artificial_point_weight=linesDetector.ARTIFICIAL_POINT_WEIGHT):
+        return linesDetector.convolution_points(binary_warped, debug_image, artificial_point_weight)
+
+
+class FixedEngines:
+    '''
+    Chooses the first engine of a list that can search the lines of the next frame.
+    The default, prior search and histogram, is what linesDetector.fit_polynomial does without engine
+    '''
+    def __init__(self, engines=None):
+        '''
+        :param engines: the detection engines, in order of preference
+        '''
+        self.engines = [PriorEngine(), HistogramEngine()] if engines is None else list(engines)
+
+    def copy(self):
+        '''
+        :return: a selector of the same engines with its own state, e.g. for another video
+        '''
+        return FixedEngines(self.engines)
+
+    def select(self, left, right):
+        '''
+        :param left: the left line detected so far
+        :param right: the right line detected so far
+        :return: the engine searching the lines of the next frame
+        '''
+        for engine in self.engines:
+            if engine.available(left, right):
+                return engine
+        raise ValueError("no detection engine can search the lines")
+
+    def record(self, engine, milliseconds):
+        '''
+        Receives the time an engine took to detect the lines of a frame
+        :param engine: the engine
+        :param milliseconds: the time it took, including the polynomial fit
+        :return: Nothing
+        '''
+        pass
+
+
+class CostBasedEngines(FixedEngines):
+    '''
+    Chooses, among the engines of the highest quality that can search the lines of the next frame (the prior search
+    while the lines are tracked, otherwise the full searches), the one that has been the fastest so far.
+    The cost of every engine is a moving average of its measured times. Engines that have never been measured are
+    tried first, and every explore_every frames the least recently used engine is tried again, so a cost that changed
+    (e.g. more noise in the pictures) is noticed
+    '''
+    def __init__(self, engines=None, smoothing=0.1, explore_every=50):
+        '''
+        :param engines: the detection engines, by default prior search, histogram and convolution
+        :param smoothing: weight of the last measurement in the moving average of the cost
+        :param explore_every: every how many frames the least recently used engine is tried again
+        '''
+        if engines is None:
+            engines = [PriorEngine(), HistogramEngine(), ConvolutionEngine()]
+        FixedEngines.__init__(self, engines)
+        self.smoothing = smoothing
+        self.explore_every = explore_every
+        # moving average of the cost in milliseconds, and index of the last frame, by engine name
+        self.costs = {}
+        self.last_used = {}
+        self.frames = 0
+        self._lock = threading.Lock()
+
+    def copy(self):
+        return CostBasedEngines(self.engines, self.smoothing, self.explore_every)
+
+    def select(self, left, right):
+        candidates = [engine for engine in self.engines if engine.available(left, right)]
+        if not candidates:
+            raise ValueError("no detection engine can search the lines")
+        # the cost only chooses among engines of the same quality
+        quality = max(engine.quality for engine in candidates)
+        candidates = [engine for engine in candidates if engine.quality == quality]
+        with self._lock:
+            self.frames += 1
+            unmeasured = [engine for engine in candidates if engine.name not in self.costs]
+            if unmeasured:
+                engine = unmeasured[0]
+            elif len(candidates) > 1 and self.frames % self.explore_every == 0:
+                engine = min(candidates, key=lambda candidate: self.last_used.get(candidate.name, 0))
+            else:
+                engine = min(candidates, key=lambda candidate: self.costs[candidate.name])
+            self.last_used[engine.name] = self.frames
+        return engine
+
+    def record(self, engine, milliseconds):
+        with self._lock:
+            cost = self.costs.get(engine.name)
+            if cost is None:
+                self.costs[engine.name] = milliseconds
+            else:
+                self.costs[engine.name] = cost + self.smoothing * (milliseconds - cost)
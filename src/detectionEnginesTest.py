@@ -0,0 +1,65 @@
+from unittest import TestCase
+
+import numpy as np
+
+import detectionEngines
+import linesDetector
+from line import Line
+
+
+class DetectionEnginesTest(TestCase):
+    '''
+    Runs every detection engine on a synthetic bird-eye view, and checks how the engines are chosen
+    '''
+    def setUp(self):
+        self.binary_warped = np.zeros((720, 1280), dtype=np.uint8)
+        ys = np.arange(720)
+        for x in (300, 1000):
+            for width in range(8):
+                self.binary_warped[ys, (x + width + 0.0002 * (ys - 720) ** 2).astype(int)] = 1
+
+    def assertLanesFound(self, left, right):
+        ys = np.arange(720)
+        np.testing.assert_allclose(303.5 + 0.0002 * (ys - 720) ** 2, left.best_plotx, atol=2)
+        np.testing.assert_allclose(1003.5 + 0.0002 * (ys - 720) ** 2, right.best_plotx, atol=2)
+
+    def test_engines(self):
+        for engine in [detectionEngines.HistogramEngine(), detectionEngines.ConvolutionEngine()]:
+            left, right, out_img = linesDetector.fit_polynomial(self.binary_warped, Line(), Line(), True, engine=engine)
+            self.assertLanesFound(left, right)
+            self.assertEqual((720, 1280, 3), out_img.shape)
+            # the lines just found can be tracked by the prior search
+            prior = detectionEngines.PriorEngine()
+            self.assertTrue(prior.available(left, right))
+            left, right, out_img = linesDetector.fit_polynomial(self.binary_warped, left, right, False, engine=prior)
+            self.assertLanesFound(left, right)
+
+    def test_fixed_engines(self):
+        engines = detectionEngines.FixedEngines()
+        self.assertEqual('histogram', engines.select(Line(), Line()).name)
+        left, right, out_img = linesDetector.fit_polynomial(self.binary_warped, Line(), Line(), False)
+        self.assertEqual('prior', engines.select(left, right).name)
+
+    def test_cost_based_engines(self):
+        engines = detectionEngines.CostBasedEngines(explore_every=10)
+        left, right = Line(), Line()
+        # the engines that have not been measured yet are tried first
+        self.assertEqual('histogram', engines.select(left, right).name)
+        engines.record(engines.engines[1], 3.0)
+        self.assertEqual('convolution', engines.select(left, right).name)
+        engines.record(engines.engines[2], 2.0)
+        chosen = [engines.select(left, right).name for i in range(18)]
+        # the fastest engine, and from time to time the other one
+        self.assertEqual(16, chosen.count('convolution'))
+        self.assertEqual(2, chosen.count('histogram'))
+
+    def test_cost_based_engines_prefer_the_prior_search(self):
+        engines = detectionEngines.CostBasedEngines(explore_every=10)
+        for engine, cost in zip(engines.engines, [6.0, 2.6, 2.0]):
+            engines.record(engine, cost)
+        # without lines to track, the fastest full search
+        self.assertEqual('convolution', engines.select(Line(), Line()).name)
+        # while the lines are tracked, the prior search even if it is slower, also when exploring
+        left, right, out_img = linesDetector.fit_polynomial(self.binary_warped, Line(), Line(), False)
+        chosen = [engines.select(left, right).name for i in range(20)]
+        self.assertEqual(['prior'] * 20, chosen)
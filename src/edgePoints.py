@@ -0,0 +1,92 @@
+import cv2
+import numpy as np
+
+
+class EdgePoints:
+    '''
+    The coordinates of the edge pixels of a picture, instead of the whole binary picture.
+    The points are sorted by row and then by column (like the result of np.nonzero), and there is at most one point
+    per pixel. The lane finders of linesDetector accept them in place of a binary bird-eye view
+    '''
+
+    def __init__(self, x, y, shape):
+        '''
+        :param x: x coordinates of the points, sorted like described above
+        :param y: y coordinates of the points
+        :param shape: (height, width) of the picture
+        '''
+        self.x = x
+        self.y = y
+        self.shape = tuple(shape[:2])
+
+    @classmethod
+    def from_mask(cls, mask, origin=(0, 0), frame_size=None):
+        '''
+        :param mask: a binary single channel picture, or a part of a bigger picture (see origin and frame_size)
+        :param origin: (x, y) position of mask in the whole picture
+        :param frame_size: (width, height) of the whole picture, by default the size of mask
+        :return: the nonzero pixels of the mask, in the coordinates of the whole picture
+        '''
+        width, height = (mask.shape[1], mask.shape[0]) if frame_size is None else frame_size
+        points = cv2.findNonZero(mask)
+        if points is None:
+            return cls(np.array([], dtype=np.int64), np.array([], dtype=np.int64), (height, width))
+        points = points.reshape(-1, 2).astype(np.int64)
+        return cls(points[:, 0] + origin[0], points[:, 1] + origin[1], (height, width))
+
+    def __len__(self):
+        return len(self.x)
+
+    def nonzero(self):
+        '''
+        :return: the y and the x coordinates of the points, like np.nonzero on the binary picture
+        '''
+        return self.y, self.x
+
+    def transform(self, matrix, frame_size):
+        '''
+        Maps the points with a perspective transformation, and bins them on the pixels of the destination picture
+        :param matrix: 3x3 perspective transformation matrix
+        :param frame_size: (width, height) of the destination picture
+        :return: the points of the destination picture where at least one point falls, as EdgePoints
+        '''
+        width, height = frame_size
+        if len(self) == 0:
+            return EdgePoints(self.x, self.y, (height, width))
+        points = np.column_stack((self.x, self.y)).astype(np.float32).reshape(-1, 1, 2)
+        points = np.round(cv2.perspectiveTransform(points, matrix).reshape(-1, 2))
+        inside = (points[:, 0] >= 0) & (points[:, 0] < width) & (points[:, 1] >= 0) & (points[:, 1] < height)
+        points = points[inside].astype(np.int64)
+        # sorted, one point per pixel
+        indexes = np.unique(points[:, 1] * width + points[:, 0])
+        return EdgePoints(indexes % width, indexes // width, (height, width))
+
+    def rows(self, y_low, y_high):
+        '''
+        :return: the slice of the points lying on the rows from y_low to y_high (excluded)
+        '''
+        start, end = np.searchsorted(self.y, [y_low, y_high], side='left')
+        return slice(start, end)
+
+    def window(self, x_low, x_high, y_low, y_high):
+        '''
+        :return: the x and y coordinates of the points in the window, row by row
+        '''
+        rows = self.rows(y_low, y_high)
+        x = self.x[rows]
+        inside = (x >= x_low) & (x < x_high)
+        return x[inside], self.y[rows][inside]
+
+    def column_sums(self, y_low, y_high):
+        '''
+        :return: the number of points in every column, counting only the rows from y_low to y_high (excluded)
+        '''
+        return np.bincount(self.x[self.rows(y_low, y_high)], minlength=self.shape[1])
+
+    def to_image(self, value=255):
+        '''
+        :return: the binary single channel uint8 picture of the points
+        '''
+        image = np.zeros(self.shape, dtype=np.uint8)
+        image[self.y, self.x] = value
+        return image
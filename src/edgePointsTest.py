@@ -0,0 +1,60 @@
+from unittest import TestCase
+
+import cv2
+import numpy as np
+
+import linesDetector
+from edgePoints import EdgePoints
+
+
+class EdgePointsTest(TestCase):
+    '''
+    Checks that the lane finders of linesDetector find the same pixels on EdgePoints as on the binary picture
+    '''
+    def setUp(self):
+        random_state = np.random.RandomState(3)
+        self.binary = (random_state.rand(720, 1280) < 0.02).astype(np.uint8)
+        ys = np.arange(720)
+        self.binary[ys, (300 + 0.0002 * (ys - 720) ** 2).astype(int)] = 1
+        self.binary[ys, 1000] = 1
+        self.points = EdgePoints.from_mask(self.binary)
+
+    def test_from_mask(self):
+        np.testing.assert_array_equal(np.nonzero(self.binary), self.points.nonzero())
+        np.testing.assert_array_equal(self.binary * 255, self.points.to_image())
+        # a part of a bigger picture
+        points = EdgePoints.from_mask(self.binary[100:, 200:], origin=(200, 100), frame_size=(1280, 720))
+        self.assertEqual((720, 1280), points.shape)
+        expected = self.binary.copy()
+        expected[:100, :] = 0
+        expected[:, :200] = 0
+        np.testing.assert_array_equal(np.nonzero(expected), points.nonzero())
+
+    def test_window(self):
+        for window in [(0, 1280, 0, 720), (250, 400, 640, 720), (-20, 30, 700, 800), (500, 500, 0, 720)]:
+            x, y = self.points.window(*window)
+            expected_x, expected_y = linesDetector.window_pixels(self.binary, *window)
+            np.testing.assert_array_equal(expected_x, x)
+            np.testing.assert_array_equal(expected_y, y)
+
+    def test_sums(self):
+        np.testing.assert_array_equal(np.sum(self.binary[360:, :], axis=0), self.points.column_sums(360, 720))
+        np.testing.assert_array_equal(linesDetector.layer_sums(self.binary, 80),
+                                      linesDetector.layer_sums(self.points, 80))
+
+    def test_find_lane_pixels(self):
+        expected = linesDetector.find_lane_pixels(self.binary, False)
+        actual = linesDetector.find_lane_pixels(self.points, False)
+        for expected_coordinates, actual_coordinates in zip(expected[:4], actual[:4]):
+            np.testing.assert_array_equal(expected_coordinates, actual_coordinates)
+
+    def test_transform(self):
+        # a translation by (10, -5): points moved out of the picture are dropped
+        matrix = np.array([[1., 0., 10.], [0., 1., -5.], [0., 0., 1.]])
+        expected = cv2.warpPerspective(self.binary, matrix, (1280, 720), flags=cv2.INTER_NEAREST)
+        transformed = self.points.transform(matrix, (1280, 720))
+        np.testing.assert_array_equal(np.nonzero(expected), transformed.nonzero())
+        # points falling on the same pixel are merged
+        halved = self.points.transform(np.diag([0.5, 0.5, 1.]), (640, 360))
+        self.assertEqual(len(set(zip(halved.x, halved.y))), len(halved))
+        self.assertEqual(0, len(EdgePoints.from_mask(np.zeros((10, 10), np.uint8)).transform(matrix, (10, 10))))
@@ -1,30 +1,39 @@
-import matplotlib
-
-matplotlib.use('TkAgg')
 import numpy as np
 import cv2
 
+from bufferArena import get_buffer
+from edgePoints import EdgePoints
+
 
 class EdgesDetector:
     '''
     Class for detecting edges in a picture, considering the saturation and the horizontal luminosity gradient
     '''
-    def __init__(self, s_thresh=(210, 255), sx_thresh=(80, 220)):
+    def __init__(self, s_thresh=(210, 255), sx_thresh=(80, 220), compact=False):
         '''
         :param s_thresh: saturation threshold
         :param sx_thresh: horizontal luminosity gradient threshold
+        :param compact: if True, detectEdges returns a single channel uint8 mask instead of a 3 channel float32 image
         '''
         self.s_yellow_thresh = s_thresh
         self.sx_thresh = sx_thresh
-        None
+        self.compact = compact
+        # region of interest masks, computed once per resolution
+        self.roi_masks = {}
 
-    def detectEdges(self, img):
+    def detectEdges(self, img, origin=(0, 0), frame_size=None, arena=None, dst=None):
         '''
         Detects the edges of an image
-        :param img: An image
+        :param img: An image, or a part of it (see origin and frame_size)
+        :param origin: (x, y) position of img in the whole picture, when img is only a part of it
+        :param frame_size: (width, height) of the whole picture, by default the size of img
+        :param arena: BufferArena providing the intermediate pictures, only used in compact mode
+        :param dst: optional mask the result is written to, only used in compact mode
         :return: a binary image where the detected corners are white, and the other pixels black
         '''
-        img = np.copy(img)
+        if self.compact:
+            return self.detectEdgesMask(img, origin, frame_size, arena, dst)
+
         # Convert to HLS color space and separate the V channel
         l_channel, s_channel = self.extract_channels(img)
 
@@ -38,17 +47,90 @@ class EdgesDetector:
 
         # only keep the edges that fit in a trapezoid with the base on the bottom of the picture and the short
         # side at 40% height
-        xsize = img.shape[1]
-        ysize = img.shape[0]
+        xsize, ysize = (img.shape[1], img.shape[0]) if frame_size is None else frame_size
+        boundaries_perspective, boundaries_close = self.roi_boundaries(xsize, ysize)
+        edges_cropped = self.region_of_interest(edges_binary, boundaries_perspective - np.int32(origin))
+        edges_cropped = self.region_of_interest(edges_cropped, boundaries_close - np.int32(origin))
+
+        return self.toBinary(edges_cropped)
+
+    def detectEdgesMask(self, img, origin=(0, 0), frame_size=None, arena=None, dst=None):
+        '''
+        Detects the edges of an image, without intermediate float or 3 channel images
+        :param img: An image, or a part of it (see origin and frame_size)
+        :param origin: (x, y) position of img in the whole picture, when img is only a part of it
+        :param frame_size: (width, height) of the whole picture, by default the size of img
+        :param arena: optional BufferArena providing the intermediate pictures
+        :param dst: optional mask the result is written to, like the dst argument of OpenCV
+        :return: a single channel uint8 mask where the detected edges are 255, and the other pixels 0
+        '''
+        size = img.shape[:2]
+        hls = cv2.cvtColor(img, cv2.COLOR_RGB2HLS, dst=get_buffer(arena, 'edges.hls', img.shape))
+        gray = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY, dst=get_buffer(arena, 'edges.gray', size))
+
+        # threshold the absolute value of the horizontal gradient, without computing it
+        sobelx = cv2.Sobel(gray, cv2.CV_32F, 1, 0, dst=get_buffer(arena, 'edges.sobelx', size, np.float32))
+        edges = cv2.inRange(sobelx, self.sx_thresh[0], self.sx_thresh[1], dst=dst)
+        threshold = get_buffer(arena, 'edges.threshold', size)
+        cv2.bitwise_or(edges, cv2.inRange(sobelx, -self.sx_thresh[1], -self.sx_thresh[0], dst=threshold), dst=edges)
+
+        # only the saturation (the last channel of HLS) is thresholded
+        s_low, s_high = self.s_yellow_thresh
+        cv2.bitwise_or(edges, cv2.inRange(hls, (0, 0, s_low), (255, 255, s_high), dst=threshold), dst=edges)
+
+        xsize, ysize = (img.shape[1], img.shape[0]) if frame_size is None else frame_size
+        x, y = origin
+        roi_mask = self.get_roi_mask(xsize, ysize)[y:y + img.shape[0], x:x + img.shape[1]]
+        cv2.bitwise_and(edges, roi_mask, dst=edges)
+        return edges
+
+    def detectEdgePoints(self, img, origin=(0, 0), frame_size=None, arena=None):
+        '''
+        Detects the edges of an image, like detectEdgesMask, and returns their coordinates instead of a picture
+        :param img: An image, or a part of it (see origin and frame_size)
+        :param origin: (x, y) position of img in the whole picture, when img is only a part of it
+        :param frame_size: (width, height) of the whole picture, by default the size of img
+        :param arena: optional BufferArena providing the intermediate pictures
+        :return: EdgePoints with the coordinates of the edges in the whole picture
+        '''
+        mask = self.detectEdgesMask(img, origin, frame_size, arena, get_buffer(arena, 'edges.points', img.shape[:2]))
+        return EdgePoints.from_mask(mask, origin, (img.shape[1], img.shape[0]) if frame_size is None else frame_size)
+
+    def get_roi_mask(self, xsize, ysize):
+        '''
+        :param xsize: width of the picture
+        :param ysize: height of the picture
+        :return: a single channel uint8 mask of the region where edges are kept (the same region used by detectEdges),
+        computed only once per resolution
+        '''
+        mask = self.roi_masks.get((xsize, ysize))
+        if mask is None:
+            boundaries_perspective, boundaries_close = self.roi_boundaries(xsize, ysize)
+            mask = self.region_of_interest(np.full((ysize, xsize), 255, dtype=np.uint8), boundaries_perspective)
+            mask = self.region_of_interest(mask, boundaries_close)
+            self.roi_masks[(xsize, ysize)] = mask
+        return mask
+
+    def get_roi_rect(self, xsize, ysize):
+        '''
+        :param xsize: width of the picture
+        :param ysize: height of the picture
+        :return: the bounding rectangle (x, y, width, height) of the region where edges are kept
+        '''
+        return cv2.boundingRect(self.get_roi_mask(xsize, ysize))
+
+    def roi_boundaries(self, xsize, ysize):
+        '''
+        :param xsize: width of the picture
+        :param ysize: height of the picture
+        :return: the two polygons whose intersection is the region where edges are kept
+        '''
         boundaries_perspective = np.array(
             [[(xsize * 0.50, ysize * 0.55), (xsize * 0.05, ysize), (xsize * 0.95, ysize)]],
             dtype=np.int32)
-        edges_cropped = self.region_of_interest(edges_binary, boundaries_perspective)
         boundaries_close = np.array([[(0, ysize), (xsize, ysize), (xsize, ysize * 0.6), (0, ysize * 0.6)]],
                                     dtype=np.int32)
-        edges_cropped = self.region_of_interest(edges_cropped, boundaries_close)
-
-        return self.toBinary(edges_cropped)
+        return boundaries_perspective, boundaries_close
 
     def toBinary(self, img):
         '''
@@ -5,6 +5,7 @@ import matplotlib
 matplotlib.use('TkAgg')
 import matplotlib.pyplot as plt
 import matplotlib.image as mpimg
+import numpy as np
 
 from edgesDetector import EdgesDetector
 
@@ -25,3 +26,20 @@ class EdgesDetectorIntegrationTest(TestCase):
         mpimg.imsave('../output_images/edges.jpg', edges * 255)
         plt.imshow(edges)
         plt.show()
+
+
+class CompactEdgesDetectorTest(TestCase):
+    '''
+    Checks that the compact mode of EdgesDetector detects the same edges as the default mode
+    '''
+    def test_compact_mask(self):
+        original = mpimg.imread('../test_images/test1.jpg')
+        edges = EdgesDetector().detectEdges(original)
+        mask = EdgesDetector(compact=True).detectEdges(original)
+        self.assertEqual(mask.dtype, np.uint8)
+        self.assertEqual(mask.shape, original.shape[:2])
+        np.testing.assert_array_equal(edges[:, :, 0] > 0, mask > 0)
+
+    def test_roi_mask_is_cached(self):
+        edges_detector = EdgesDetector(compact=True)
+        self.assertIs(edges_detector.get_roi_mask(1280, 720), edges_detector.get_roi_mask(1280, 720))
@@ -0,0 +1,171 @@
+import cv2
+import numpy as np
+
+
+class GeometryEngine:
+    '''
+    Undistorts and warps pictures using precomputed lookup maps, so every frame only needs a single cv2.remap
+    instead of rebuilding the undistortion map (cv2.undistort) and the perspective map (cv2.warpPerspective) each time.
+    The maps are built once per calibration, perspective transformation and resolution, and cached.
+    The bird-eye view alone doesn't need a map: cv2.warpPerspective is faster than cv2.remap for it.
+    '''
+
+    def __init__(self, camera_calibrator, perspective_transformer):
+        '''
+        :param camera_calibrator: the CameraCalibrator providing the camera matrix and the distortion coefficients
+        :param perspective_transformer: the PerspectiveTransformer providing the bird-eye transformation matrix
+        '''
+        self.camera_calibrator = camera_calibrator
+        self.perspective_transformer = perspective_transformer
+        # float maps, keyed by (kind, geometry key, size)
+        self._float_maps = {}
+        # fixed point maps, ready for cv2.remap, keyed by (kind, geometry key, size, roi)
+        self._fixed_maps = {}
+
+    def undistort(self, img, roi=None, dst=None):
+        '''
+        Corrects the distortion of an image, like CameraCalibrator.undistort
+        :param img: distorted picture to be corrected
+        :param roi: optional (x, y, width, height) rectangle of the output to compute. If given, only that part of the
+        corrected picture is returned
+        :param dst: optional picture the result is written to, like the dst argument of OpenCV
+        :return: the corrected picture
+        '''
+        return self._remap('undistort', img, roi, dst)
+
+    def to_bird_eye(self, img, roi=None, origin=(0, 0), frame_size=None, dst=None):
+        '''
+        Converts an image to bird-eye view, like PerspectiveTransformer.to_bird_eye
+        :param img: An image in camera view, or a part of it (see origin and frame_size)
+        :param roi: optional (x, y, width, height) rectangle of the output to compute
+        :param origin: (x, y) position of img in the camera view, when img is only a part of it
+        :param frame_size: (width, height) of the whole camera view (and of the bird-eye view),
+        by default the size of img
+        :param dst: optional picture the result is written to, like the dst argument of OpenCV
+        :return: The image transformed to bird-eye view
+        '''
+        # cv2.warpPerspective takes about as long as cv2.remap with a cached map (see benchmark.py), and moves to any
+        # origin and roi without a map for each of them, so the bird-eye map is only used when chained to the
+        # undistortion
+        matrix = self.perspective_transformer.transform_matrix
+        if origin != (0, 0):
+            # move the part of the picture back to its position before transforming it
+            matrix = matrix.dot(np.array([[1., 0., origin[0]], [0., 1., origin[1]], [0., 0., 1.]]))
+        size = (img.shape[1], img.shape[0]) if frame_size is None else tuple(frame_size)
+        x, y, w, h = (0, 0) + size if roi is None else roi
+        if x != 0 or y != 0:
+            matrix = np.array([[1., 0., -x], [0., 1., -y], [0., 0., 1.]]).dot(matrix)
+        return cv2.warpPerspective(img, matrix, (w, h), dst=dst, flags=cv2.INTER_LINEAR)
+
+    def bird_eye_footprint(self, size):
+        '''
+        :param size: (width, height) of the camera view (and of the bird-eye view)
+        :return: the bounding rectangle (x, y, width, height) of the part of the camera view that is visible
+        in the bird-eye view, limited to the picture. The whole picture if the bird-eye view reaches the horizon
+        '''
+        width, height = size
+        corners = np.float64([[0, 0, 1], [width, 0, 1], [width, height, 1], [0, height, 1]]).T
+        projected = self.perspective_transformer.inverse_transform_matrix.dot(corners)
+        if np.any(projected[2] <= 0):
+            return 0, 0, width, height
+        xs = projected[0] / projected[2]
+        ys = projected[1] / projected[2]
+        x0, y0 = max(int(np.floor(xs.min())), 0), max(int(np.floor(ys.min())), 0)
+        x1, y1 = min(int(np.ceil(xs.max())), width), min(int(np.ceil(ys.max())), height)
+        return x0, y0, max(x1 - x0, 0), max(y1 - y0, 0)
+
+    def undistort_to_bird_eye(self, img, roi=None, dst=None):
+        '''
+        Corrects the distortion of an image and converts it to bird-eye view, in a single pass
+        :param img: distorted picture in camera view
+        :param roi: optional (x, y, width, height) rectangle of the output to compute
+        :param dst: optional picture the result is written to, like the dst argument of OpenCV
+        :return: The corrected image transformed to bird-eye view
+        '''
+        return self._remap('undistort_bird_eye', img, roi, dst)
+
+    def clear(self):
+        '''
+        Drops all the cached maps, e.g. after the camera has been recalibrated
+        :return: Nothing
+        '''
+        self._float_maps.clear()
+        self._fixed_maps.clear()
+
+    def _remap(self, kind, img, roi, dst=None):
+        map1, map2 = self.get_maps(kind, (img.shape[1], img.shape[0]), roi)
+        return cv2.remap(img, map1, map2, cv2.INTER_LINEAR, dst=dst, borderMode=cv2.BORDER_CONSTANT)
+
+    def get_maps(self, kind, size, roi=None):
+        '''
+        :param kind: 'undistort', 'bird_eye' or 'undistort_bird_eye'
+        :param size: (width, height) of the pictures to be transformed
+        :param roi: optional (x, y, width, height) rectangle of the output
+        :return: the two fixed point maps (CV_16SC2 and CV_16UC1) to be passed to cv2.remap
+        '''
+        key = (kind, self._geometry_key(kind), tuple(size), None if roi is None else tuple(roi))
+        maps = self._fixed_maps.get(key)
+        if maps is None:
+            map_x, map_y = self._get_float_maps(kind, tuple(size))
+            if roi is not None:
+                x, y, w, h = roi
+                map_x = map_x[y:y + h, x:x + w]
+                map_y = map_y[y:y + h, x:x + w]
+            maps = cv2.convertMaps(map_x, map_y, cv2.CV_16SC2)
+            self._fixed_maps[key] = maps
+        return maps
+
+    def _geometry_key(self, kind):
+        # identifies the calibration and the perspective transformation the maps have been built from
+        key = b''
+        if kind != 'bird_eye':
+            self._ensure_calibrated()
+            key += self.camera_calibrator.mtx.tobytes() + self.camera_calibrator.dist.tobytes()
+        if kind != 'undistort':
+            key += self.perspective_transformer.transform_matrix.tobytes()
+        return hash(key)
+
+    def _ensure_calibrated(self):
+        if self.camera_calibrator.mtx is None:
+            self.camera_calibrator.initialize_transformation_matrix()
+
+    def _get_float_maps(self, kind, size):
+        key = (kind, self._geometry_key(kind), size)
+        maps = self._float_maps.get(key)
+        if maps is None:
+            if kind == 'undistort':
+                maps = self._undistort_maps(size)
+            elif kind == 'bird_eye':
+                maps = self._bird_eye_maps(size)
+            elif kind == 'undistort_bird_eye':
+                maps = self._undistort_bird_eye_maps(size)
+            else:
+                raise ValueError("unknown map kind: " + str(kind))
+            self._float_maps[key] = maps
+        return maps
+
+    def _undistort_maps(self, size):
+        # for every pixel of the corrected image, the coordinates of the pixel of the distorted image it comes from
+        mtx = self.camera_calibrator.mtx
+        return cv2.initUndistortRectifyMap(mtx, self.camera_calibrator.dist, None, mtx, size, cv2.CV_32FC1)
+
+    def _bird_eye_maps(self, size):
+        # for every pixel of the bird-eye image, the coordinates of the pixel of the camera view it comes from
+        width, height = size
+        xs, ys = np.meshgrid(np.arange(width, dtype=np.float64), np.arange(height, dtype=np.float64))
+        m = self.perspective_transformer.inverse_transform_matrix
+        w = m[2, 0] * xs + m[2, 1] * ys + m[2, 2]
+        map_x = (m[0, 0] * xs + m[0, 1] * ys + m[0, 2]) / w
+        map_y = (m[1, 0] * xs + m[1, 1] * ys + m[1, 2]) / w
+        return map_x.astype(np.float32), map_y.astype(np.float32)
+
+    def _undistort_bird_eye_maps(self, size):
+        # chain the two maps: look up the undistortion map at the camera view coordinates of every bird-eye pixel.
+        # Points falling outside of the picture get a negative coordinate, so cv2.remap will paint them black
+        undistort_x, undistort_y = self._get_float_maps('undistort', size)
+        bird_eye_x, bird_eye_y = self._get_float_maps('bird_eye', size)
+        map_x = cv2.remap(undistort_x, bird_eye_x, bird_eye_y, cv2.INTER_LINEAR,
+                          borderMode=cv2.BORDER_CONSTANT, borderValue=-1)
+        map_y = cv2.remap(undistort_y, bird_eye_x, bird_eye_y, cv2.INTER_LINEAR,
+                          borderMode=cv2.BORDER_CONSTANT, borderValue=-1)
+        return map_x, map_y
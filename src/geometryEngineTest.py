@@ -0,0 +1,106 @@
+from unittest import TestCase
+
+import cv2
+import numpy as np
+
+from cameraCalibrator import CameraCalibrator
+from geometryEngine import GeometryEngine
+from perspectiveTransformer import PerspectiveTransformer
+
+
+class GeometryEngineTest(TestCase):
+    '''
+    Compares the cached lookup maps of GeometryEngine with the per-frame OpenCV transformations
+    '''
+    def setUp(self):
+        self.camera_calibrator = CameraCalibrator()
+        # a synthetic calibration, so the test doesn't depend on the chessboard pictures
+        self.camera_calibrator.mtx = np.array([[1150., 0., 665.], [0., 1150., 390.], [0., 0., 1.]])
+        self.camera_calibrator.dist = np.array([[-0.24, -0.05, 0., 0., 0.02]])
+        self.perspective_transformer = PerspectiveTransformer()
+        self.engine = GeometryEngine(self.camera_calibrator, self.perspective_transformer)
+        self.img = np.random.RandomState(0).randint(0, 256, (720, 1280, 3)).astype(np.uint8)
+        self.img = cv2.GaussianBlur(self.img, (15, 15), 0)
+
+    def assertClose(self, expected, actual, tolerance=2):
+        self.assertEqual(expected.shape, actual.shape)
+        difference = np.abs(expected.astype(np.int32) - actual.astype(np.int32))
+        self.assertLessEqual(np.percentile(difference, 99), tolerance)
+
+    def test_undistort(self):
+        expected = cv2.undistort(self.img, self.camera_calibrator.mtx, self.camera_calibrator.dist, None,
+                                 self.camera_calibrator.mtx)
+        self.assertClose(expected, self.engine.undistort(self.img))
+
+    def test_to_bird_eye(self):
+        expected = self.perspective_transformer.to_bird_eye(self.img)
+        self.assertClose(expected, self.engine.to_bird_eye(self.img))
+
+    def test_undistort_to_bird_eye(self):
+        expected = self.perspective_transformer.to_bird_eye(self.engine.undistort(self.img))
+        self.assertClose(expected, self.engine.undistort_to_bird_eye(self.img), tolerance=4)
+
+    def test_roi(self):
+        full = self.engine.undistort_to_bird_eye(self.img)
+        roi = self.engine.undistort_to_bird_eye(self.img, roi=(300, 400, 700, 320))
+        np.testing.assert_array_equal(full[400:720, 300:1000], roi)
+
+    def test_to_bird_eye_roi(self):
+        full = self.engine.to_bird_eye(self.img)
+        roi = self.engine.to_bird_eye(self.img, roi=(300, 400, 700, 320))
+        self.assertClose(full[400:720, 300:1000], roi, tolerance=1)
+
+    def test_to_bird_eye_from_crop(self):
+        x, y, w, h = self.engine.bird_eye_footprint((1280, 720))
+        # the bird-eye view shows the bottom of the picture, not the sky
+        self.assertGreater(y, 360)
+        self.assertEqual(720, y + h)
+        full = self.engine.to_bird_eye(self.img)
+        cropped = self.engine.to_bird_eye(self.img[y:y + h, x:x + w], origin=(x, y), frame_size=(1280, 720))
+        self.assertClose(full, cropped, tolerance=1)
+
+    def test_maps_are_cached(self):
+        maps = self.engine.get_maps('bird_eye', (1280, 720))
+        self.assertIs(maps, self.engine.get_maps('bird_eye', (1280, 720)))
+        self.assertIsNot(maps, self.engine.get_maps('bird_eye', (640, 360)))
+
+
+class ScaledGeometryTest(TestCase):
+    '''
+    Checks that the calibration and the perspective transformation moved to another resolution transform the pictures
+    like at their own resolution
+    '''
+    def setUp(self):
+        self.camera_calibrator = CameraCalibrator()
+        self.camera_calibrator.mtx = np.array([[1150., 0., 665.], [0., 1150., 390.], [0., 0., 1.]])
+        self.camera_calibrator.dist = np.array([[-0.24, -0.05, 0., 0., 0.02]])
+        self.camera_calibrator.img_size = (1280, 720)
+        self.perspective_transformer = PerspectiveTransformer()
+        self.img = np.random.RandomState(0).randint(0, 256, (720, 1280, 3)).astype(np.uint8)
+        self.img = cv2.GaussianBlur(self.img, (31, 31), 0)
+
+    def test_same_size(self):
+        self.assertIs(self.camera_calibrator, self.camera_calibrator.scaled(1280, 720))
+        self.assertIs(self.perspective_transformer, self.perspective_transformer.scaled(1280, 720))
+
+    def test_unknown_size(self):
+        self.camera_calibrator.img_size = None
+        self.assertIs(self.camera_calibrator, self.camera_calibrator.scaled(640, 360))
+        self.assertIsNone(self.camera_calibrator.img_size)
+
+        self.camera_calibrator.assume_size(1280, 720)
+        self.camera_calibrator.assume_size(640, 360)
+        self.assertEqual((1280, 720), self.camera_calibrator.img_size)
+        self.assertEqual((640, 360), self.camera_calibrator.scaled(640, 360).img_size)
+
+    def test_half_size(self):
+        engine = GeometryEngine(self.camera_calibrator, self.perspective_transformer)
+        scaled_engine = GeometryEngine(self.camera_calibrator.scaled(640, 360),
+                                       self.perspective_transformer.scaled(640, 360))
+        small = cv2.resize(self.img, (640, 360), interpolation=cv2.INTER_AREA)
+
+        expected = cv2.resize(engine.undistort_to_bird_eye(self.img), (640, 360), interpolation=cv2.INTER_AREA)
+        actual = scaled_engine.undistort_to_bird_eye(small)
+        difference = np.abs(expected.astype(np.int32) - actual.astype(np.int32))
+        # the borders of the bird-eye view are black on one side and interpolated on the other
+        self.assertLessEqual(np.percentile(difference[10:-10, 10:-10], 99), 4)
@@ -0,0 +1,33 @@
+import json
+import os
+import subprocess
+import sys
+from unittest import TestCase
+
+# maximum time in seconds for importing the pipeline in a new process, can be overridden for slow machines
+IMPORT_TIME_BUDGET = float(os.environ.get('IMPORT_TIME_BUDGET', '1.0'))
+
+# modules that must only be loaded when debug plotting or moviepy video I/O are used
+LAZY_MODULES = ['matplotlib', 'moviepy']
+
+SCRIPT = '''
+import json, sys, time
+start = time.perf_counter()
+import main, pipeline, batchProcessor, videoProcessor, streamingExecutor, videoIO
+elapsed = time.perf_counter() - start
+print(json.dumps({'elapsed': elapsed, 'loaded': [m for m in %r if m in sys.modules]}))
+''' % LAZY_MODULES
+
+
+class ImportTimeTest(TestCase):
+    '''
+    Checks that short lived workers can import the pipeline quickly, without a display
+    '''
+    def test_headless_import_within_budget(self):
+        env = dict(os.environ)
+        env.pop('DISPLAY', None)
+        output = subprocess.check_output([sys.executable, '-c', SCRIPT], env=env,
+                                         cwd=os.path.dirname(os.path.abspath(__file__)))
+        result = json.loads(output.decode().strip().splitlines()[-1])
+        self.assertEqual([], result['loaded'])
+        self.assertLess(result['elapsed'], IMPORT_TIME_BUDGET)
@@ -0,0 +1,278 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from line import Line
+from pipeline import Pipeline
+
+# marks the end of the frames of a stream
+_END = object()
+
+
+class StreamState:
+    '''
+    The state of a video stream served by the LaneService: its tracking state (see Pipeline.track_frame), its queued
+    frames and its latencies
+    '''
+
+    def __init__(self, stream_id, max_pending, window, adaptive_rate=None, detection_engines=None,
+                 telemetry_sink=None, debug_sink=None):
+        '''
+        :param stream_id: id of the stream
+        :param max_pending: maximum number of frames of the stream waiting to be processed
+        :param window: number of frames the latency statistics are computed on
+        :param adaptive_rate: the AdaptiveRate of the stream, None detects the lines on every frame
+        :param detection_engines: chooses the detection engines of the stream, None uses the detection engines of the
+        pipeline
+        :param telemetry_sink: callable receiving the telemetry of every frame of the stream, None sends it nowhere
+        :param debug_sink: callable receiving the debug images of every frame of the stream, None sends them nowhere
+        '''
+        self.stream_id = stream_id
+        self.left = Line()
+        self.right = Line()
+        self.frame_index = 0
+        self.bird_eye_width = None
+        self.adaptive_rate = adaptive_rate
+        self.detection_engines = detection_engines
+        self.telemetry_sink = telemetry_sink
+        self.debug_sink = debug_sink
+        # frames waiting to be processed, as (frame, submission time, future of the result)
+        self.pending = deque()
+        self.slots = asyncio.Semaphore(max_pending)
+        # whether the stream is waiting for a worker, or being processed
+        self.scheduled = False
+        self.last_activity = time.monotonic()
+        self.frames = 0
+        # milliseconds from the submission of the last frames to their result, and spent processing them
+        self.latencies = deque(maxlen=window)
+        self.processing_times = deque(maxlen=window)
+
+    def record(self, latency, processing_time):
+        '''
+        :param latency: milliseconds from the submission of a frame to its result
+        :param processing_time: milliseconds spent processing the frame
+        :return: Nothing
+        '''
+        self.frames += 1
+        self.latencies.append(latency)
+        self.processing_times.append(processing_time)
+
+    def close_sinks(self):
+        '''
+        Closes the sinks of the stream that have a close method (e.g. a TelemetryWriter)
+        :return: Nothing
+        '''
+        for sink in (self.telemetry_sink, self.debug_sink):
+            if hasattr(sink, 'close'):
+                sink.close()
+
+    def metrics(self):
+        '''
+        :return: the number of processed and pending frames, and the mean, p50, p95 and p99 of the latency and of the
+        processing time of the last frames, in milliseconds
+        '''
+        metrics = OrderedDict([('frames', self.frames), ('pending', len(self.pending))])
+        for name, values in (('latency', self.latencies), ('processing', self.processing_times)):
+            if values:
+                p50, p95, p99 = np.percentile(values, [50, 95, 99])
+                metrics[name] = {'mean': float(np.mean(values)), 'p50': float(p50), 'p95': float(p95),
+                                 'p99': float(p99)}
+        return metrics
+
+
+class LaneService:
+    '''
+    Detects the lane lines on the frames of many video streams at the same time, in an asyncio event loop.
+    Every stream (identified by any hashable id, e.g. the name of a camera) is tracked with its own left and right
+    lines, and its own copies of the adaptive rate and of the detection engines of the pipeline, while the
+    calibration, the geometry and the detectors of the pipeline are shared by all of them.
+    Frames are processed on a shared thread pool. The streams waiting for a worker are served round robin, one frame at
+    a time, so a stream sending many frames doesn't delay the others, and the frames of every stream are processed in
+    order. The state of the streams that send no frames for idle_timeout seconds is dropped.
+    Frames are submitted with submit, e.g. by the handler of a socket, or with run_stream from an iterable of frames
+    (e.g. decoded from a file)
+    '''
+
+    def __init__(self, pipeline=None, workers=4, max_pending=2, idle_timeout=60., window=1000, stream_sinks=None):
+        '''
+        :param pipeline: the Pipeline providing the stages, None uses a default Pipeline. Its own lines and sinks are
+        not used
+        :param workers: number of frames processed at the same time, by as many threads
+        :param max_pending: maximum number of frames of a stream waiting to be processed: submit waits while the
+        stream has more
+        :param idle_timeout: seconds without frames after which the state of a stream is dropped
+        :param window: number of frames the latency statistics of every stream are computed on
+        :param stream_sinks: callable receiving the id of a new stream and returning its telemetry sink and debug sink
+        (either can be None), e.g. a TelemetryWriter per stream. The sinks with a close method are closed when the
+        stream is dropped or the service is closed. None sends the telemetry and the debug images nowhere
+        '''
+        self.pipeline = Pipeline() if pipeline is None else pipeline
+        self.workers = workers
+        self.max_pending = max_pending
+        self.idle_timeout = idle_timeout
+        self.window = window
+        self.stream_sinks = stream_sinks
+        # state of the streams, by stream id
+        self.streams = OrderedDict()
+        self.evicted_streams = 0
+        self._ready = None
+        self._tasks = []
+        self._pool = None
+
+    async def start(self):
+        '''
+        Calibrates the camera (once, not on every worker) and starts the workers
+        :return: Nothing
+        '''
+        if self._tasks:
+            return
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.pipeline.ensure_calibrated)
+        self._ready = asyncio.Queue()
+        self._pool = ThreadPoolExecutor(max_workers=self.workers)
+        self._tasks = [loop.create_task(self._serve()) for _ in range(self.workers)]
+        self._tasks.append(loop.create_task(self._evict_periodically()))
+
+    async def close(self):
+        '''
+        Stops the workers, cancelling the frames still waiting
+        :return: Nothing
+        '''
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for stream in self.streams.values():
+            for frame, submitted, future in stream.pending:
+                future.cancel()
+            stream.pending.clear()
+            stream.scheduled = False
+            stream.close_sinks()
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def submit(self, stream_id, frame):
+        '''
+        Processes a frame of a stream, after the frames of the stream submitted before it
+        :param stream_id: id of the stream
+        :param frame: an image representing a road with lane lines
+        :return: the annotated frame, like Pipeline.pipeline
+        '''
+        if not self._tasks:
+            raise RuntimeError('the service is not started')
+        stream = self.streams.get(stream_id)
+        if stream is None:
+            stream = self.streams[stream_id] = self._new_stream(stream_id)
+        async with stream.slots:
+            future = asyncio.get_running_loop().create_future()
+            stream.pending.append((frame, time.perf_counter(), future))
+            stream.last_activity = time.monotonic()
+            if not stream.scheduled:
+                stream.scheduled = True
+                self._ready.put_nowait(stream)
+            return await future
+
+    async def run_stream(self, stream_id, frames, sink):
+        '''
+        Processes all the frames of a stream, keeping max_pending of them queued
+        :param stream_id: id of the stream
+        :param frames: iterable of images (e.g. a generator decoding a video); it is consumed on a separate thread
+        :param sink: callable receiving the annotated frames in order
+        :return: the number of processed frames
+        '''
+        loop = asyncio.get_running_loop()
+        frames = iter(frames)
+        results = deque()
+        count = 0
+        try:
+            while True:
+                frame = await loop.run_in_executor(None, next, frames, _END)
+                if frame is _END:
+                    break
+                results.append(loop.create_task(self.submit(stream_id, frame)))
+                if len(results) >= self.max_pending:
+                    sink(await results.popleft())
+                    count += 1
+            while results:
+                sink(await results.popleft())
+                count += 1
+        finally:
+            for result in results:
+                result.cancel()
+        return count
+
+    def metrics(self):
+        '''
+        :return: the metrics of every stream (see StreamState.metrics), by stream id
+        '''
+        return OrderedDict((stream_id, stream.metrics()) for stream_id, stream in self.streams.items())
+
+    def evict_idle(self, now=None):
+        '''
+        Drops the state of the streams without pending frames, that received the last frame more than idle_timeout
+        seconds ago
+        :param now: the current time.monotonic(), by default the actual one
+        :return: the ids of the dropped streams
+        '''
+        now = time.monotonic() if now is None else now
+        idle = [stream_id for stream_id, stream in self.streams.items()
+                if not stream.scheduled and not stream.pending and now - stream.last_activity > self.idle_timeout]
+        for stream_id in idle:
+            self.streams.pop(stream_id).close_sinks()
+        self.evicted_streams += len(idle)
+        return idle
+
+    def _new_stream(self, stream_id):
+        pipeline = self.pipeline
+        adaptive_rate = None if pipeline.adaptive_rate is None else pipeline.adaptive_rate.copy()
+        detection_engines = None if pipeline.detection_engines is None else pipeline.detection_engines.copy()
+        telemetry_sink, debug_sink = (None, None) if self.stream_sinks is None else self.stream_sinks(stream_id)
+        return StreamState(stream_id, self.max_pending, self.window, adaptive_rate, detection_engines,
+                           telemetry_sink, debug_sink)
+
+    def _process(self, stream, frame):
+        # runs on the thread pool: the stream is processed by one worker at a time, so its state can be updated
+        start = time.perf_counter()
+        final, record = self.pipeline.process_frame(frame, True, stream)
+        return final, (time.perf_counter() - start) * 1000
+
+    async def _serve(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            stream = await self._ready.get()
+            frame, submitted, future = stream.pending.popleft()
+            if not future.cancelled():
+                try:
+                    final, processing_time = await loop.run_in_executor(self._pool, self._process, stream, frame)
+                except asyncio.CancelledError:
+                    future.cancel()
+                    raise
+                except Exception as e:
+                    if not future.done():
+                        future.set_exception(e)
+                else:
+                    stream.record((time.perf_counter() - submitted) * 1000, processing_time)
+                    if not future.done():
+                        future.set_result(final)
+            stream.last_activity = time.monotonic()
+            if stream.pending:
+                # back to the end of the queue, after the other streams waiting
+                self._ready.put_nowait(stream)
+            else:
+                stream.scheduled = False
+
+    async def _evict_periodically(self):
+        while True:
+            await asyncio.sleep(self.idle_timeout / 2.)
+            self.evict_idle()
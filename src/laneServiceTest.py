@@ -0,0 +1,117 @@
+import asyncio
+from unittest import TestCase
+
+import matplotlib.image as mpimg
+import numpy as np
+
+from adaptiveRate import AdaptiveRate
+from detectionEngines import CostBasedEngines
+from laneService import LaneService
+from pipeline import Pipeline
+
+
+class LaneServiceTest(TestCase):
+    '''
+    Runs several streams through the LaneService, checking that every stream is tracked like by its own Pipeline
+    '''
+    def setUp(self):
+        self.frames = {'front': [mpimg.imread('../test_images/test' + str(idx) + '.jpg') for idx in [1, 2, 3, 4]],
+                       'rear': [mpimg.imread('../test_images/test' + str(idx) + '.jpg') for idx in [6, 5, 4, 3, 2]]}
+
+    def test_streams_are_isolated(self):
+        async def run(service):
+            async with service:
+                results = {stream_id: [] for stream_id in self.frames}
+                counts = await asyncio.gather(*[service.run_stream(stream_id, frames, results[stream_id].append)
+                                                for stream_id, frames in self.frames.items()])
+            return counts, results
+
+        service = LaneService(workers=3)
+        counts, results = asyncio.run(run(service))
+        self.assertEqual([4, 5], counts)
+        for stream_id, frames in self.frames.items():
+            pipeline = Pipeline()
+            expected = [pipeline.pipeline(frame) for frame in frames]
+            self.assertEqual(len(expected), len(results[stream_id]))
+            for expected_frame, frame in zip(expected, results[stream_id]):
+                np.testing.assert_array_equal(expected_frame, frame)
+            metrics = service.metrics()[stream_id]
+            self.assertEqual(len(frames), metrics['frames'])
+            self.assertGreaterEqual(metrics['latency']['p99'], metrics['processing']['p50'])
+
+    def test_streams_have_their_own_tracking_state(self):
+        frames = {'front': [self.frames['front'][0]] * 6, 'rear': [self.frames['rear'][0]] * 4}
+        telemetry = {stream_id: [] for stream_id in frames}
+
+        async def run(service):
+            async with service:
+                await asyncio.gather(*[service.run_stream(stream_id, stream_frames, lambda frame: None)
+                                       for stream_id, stream_frames in frames.items()])
+
+        pipeline = Pipeline(adaptive_rate=AdaptiveRate(max_interval=2), detection_engines=CostBasedEngines())
+        service = LaneService(pipeline, workers=2,
+                              stream_sinks=lambda stream_id: (telemetry[stream_id].append, None))
+        asyncio.run(run(service))
+
+        for stream_id, stream_frames in frames.items():
+            expected = []
+            sequential = Pipeline(adaptive_rate=AdaptiveRate(max_interval=2), telemetry_sink=expected.append)
+            for frame in stream_frames:
+                sequential.pipeline(frame)
+            records = np.array(telemetry[stream_id])
+            np.testing.assert_array_equal(np.array(expected)['frame'], records['frame'])
+            np.testing.assert_array_equal(np.array(expected)['detected'], records['detected'])
+            np.testing.assert_allclose(np.array(expected)['left_fit'], records['left_fit'], atol=1e-6)
+            stream = service.streams[stream_id]
+            self.assertIsNot(pipeline.adaptive_rate, stream.adaptive_rate)
+            self.assertIsNot(pipeline.detection_engines, stream.detection_engines)
+            # the engines of every stream have only seen the frames of the stream
+            self.assertEqual(stream.adaptive_rate.detected_frames, stream.detection_engines.frames)
+        self.assertEqual(0, pipeline.detection_engines.frames)
+
+    def test_round_robin(self):
+        service = LaneService(workers=1, max_pending=10)
+        processed = []
+        process = service._process
+
+        def record(stream, frame):
+            processed.append(stream.stream_id)
+            return process(stream, frame)
+        service._process = record
+
+        async def run():
+            async with service:
+                # the front camera sends all its frames before the rear one sends any
+                front = [asyncio.ensure_future(service.submit('front', frame)) for frame in self.frames['front']]
+                rear = [asyncio.ensure_future(service.submit('rear', frame)) for frame in self.frames['rear'][:2]]
+                await asyncio.gather(*(front + rear))
+
+        asyncio.run(run())
+        self.assertEqual(['front', 'rear', 'front', 'rear', 'front', 'front'], processed)
+
+    def test_idle_streams_are_evicted(self):
+        service = LaneService(idle_timeout=10)
+
+        async def run():
+            async with service:
+                await service.submit('front', self.frames['front'][0])
+                await service.submit('rear', self.frames['rear'][0])
+
+        asyncio.run(run())
+        front = service.streams['front']
+        rear = service.streams['rear']
+        self.assertEqual([], service.evict_idle(now=front.last_activity + 5))
+        rear.last_activity = front.last_activity + 8
+        self.assertEqual(['front'], service.evict_idle(now=front.last_activity + 11))
+        self.assertEqual(['rear'], list(service.streams))
+        self.assertEqual(1, service.evicted_streams)
+
+    def test_errors_are_raised(self):
+        async def run():
+            async with LaneService() as service:
+                with self.assertRaises(Exception):
+                    await service.submit('front', np.zeros((10, 10), dtype=np.uint8))
+                # the stream still works
+                return await service.submit('front', self.frames['front'][0])
+
+        self.assertEqual(self.frames['front'][0].shape, asyncio.run(run()).shape)
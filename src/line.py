@@ -1,3 +1,5 @@
+import copy
+
 import numpy as np
 
 
@@ -5,9 +7,13 @@ class Line():
     '''
     Data about a detected lane line
     '''
-    def __init__(self):
+    def __init__(self, history=25, height=None):
+        '''
+        :param history: how many detections we want to store
+        :param height: height of the bird-eye view image. If None, it is taken from the first fitted line
+        '''
         # how many detections we want to store
-        self.history = 25
+        self.history = history
 
         # was the line detected in the last iteration?
         self.detected = False
@@ -18,43 +24,120 @@ class Line():
         # x values for line pixels
         self.current_plotx = [np.array([])]
 
-        # x values of the last n fits of the line
-        self.recent_plotx = np.array([])
-
         # average x values of the fitted line over the last n iterations
         self.best_plotx = None
 
         # polynomial coefficients for the most recent fit
         self.current_fit = None
 
-        # polynomial coefficients for the last fits
-        self.recent_fit = np.array([])
-
         # radius of curvature of the line in some units
         self.radius_of_curvature = None
         # distance in meters of vehicle center from the line
         self.line_base_pos = None
 
+        # ring buffers with the x values and the coefficients of the last n fits, and their running sums,
+        # so a new fit doesn't copy the whole history
+        self.count = 0
+        self._next = 0
+        self._plotx_buffer = None
+        self._plotx_sum = None
+        self._fit_buffer = np.zeros((history, 3))
+        self._fit_sum = np.zeros(3)
+        if height is not None:
+            self._allocate(height)
+
+    @property
+    def recent_plotx(self):
+        '''
+        :return: x values of the last n fits of the line, the most recent first
+        '''
+        if self._plotx_buffer is None:
+            return np.array([])
+        return self._plotx_buffer[self._recent_indexes()]
+
+    @property
+    def recent_fit(self):
+        '''
+        :return: polynomial coefficients for the last fits, the most recent first
+        '''
+        return self._fit_buffer[self._recent_indexes()]
+
+    @property
+    def best_fit(self):
+        '''
+        :return: average polynomial coefficients over the last n fits: the polynomial of best_plotx (before rounding)
+        '''
+        if self.count == 0:
+            return None
+        return self._fit_sum / self.count
+
     def update_fitted(self, current_fit, ploty):
         '''
         stores information about a new polynom that have been fit to the lane
         :param current_fit: the coefficients of the 2nd grade polynom that we want to store
         :param ploty: the coordinates of all the y points of the image
-        :param count: count of the pixels that have been fitted to the polynom
         :return:
         '''
+        if self._plotx_buffer is None or self._plotx_buffer.shape[1] != len(ploty):
+            self._allocate(len(ploty))
+
         self.ploty = ploty
         self.current_fit = current_fit
 
         self.current_plotx = current_fit[0] * ploty ** 2 + current_fit[1] * ploty + current_fit[2]
 
-        self.recent_plotx = np.append(self.current_plotx, self.recent_plotx).reshape(-1, 720)
-        self.recent_fit = np.append(current_fit, self.recent_fit).reshape(-1, 3)
+        # replace the oldest fit in the ring buffers, and update the running sums
+        slot = self._next
+        if self.count == self.history:
+            self._plotx_sum -= self._plotx_buffer[slot]
+            self._fit_sum -= self._fit_buffer[slot]
+        else:
+            self.count += 1
+        self._plotx_buffer[slot] = self.current_plotx
+        self._fit_buffer[slot] = current_fit
+        self._plotx_sum += self._plotx_buffer[slot]
+        self._fit_sum += self._fit_buffer[slot]
+
+        self._next = (slot + 1) % self.history
+        if self._next == 0:
+            # recompute the sums once per round, so rounding errors don't accumulate
+            np.sum(self._plotx_buffer, axis=0, out=self._plotx_sum)
+            np.sum(self._fit_buffer, axis=0, out=self._fit_sum)
+
+        self.best_plotx = (self._plotx_sum / self.count).astype(int)
 
-        if (self.recent_plotx.shape[1]) >= self.history:
-            self.recent_plotx = self.recent_plotx[0:self.history]
-            self.recent_fit = self.recent_fit[0:self.history]
+        self.detected = True
 
-        self.best_plotx = np.mean(self.recent_plotx, 0).astype(int)
+    def snapshot(self):
+        '''
+        :return: a copy of the line whose current and best values are not affected by later updates, e.g. for
+        annotating a frame while the next one is being tracked. The history is shared with the original line, while
+        the running sums, updated in place, are copied
+        '''
+        line = copy.copy(self)
+        line._fit_sum = self._fit_sum.copy()
+        if self._plotx_sum is not None:
+            line._plotx_sum = self._plotx_sum.copy()
+        return line
 
-        self.detected = True
+    def predicted(self, fit):
+        '''
+        :param fit: polynomial coefficients the line is expected to have, e.g. extrapolated from the last detections
+        :return: a snapshot of the line (see snapshot) whose best fit is the given one
+        '''
+        line = self.snapshot()
+        line._fit_sum = np.array(fit, dtype=float) * line.count
+        line.best_plotx = (fit[0] * line.ploty ** 2 + fit[1] * line.ploty + fit[2]).astype(int)
+        return line
+
+    def _allocate(self, height):
+        # (re)allocates the history for images of a given height, dropping the fits stored so far
+        self.count = 0
+        self._next = 0
+        self._plotx_buffer = np.zeros((self.history, height))
+        self._plotx_sum = np.zeros(height)
+        self._fit_buffer[:] = 0
+        self._fit_sum[:] = 0
+
+    def _recent_indexes(self):
+        return [(self._next - 1 - i) % self.history for i in range(self.count)]
@@ -0,0 +1,42 @@
+from unittest import TestCase
+
+import numpy as np
+
+from line import Line
+
+
+class LineTest(TestCase):
+    '''
+    Checks the history of the fitted lines kept by Line
+    '''
+    def test_best_plotx_is_the_mean_of_the_last_fits(self):
+        ploty = np.linspace(0, 359, 360)
+        line = Line(history=5)
+        fits = [np.array([1e-4 * idx, 0.1, 300 + idx]) for idx in range(12)]
+        for fit in fits:
+            line.update_fitted(fit, ploty)
+
+        last_plotx = [fit[0] * ploty ** 2 + fit[1] * ploty + fit[2] for fit in fits[-5:]]
+        np.testing.assert_array_equal(np.mean(last_plotx, 0).astype(int), line.best_plotx)
+        np.testing.assert_allclose(np.array(fits[-5:])[::-1], line.recent_fit)
+        self.assertEqual((5, 360), line.recent_plotx.shape)
+
+    def test_new_height_resets_the_history(self):
+        line = Line(history=5, height=720)
+        line.update_fitted(np.array([0., 0., 300.]), np.linspace(0, 719, 720))
+        line.update_fitted(np.array([0., 0., 100.]), np.linspace(0, 359, 360))
+        self.assertEqual(1, line.count)
+        np.testing.assert_array_equal(np.full(360, 100), line.best_plotx)
+
+    def test_snapshot_is_not_affected_by_later_updates(self):
+        ploty = np.linspace(0, 359, 360)
+        line = Line(history=5)
+        line.update_fitted(np.array([1e-4, 0.1, 300.]), ploty)
+        snapshot = line.snapshot()
+        best_fit, best_plotx = snapshot.best_fit.copy(), snapshot.best_plotx.copy()
+
+        for idx in range(6):
+            line.update_fitted(np.array([2e-4, 0.2, 400. + idx]), ploty)
+        np.testing.assert_array_equal(best_fit, snapshot.best_fit)
+        np.testing.assert_array_equal(best_plotx, snapshot.best_plotx)
+        np.testing.assert_array_equal([1e-4, 0.1, 300.], snapshot.current_fit)
@@ -1,72 +1,179 @@
-import matplotlib
-
-matplotlib.use('TkAgg')
-
 import numpy as np
 import cv2
 
+import polynomialFitter
+from edgePoints import EdgePoints
+
+# width of the bird-eye view the pixel hyperparameters below are tuned for: on pictures of other sizes they are scaled
+REFERENCE_WIDTH = 1280
+# width of the sliding windows +/- margin
+WINDOW_MARGIN = 75
+# minimum number of pixels found to recenter a sliding window
+WINDOW_MINPIX = 50
+# width of the area searched around the lines of the previous frames +/- margin
+PRIOR_MARGIN = 100
+# weight of the artificial points added to the center of the empty sliding windows, compared to the lane pixels
+ARTIFICIAL_POINT_WEIGHT = 1.0
+# width of the window convolved with the layers of the picture by the convolution search
+CONVOLUTION_WINDOW_WIDTH = 50
+# how far from the centroid of a layer the centroid of the next layer is searched, by the convolution search
+CONVOLUTION_MARGIN = 100
+
+
+def hyperparameters_scale(binary_warped):
+    '''
+    :param binary_warped: a bird-eye view of the street
+    :return: the ratio between its width and the width the hyperparameters are tuned for
+    '''
+    return binary_warped.shape[1] / float(REFERENCE_WIDTH)
+
 
 def toBinary(img):
     '''
     Transform an image so every pixel that is not black becomes white
     :param img: An image
-    :return: A copy of the original image, with all the pixel that are not black have 1.0
+    :return: A copy of the original image, with all the pixel that are not black have 1.0.
+    Single channel masks (see EdgesDetector compact mode) and EdgePoints are already binary, and are returned as they are
     '''
+    if isinstance(img, EdgePoints) or img.ndim == 2:
+        return img
     gray = img[:, :, 2] + img[:, :, 1] + img[:, :, 0]
     binary = np.zeros(gray.shape, dtype=np.float32)
     binary[gray > 0] = 1.0
     return binary
 
 
-def fit_polynomial(warped, left, right):
+def fit_polynomial(warped, left, right, debug_image=True, artificial_point_weight=ARTIFICIAL_POINT_WEIGHT,
+                   engine=None):
     '''
-    :param binary_warped: a binary image tha represent a bird-eye view of the street
+    :param binary_warped: a binary image tha represent a bird-eye view of the street, or its EdgePoints
+    :param debug_image: whether the image for debugging purposes should be built
+    :param artificial_point_weight: weight of the artificial points of the sliding windows search in the fit
+    :param engine: the detection engine searching the lane pixels (see detectionEngines). By default the pixels are
+    searched around the lines of the previous frames if the left line was detected, with sliding windows otherwise
     :return: the lane lines(left and right) that have been detected,
-    and an image that can be visualized for debugging purposes
+    and an image that can be visualized for debugging purposes (if available)
     '''
     binary_warped = toBinary(warped)
 
-    if (not left.detected):
-        leftx, lefty, rightx, righty, out_img = find_lane_pixels(binary_warped)
+    if engine is not None:
+        left_points, right_points, out_img = engine.find_points(binary_warped, left, right, debug_image,
+                                                                artificial_point_weight)
+    elif (not left.detected):
+        left_points, right_points, out_img = sliding_window_points(binary_warped, debug_image, artificial_point_weight)
 
     else:
-        leftx, lefty, rightx, righty, out_img = find_lane_pixels_from_prior(binary_warped, left, right)
+        left_points, right_points, out_img = prior_points(binary_warped, left, right, debug_image)
 
     ploty = np.linspace(0, warped.shape[0] - 1, warped.shape[0])
 
-    # Fit a second order polynomial to each using `np.polyfit`
-    try:
-        left_fit = (np.polyfit(lefty, leftx, 2))
-        left.update_fitted(left_fit, ploty)
-    except Exception:
-        left.detected = False
-
-    try:
-        right_fit = (np.polyfit(righty, rightx, 2))
-        right.update_fitted(right_fit, ploty)
-    except Exception:
-        right.detected = False
+    # Fit a second order polynomial to both lines at once
+    fits, fitted = polynomialFitter.fit_lines([left_points, right_points], scale=warped.shape[0])
+    for line, fit, line_fitted in zip((left, right), fits, fitted):
+        if line_fitted:
+            line.update_fitted(fit, ploty)
+        else:
+            line.detected = False
 
     ## Visualization ##
     # Colors in the left and right lane regions
-    out_img[lefty, leftx] = [255, 0, 0]
-    out_img[righty, rightx] = [0, 0, 255]
+    if out_img is not None:
+        out_img[left_points[1], left_points[0]] = [255, 0, 0]
+        out_img[right_points[1], right_points[0]] = [0, 0, 255]
 
     return left, right, out_img
 
 
-def find_lane_pixels(binary_warped):
+def sliding_window_points(binary_warped, debug_image=True, artificial_point_weight=ARTIFICIAL_POINT_WEIGHT):
+    '''
+    :return: the (x, y, weights) points of the left and right line found by the sliding windows search, and the
+    sliding windows (None if not requested)
+    '''
+    left_pixels, right_pixels, left_artificial, right_artificial, out_img = sliding_window_search(binary_warped,
+                                                                                               debug_image)
+    return (weighted_points(left_pixels, left_artificial, artificial_point_weight),
+            weighted_points(right_pixels, right_artificial, artificial_point_weight), out_img)
+
+
+def convolution_points(binary_warped, debug_image=True, artificial_point_weight=ARTIFICIAL_POINT_WEIGHT):
+    '''
+    :return: the (x, y, weights) points of the left and right line found by the convolution search, and the
+    windows (None if not requested)
+    '''
+    left_pixels, right_pixels, left_artificial, right_artificial, out_img = convolution_search(binary_warped,
+                                                                                            debug_image)
+    return (weighted_points(left_pixels, left_artificial, artificial_point_weight),
+            weighted_points(right_pixels, right_artificial, artificial_point_weight), out_img)
+
+
+def prior_points(binary_warped, left, right, debug_image=True):
+    '''
+    :return: the (x, y, weights) points of the left and right line found around the lines detected so far, and the
+    searched area (None if not requested)
+    '''
+    leftx, lefty, rightx, righty, out_img = find_lane_pixels_from_prior(binary_warped, left, right, debug_image)
+    return (leftx, lefty, None), (rightx, righty, None), out_img
+
+
+def find_lane_pixels(binary_warped, debug_image=True):
+    '''
+    :param binary_warped: a binary image tha represent a bird-eye view of the street, or its EdgePoints
+    :param debug_image: whether the image showing the sliding windows should be built
+    :return: the pixels that are likely to belong to lane lines, followed by the artificial points of the empty
+    windows, and the sliding windows (None if not requested)
+    '''
+    left_pixels, right_pixels, left_artificial, right_artificial, out_img = sliding_window_search(binary_warped,
+                                                                                               debug_image)
+    leftx, lefty = join_points(left_pixels, left_artificial)
+    rightx, righty = join_points(right_pixels, right_artificial)
+    return leftx, lefty, rightx, righty, out_img
+
+
+def join_points(pixels, artificial_points):
+    '''
+    :param pixels: x and y coordinates of the pixels of a line
+    :param artificial_points: lists of the x and y coordinates of its artificial points
+    :return: the x and y coordinates of the pixels followed by the artificial points
+    '''
+    return (np.append(pixels[0], np.array(artificial_points[0], dtype=np.int32)),
+            np.append(pixels[1], np.array(artificial_points[1], dtype=np.int32)))
+
+
+def weighted_points(pixels, artificial_points, artificial_point_weight):
+    '''
+    :param pixels: x and y coordinates of the pixels of a line
+    :param artificial_points: lists of the x and y coordinates of its artificial points
+    :param artificial_point_weight: weight of the artificial points, the pixels weigh 1
+    :return: the x and y coordinates of the pixels followed by the artificial points, and their weights
+    (None if they all weigh the same)
+    '''
+    x, y = join_points(pixels, artificial_points)
+    weights = None
+    if artificial_point_weight != 1:
+        weights = np.ones(len(x))
+        weights[len(pixels[0]):] = artificial_point_weight
+    return x, y, weights
+
+
+def sliding_window_search(binary_warped, debug_image=True):
     '''
-    :param binary_warped: a binary image tha represent a bird-eye view of the street
-    :return: the pixels that are likely to belong to lane lines
+    Searches the lane pixels with sliding windows, starting from the peaks of the histogram of the bottom half.
+    Only the pixels inside the windows are looked at, not all the nonzero pixels of the picture
+    :param binary_warped: a binary image tha represent a bird-eye view of the street, or its EdgePoints
+    :param debug_image: whether the image showing the sliding windows should be built
+    :return: the x and y coordinates of the left and right pixels that are likely to belong to lane lines,
+    the lists of the x and y coordinates of the left and right artificial points (the centers of the windows where no
+    pixels have been found), and the sliding windows (None if not requested)
     '''
     # Take a histogram of the bottom half of the image
-    histogram = np.sum(binary_warped[binary_warped.shape[0] // 2:, :], axis=0)
+    histogram = column_sums(binary_warped, binary_warped.shape[0] // 2, binary_warped.shape[0])
     # Create an output image to draw on and visualize the result
-    out_img = np.dstack((binary_warped, binary_warped, binary_warped))
+    out_img = None
+    if debug_image:
+        out_img = debug_canvas(binary_warped)
     # Find the peak of the left and right halves of the histogram
     # These will be the starting point for the left and right lines
-    midpoint = np.int(histogram.shape[0] // 2)
+    midpoint = int(histogram.shape[0] // 2)
     leftx_base = np.argmax(histogram[:midpoint])
     rightx_base = np.argmax(histogram[midpoint:]) + midpoint
 
@@ -74,23 +181,20 @@ def find_lane_pixels(binary_warped):
     # Choose the number of sliding windows
     nwindows = 9
     # Set the width of the windows +/- margin
-    margin = 75
-    # Set minimum number of pixels found to recenter window
-    minpix = 50
+    scale = hyperparameters_scale(binary_warped)
+    margin = int(round(WINDOW_MARGIN * scale))
+    # Set minimum number of pixels found to recenter window: the area of the windows grows with the square of the scale
+    minpix = WINDOW_MINPIX * scale ** 2
 
     # Set height of windows - based on nwindows above and image shape
-    window_height = np.int(binary_warped.shape[0] // nwindows)
-    # Identify the x and y positions of all nonzero pixels in the image
-    nonzero = binary_warped.nonzero()
-    nonzeroy = np.array(nonzero[0])
-    nonzerox = np.array(nonzero[1])
+    window_height = int(binary_warped.shape[0] // nwindows)
     # Current positions to be updated later for each window in nwindows
     leftx_current = leftx_base
     rightx_current = rightx_base
 
-    # Create empty lists to receive left and right lane pixel indices
-    left_lane_inds = []
-    right_lane_inds = []
+    # Create empty lists to receive the x and y positions of the left and right lane pixels
+    left_lane_x, left_lane_y = [], []
+    right_lane_x, right_lane_y = [], []
 
     # when no pixels are found in a window, add an artificial point on the center of the window,
     # that will be used for fitting the polynom
@@ -110,111 +214,236 @@ def find_lane_pixels(binary_warped):
         win_xright_high = rightx_current + margin
 
         # Draw the windows on the visualization image
-
-        try:
-            cv2.rectangle(out_img, (win_xleft_low, win_y_low),
-                          (win_xleft_high, win_y_high), (0, 255, 0), 2)
-            cv2.rectangle(out_img, (win_xright_low, win_y_low),
-                          (win_xright_high, win_y_high), (0, 255, 0), 2)
-        except Exception:
-            None
-
-        # Identify the nonzero pixels in x and y within the window #
-        good_left_inds = ((nonzeroy >= win_y_low) & (nonzeroy < win_y_high) &
-                          (nonzerox >= win_xleft_low) & (nonzerox < win_xleft_high)).nonzero()[0]
-        good_right_inds = ((nonzeroy >= win_y_low) & (nonzeroy < win_y_high) &
-                           (nonzerox >= win_xright_low) & (nonzerox < win_xright_high)).nonzero()[0]
-
-        # Append these indices to the lists
-        left_lane_inds.append(good_left_inds)
-        right_lane_inds.append(good_right_inds)
+        if out_img is not None:
+            try:
+                cv2.rectangle(out_img, (int(win_xleft_low), win_y_low),
+                              (int(win_xleft_high), win_y_high), (0, 255, 0), 2)
+                cv2.rectangle(out_img, (int(win_xright_low), win_y_low),
+                              (int(win_xright_high), win_y_high), (0, 255, 0), 2)
+            except Exception:
+                None
+
+        # Identify the nonzero pixels in x and y within the window, looking only at the window.
+        # The pixels are listed row by row, like the nonzero pixels of the whole picture
+        good_leftx, good_lefty = window_pixels(binary_warped, win_xleft_low, win_xleft_high, win_y_low, win_y_high)
+        good_rightx, good_righty = window_pixels(binary_warped, win_xright_low, win_xright_high, win_y_low,
+                                                 win_y_high)
+
+        # Append these pixels to the lists
+        left_lane_x.append(good_leftx)
+        left_lane_y.append(good_lefty)
+        right_lane_x.append(good_rightx)
+        right_lane_y.append(good_righty)
 
         # If you found > minpix pixels, recenter next window on their mean position
-        if len(good_left_inds) > minpix:
-            leftx_current = np.int(np.mean(nonzerox[good_left_inds]))
+        if len(good_leftx) > minpix:
+            leftx_current = int(np.mean(good_leftx))
         else:
             # otherwise fit a point located on the center of the window
             artificial_leftx.append(int(leftx_current))
             artificial_lefty.append(int((win_y_high + win_y_low) / 2))
 
-        if len(good_right_inds) > minpix:
-            rightx_current = np.int(np.mean(nonzerox[good_right_inds]))
+        if len(good_rightx) > minpix:
+            rightx_current = int(np.mean(good_rightx))
         else:
             artificial_rightx.append(int(rightx_current))
             artificial_righty.append(int((win_y_high + win_y_low) / 2))
 
-    # Concatenate the arrays of indices (previously was a list of lists of pixels)
-    try:
-        left_lane_inds = np.concatenate(left_lane_inds)
-        right_lane_inds = np.concatenate(right_lane_inds)
-    except ValueError:
-        # Avoids an error if the above is not implemented fully
-        pass
-
     # Extract left and right line pixel positions
-    leftx = nonzerox[left_lane_inds]
-    lefty = nonzeroy[left_lane_inds]
-    rightx = nonzerox[right_lane_inds]
-    righty = nonzeroy[right_lane_inds]
+    leftx = np.concatenate(left_lane_x)
+    lefty = np.concatenate(left_lane_y)
+    rightx = np.concatenate(right_lane_x)
+    righty = np.concatenate(right_lane_y)
 
-    leftx = np.append(leftx, np.array(artificial_leftx, dtype=np.int32))
-    lefty = np.append(lefty, np.array(artificial_lefty, dtype=np.int32))
-    rightx = np.append(rightx, np.array(artificial_rightx, dtype=np.int32))
-    righty = np.append(righty, np.array(artificial_righty, dtype=np.int32))
+    return ((leftx, lefty), (rightx, righty), (artificial_leftx, artificial_lefty),
+            (artificial_rightx, artificial_righty), out_img)
 
-    return leftx, lefty, rightx, righty, out_img
 
+def window_pixels(binary_warped, x_low, x_high, y_low, y_high):
+    '''
+    :param binary_warped: a binary image
+    :param x_low: first column of the window (it can be outside of the image)
+    :param x_high: column after the last one of the window
+    :param y_low: first row of the window
+    :param y_high: row after the last one of the window
+    :return: the x and y positions of the nonzero pixels in the window, row by row
+    '''
+    if isinstance(binary_warped, EdgePoints):
+        return binary_warped.window(x_low, x_high, y_low, y_high)
+    x_low = min(max(int(x_low), 0), binary_warped.shape[1])
+    x_high = max(min(int(x_high), binary_warped.shape[1]), x_low)
+    y, x = binary_warped[y_low:y_high, x_low:x_high].nonzero()
+    return x + x_low, y + y_low
+
+
+def find_lane_pixels_from_prior(binary_warped, left, right, debug_image=True):
+    '''
+    Searches the lane pixels around the lines detected in the previous frames
+    :param binary_warped: a binary image tha represent a bird-eye view of the street, or its EdgePoints
+    :param left: the left line detected so far
+    :param right: the right line detected so far
+    :param debug_image: whether the image showing the searched area should be built
+    :return: the pixels that are likely to belong to lane lines, and the searched area (None if not requested)
+    '''
+    margin = PRIOR_MARGIN * hyperparameters_scale(binary_warped)
+
+    # test every nonzero pixel against the position of the lines on its row, without building full frame masks
+    nonzero = binary_warped.nonzero()
+    nonzeroy = nonzero[0]
+    nonzerox = nonzero[1]
 
-def find_lane_pixels_from_prior(binary_warped, left, right):
-    margin = 100
+    left_plotx = left.best_plotx[nonzeroy]
+    left_inds = (nonzerox >= left_plotx - margin) & (nonzerox < left_plotx + margin)
+    right_plotx = right.best_plotx[nonzeroy]
+    right_inds = (nonzerox >= right_plotx - margin) & (nonzerox < right_plotx + margin)
 
-    mask_left = np.zeros_like(binary_warped)
-    mask_right = np.zeros_like(binary_warped)
+    out_img = None
+    if debug_image:
+        columns = np.arange(binary_warped.shape[1])
+        left_plotx = left.best_plotx[:, np.newaxis]
+        right_plotx = right.best_plotx[:, np.newaxis]
+        masks = (((columns >= left_plotx - margin) & (columns < left_plotx + margin)).astype(np.float32) +
+                 ((columns >= right_plotx - margin) & (columns < right_plotx + margin))) * 255
+        out_img = np.dstack((masks, masks, masks))
 
-    for y in left.ploty:
-        mask_left[int(y), int(left.best_plotx[int(y)]) - margin:int(left.best_plotx[int(y)]) + margin] = 1.0
-        mask_right[int(y), int(right.best_plotx[int(y)]) - margin:int(right.best_plotx[int(y)]) + margin] = 1.0
+    return nonzerox[left_inds], nonzeroy[left_inds], nonzerox[right_inds], nonzeroy[right_inds], out_img
 
-    pixels_left = binary_warped * mask_left
-    nonzero_left = pixels_left.nonzero()
-    nonzerox_left = np.array(nonzero_left[1])
-    nonzeroy_left = np.array(nonzero_left[0])
 
-    pixels_right = binary_warped * mask_right
-    nonzero_right = pixels_right.nonzero()
-    nonzerox_right = np.array(nonzero_right[1])
-    nonzeroy_right = np.array(nonzero_right[0])
+def convolution_search(binary_warped, debug_image=True):
+    '''
+    Searches the lane pixels with the convolution approach: the picture is cut in horizontal layers, and in every layer
+    the centroid of each line is where a window of ones convolved with the column sums of the layer is highest, near
+    the centroid of the layer below. The pixels around the centroids are the pixels of the lines
+    :param binary_warped: a binary image tha represent a bird-eye view of the street, or its EdgePoints
+    :param debug_image: whether the image showing the windows should be built
+    :return: the same values as sliding_window_search: the pixels of the lines, the artificial points of the windows
+    with too few pixels, and the windows (None if not requested)
+    '''
+    height, width = binary_warped.shape[:2]
+    nwindows = 9
+    window_height = height // nwindows
+    scale = hyperparameters_scale(binary_warped)
+    window_width = max(int(round(CONVOLUTION_WINDOW_WIDTH * scale)), 1)
+    search_margin = CONVOLUTION_MARGIN * scale
+    margin = int(round(WINDOW_MARGIN * scale))
+    minpix = WINDOW_MINPIX * scale ** 2
+    offset = window_width / 2
+
+    # the convolutions of all the layers at once, the bottom layer first
+    convolutions = convolve_ones(layer_sums(binary_warped, window_height), window_width)
+    # the starting points are the highest convolutions of the bottom quarter, in the left and in the right half
+    midpoint = width // 2
+    bottom = column_sums(binary_warped, int(3 * height / 4), height).astype(np.float64)
+    centers = [np.argmax(convolve_ones(bottom[np.newaxis, :midpoint], window_width)) - offset,
+               np.argmax(convolve_ones(bottom[np.newaxis, midpoint:], window_width)) + midpoint - offset]
+
+    out_img = None
+    if debug_image:
+        out_img = debug_canvas(binary_warped)
+    pixels = [([], []), ([], [])]
+    artificial = [([], []), ([], [])]
+    for level in range(nwindows):
+        win_y_low = height - (level + 1) * window_height
+        win_y_high = height - level * window_height
+        for side in range(2):
+            if level > 0:
+                # Use window_width/2 as offset because convolution signal reference is at right side of window
+                min_index = int(max(centers[side] + offset - search_margin, 0))
+                max_index = int(min(centers[side] + offset + search_margin, width))
+                signal = convolutions[level, min_index:max_index]
+                # layers without any pixel near the line keep the previous centroid
+                if len(signal) > 0 and signal.max() > 0:
+                    centers[side] = np.argmax(signal) + min_index - offset
+            center = int(centers[side])
+            if out_img is not None:
+                cv2.rectangle(out_img, (center - margin, win_y_low), (center + margin, win_y_high), (0, 255, 0), 2)
+            x, y = window_pixels(binary_warped, center - margin, center + margin, win_y_low, win_y_high)
+            pixels[side][0].append(x)
+            pixels[side][1].append(y)
+            if len(x) <= minpix:
+                # like the sliding windows, fit a point located on the center of the window
+                artificial[side][0].append(center)
+                artificial[side][1].append(int((win_y_high + win_y_low) / 2))
+
+    (leftx, lefty), (rightx, righty) = [(np.concatenate(x), np.concatenate(y)) for x, y in pixels]
+    return (leftx, lefty), (rightx, righty), artificial[0], artificial[1], out_img
+
+
+def column_sums(binary_warped, y_low, y_high):
+    '''
+    :param binary_warped: a binary image, or EdgePoints
+    :return: the sum of every column, counting only the rows from y_low to y_high (excluded)
+    '''
+    if isinstance(binary_warped, EdgePoints):
+        return binary_warped.column_sums(y_low, y_high)
+    return np.sum(binary_warped[y_low:y_high, :], axis=0)
 
-    masks = (mask_left + mask_right) * 255
-    out_img = np.dstack((masks, masks, masks))
 
-    return nonzerox_left, nonzeroy_left, nonzerox_right, nonzeroy_right, out_img
+def debug_canvas(binary_warped):
+    '''
+    :param binary_warped: a binary image, or EdgePoints
+    :return: a 3 channel copy of the picture, to draw on for debugging purposes
+    '''
+    if isinstance(binary_warped, EdgePoints):
+        binary_warped = binary_warped.to_image()
+    return np.dstack((binary_warped, binary_warped, binary_warped))
+
+
+def layer_sums(image, window_height):
+    '''
+    :param image: a binary image
+    :param window_height: height of the layers, in pixels
+    :return: the column sums of the horizontal layers of the picture (as many as fit in it), the bottom layer first
+    '''
+    levels = image.shape[0] // window_height
+    if isinstance(image, EdgePoints):
+        # count the points of all the layers at once, by layer and column
+        rows = image.rows(image.shape[0] - levels * window_height, image.shape[0])
+        layer = (image.shape[0] - 1 - image.y[rows]) // window_height
+        counts = np.bincount(layer * image.shape[1] + image.x[rows], minlength=levels * image.shape[1])
+        return counts.reshape(levels, image.shape[1]).astype(np.float64)
+    layers = image[image.shape[0] - levels * window_height:].reshape(levels, window_height, image.shape[1])
+    return np.sum(layers, axis=1, dtype=np.float64)[::-1]
+
+
+def convolve_ones(signals, window_width):
+    '''
+    Convolves a window of ones with several signals at once, using cumulative sums
+    :param signals: 2D array, a signal per row
+    :param window_width: width of the window
+    :return: for every row, the same values as np.convolve(np.ones(window_width), row)
+    '''
+    padded = np.zeros((signals.shape[0], signals.shape[1] + 2 * window_width - 1))
+    padded[:, window_width:window_width + signals.shape[1]] = signals
+    cumulative = np.cumsum(padded, axis=1)
+    # the sum of window_width consecutive values of the signal padded with zeros on both sides
+    return cumulative[:, window_width:] - cumulative[:, :-window_width]
 
 
 # convolution
 def find_window_centroids(image, window_width, window_height, margin):
     window_centroids = []  # Store the (left,right) window centroid positions per level
-    window = np.ones(window_width)  # Create our window template that we will use for convolutions
 
     # First find the two starting positions for the left and right lane by using np.sum to get the vertical image slice
-    # and then np.convolve the vertical image slice with the window template
+    # and then convolve the vertical image slice with a window of ones
 
     # Sum quarter bottom of image to get slice, could use a different ratio
     l_sum = np.sum(image[int(3 * image.shape[0] / 4):, :int(image.shape[1] / 2)], axis=0)
-    l_center = np.argmax(np.convolve(window, l_sum)) - window_width / 2
     r_sum = np.sum(image[int(3 * image.shape[0] / 4):, int(image.shape[1] / 2):], axis=0)
-    r_center = np.argmax(np.convolve(window, r_sum)) - window_width / 2 + int(image.shape[1] / 2)
+    l_conv = convolve_ones(l_sum[np.newaxis], window_width)[0]
+    r_conv = convolve_ones(r_sum[np.newaxis], window_width)[0]
+    l_center = np.argmax(l_conv) - window_width / 2
+    r_center = np.argmax(r_conv) - window_width / 2 + int(image.shape[1] / 2)
 
     # Add what we found for the first layer
     window_centroids.append((l_center, r_center))
 
+    # convolve the window into the vertical slices of all the layers at once
+    conv_signals = convolve_ones(layer_sums(image, window_height), window_width)
+
     # Go through each layer looking for max pixel locations
     for level in range(1, (int)(image.shape[0] / window_height)):
-        # convolve the window into the vertical slice of the image
-        image_layer = np.sum(
-            image[int(image.shape[0] - (level + 1) * window_height):int(image.shape[0] - level * window_height), :],
-            axis=0)
-        conv_signal = np.convolve(window, image_layer)
+        conv_signal = conv_signals[level]
         # Find the best left centroid by using past left center as a reference
         # Use window_width/2 as offset because convolution signal reference is at right side of window, not center of window
         offset = window_width / 2
@@ -0,0 +1,180 @@
+from unittest import TestCase
+
+import numpy as np
+
+import linesDetector
+from line import Line
+
+
+def find_lane_pixels_full_scan(binary_warped):
+    '''
+    The sliding window search testing all the nonzero pixels of the picture for every window,
+    as find_lane_pixels used to do
+    '''
+    histogram = np.sum(binary_warped[binary_warped.shape[0] // 2:, :], axis=0)
+    midpoint = histogram.shape[0] // 2
+    leftx_current = np.argmax(histogram[:midpoint])
+    rightx_current = np.argmax(histogram[midpoint:]) + midpoint
+    scale = linesDetector.hyperparameters_scale(binary_warped)
+    margin = int(round(linesDetector.WINDOW_MARGIN * scale))
+    minpix = linesDetector.WINDOW_MINPIX * scale ** 2
+    nwindows = 9
+    window_height = binary_warped.shape[0] // nwindows
+    nonzeroy, nonzerox = binary_warped.nonzero()
+    left_inds, right_inds = [], []
+    artificial = ([], [], [], [])
+    for window in range(nwindows):
+        win_y_low = binary_warped.shape[0] - (window + 1) * window_height
+        win_y_high = binary_warped.shape[0] - window * window_height
+        rows = (nonzeroy >= win_y_low) & (nonzeroy < win_y_high)
+        good_left = (rows & (nonzerox >= leftx_current - margin) & (nonzerox < leftx_current + margin)).nonzero()[0]
+        good_right = (rows & (nonzerox >= rightx_current - margin) & (nonzerox < rightx_current + margin)).nonzero()[0]
+        left_inds.append(good_left)
+        right_inds.append(good_right)
+        if len(good_left) > minpix:
+            leftx_current = int(np.mean(nonzerox[good_left]))
+        else:
+            artificial[0].append(int(leftx_current))
+            artificial[1].append(int((win_y_high + win_y_low) / 2))
+        if len(good_right) > minpix:
+            rightx_current = int(np.mean(nonzerox[good_right]))
+        else:
+            artificial[2].append(int(rightx_current))
+            artificial[3].append(int((win_y_high + win_y_low) / 2))
+    left_inds = np.concatenate(left_inds)
+    right_inds = np.concatenate(right_inds)
+    pixels = (nonzerox[left_inds], nonzeroy[left_inds], nonzerox[right_inds], nonzeroy[right_inds])
+    return [np.append(coordinates, np.array(points, dtype=np.int32))
+            for coordinates, points in zip(pixels, artificial)]
+
+
+class FindLanePixelsTest(TestCase):
+    '''
+    Checks that looking only at the pixels inside the sliding windows finds the same pixels as scanning the whole picture
+    '''
+    def assertSamePixels(self, binary_warped):
+        expected = find_lane_pixels_full_scan(binary_warped)
+        actual = linesDetector.find_lane_pixels(binary_warped, False)
+        self.assertIsNone(actual[4])
+        for expected_coordinates, actual_coordinates in zip(expected, actual[:4]):
+            self.assertEqual(expected_coordinates.dtype, actual_coordinates.dtype)
+            np.testing.assert_array_equal(expected_coordinates, actual_coordinates)
+
+    def test_lines(self):
+        binary_warped = np.zeros((720, 1280), dtype=np.uint8)
+        ys = np.arange(720)
+        binary_warped[ys, (300 + 0.0002 * (ys - 720) ** 2).astype(int)] = 1
+        binary_warped[ys, (1000 + 0.0002 * (ys - 720) ** 2).astype(int) % 1280] = 1
+        # a dashed line, and some noise
+        binary_warped[(ys // 40) % 2 == 0, 1001] = 1
+        binary_warped[np.random.RandomState(0).rand(720, 1280) < 0.01] = 1
+        self.assertSamePixels(binary_warped)
+
+    def test_random_pictures(self):
+        random_state = np.random.RandomState(1)
+        for height, width, density in [(720, 1280, 0.3), (720, 1280, 0.001), (360, 640, 0.02), (100, 333, 0.1),
+                                       (5, 1280, 0.5), (720, 1280, 0.0)]:
+            binary_warped = (random_state.rand(height, width) < density).astype(np.float32)
+            self.assertSamePixels(binary_warped)
+
+
+def find_window_centroids_loop(image, window_width, window_height, margin):
+    '''
+    The convolution search with np.convolve on every layer, as find_window_centroids used to do
+    '''
+    window = np.ones(window_width)
+    l_sum = np.sum(image[int(3 * image.shape[0] / 4):, :int(image.shape[1] / 2)], axis=0)
+    l_center = np.argmax(np.convolve(window, l_sum)) - window_width / 2
+    r_sum = np.sum(image[int(3 * image.shape[0] / 4):, int(image.shape[1] / 2):], axis=0)
+    r_center = np.argmax(np.convolve(window, r_sum)) - window_width / 2 + int(image.shape[1] / 2)
+    window_centroids = [(l_center, r_center)]
+    offset = window_width / 2
+    for level in range(1, (int)(image.shape[0] / window_height)):
+        image_layer = np.sum(
+            image[int(image.shape[0] - (level + 1) * window_height):int(image.shape[0] - level * window_height), :],
+            axis=0)
+        conv_signal = np.convolve(window, image_layer)
+        l_min_index = int(max(l_center + offset - margin, 0))
+        l_max_index = int(min(l_center + offset + margin, image.shape[1]))
+        l_center = np.argmax(conv_signal[l_min_index:l_max_index]) + l_min_index - offset
+        r_min_index = int(max(r_center + offset - margin, 0))
+        r_max_index = int(min(r_center + offset + margin, image.shape[1]))
+        r_center = np.argmax(conv_signal[r_min_index:r_max_index]) + r_min_index - offset
+        window_centroids.append((l_center, r_center))
+    return window_centroids
+
+
+class FindWindowCentroidsTest(TestCase):
+    '''
+    Checks that convolving all the layers at once finds the same centroids as convolving them one by one
+    '''
+    def test_random_pictures(self):
+        random_state = np.random.RandomState(2)
+        for height, width, density in [(720, 1280, 0.02), (720, 1280, 0.3), (360, 641, 0.001), (101, 333, 0.0)]:
+            image = (random_state.rand(height, width) < density).astype(np.uint8)
+            for window_width, window_height, margin in [(50, 80, 100), (7, 9, 25)]:
+                self.assertEqual(find_window_centroids_loop(image, window_width, window_height, margin),
+                                 linesDetector.find_window_centroids(image, window_width, window_height, margin))
+
+
+def find_lane_pixels_from_prior_loop(binary_warped, left, right):
+    '''
+    The search around the prior lines building a mask row by row, as find_lane_pixels_from_prior used to do, with the
+    rows of the masks clipped to the picture (the original slices wrapped around when a line was less than a margin
+    from the left border)
+    '''
+    margin = linesDetector.PRIOR_MARGIN * linesDetector.hyperparameters_scale(binary_warped)
+    width = binary_warped.shape[1]
+    masks = []
+    for line in (left, right):
+        mask = np.zeros(binary_warped.shape[:2])
+        for y in range(binary_warped.shape[0]):
+            # the columns x with plotx - margin <= x < plotx + margin
+            low = min(max(int(np.ceil(line.best_plotx[y] - margin)), 0), width)
+            high = min(max(int(np.ceil(line.best_plotx[y] + margin)), 0), width)
+            mask[y, low:high] = 1.0
+        masks.append(mask)
+    pixels = []
+    for mask in masks:
+        nonzeroy, nonzerox = (binary_warped * mask).nonzero()
+        pixels += [nonzerox, nonzeroy]
+    out_img = np.dstack([(masks[0] + masks[1]) * 255] * 3)
+    return pixels + [out_img]
+
+
+class FindLanePixelsFromPriorTest(TestCase):
+    '''
+    Checks the pixels found around the prior lines against the masks built row by row
+    '''
+    def prior_line(self, x, height):
+        line = Line()
+        ploty = np.linspace(0, height - 1, height)
+        line.update_fitted(np.array([0.0002, -0.2, x]), ploty)
+        return line
+
+    def assertSamePixels(self, binary_warped, left, right):
+        expected = find_lane_pixels_from_prior_loop(binary_warped, left, right)
+        actual = linesDetector.find_lane_pixels_from_prior(binary_warped, left, right, True)
+        for expected_coordinates, actual_coordinates in zip(expected[:4], actual[:4]):
+            np.testing.assert_array_equal(expected_coordinates, actual_coordinates)
+        np.testing.assert_array_equal(expected[4], actual[4])
+        self.assertIsNone(linesDetector.find_lane_pixels_from_prior(binary_warped, left, right, False)[4])
+
+    def test_lines(self):
+        binary_warped = np.zeros((720, 1280), dtype=np.uint8)
+        ys = np.arange(720)
+        for x in (310, 990):
+            binary_warped[ys, (x + 0.0002 * ys ** 2 - 0.2 * ys).astype(int)] = 1
+        binary_warped[np.random.RandomState(3).rand(720, 1280) < 0.02] = 1
+        left, right = self.prior_line(300, 720), self.prior_line(1000, 720)
+        expected = find_lane_pixels_from_prior_loop(binary_warped, left, right)
+        # both lines are found, with the noise around them
+        self.assertGreater(len(expected[0]), 720)
+        self.assertGreater(len(expected[2]), 720)
+        self.assertSamePixels(binary_warped, left, right)
+
+    def test_lines_near_the_borders(self):
+        random_state = np.random.RandomState(4)
+        for height, width, left_x, right_x in [(720, 1280, 30, 1250), (720, 1280, -150, 1400), (360, 640, 5, 600)]:
+            binary_warped = (random_state.rand(height, width) < 0.05).astype(np.float32)
+            self.assertSamePixels(binary_warped, self.prior_line(left_x, height), self.prior_line(right_x, height))
@@ -1,21 +1,28 @@
-import os
-
-import matplotlib.image as mpimg
+from batchProcessor import BatchProcessor
 from cameraCalibrator import CameraCalibrator
-from moviepy.editor import VideoFileClip
 from pipeline import Pipeline
+from streamingExecutor import StreamingExecutor
+from videoIO import open_reader, open_writer
+
+
+def process_pictures(camera_calibrator):
+    BatchProcessor(Pipeline(camera_calibrator=camera_calibrator)).process_directory("../test_images/",
+                                                                             "../test_images_output/")
+
+
+def process_video(camera_calibrator):
+    pipeline = Pipeline(camera_calibrator=camera_calibrator)
 
-camera_calibrator = CameraCalibrator()
+    # decoding, the pipeline and encoding overlap (see StreamingExecutor); reader.frames(0, 125) for a part only
+    with open_reader("../project_video.mp4") as reader, \
+            open_writer('../output.mp4', reader.fps, reader.size) as writer:
+        StreamingExecutor(pipeline).run(reader.frames(), writer.write)
 
-for current_file in os.listdir("../test_images/"):
-    if current_file.__contains__(".jpg"):
-        current_image = mpimg.imread("../test_images/" + current_file)
-        processed_image = Pipeline(camera_calibrator=camera_calibrator).pipeline(current_image)
-        mpimg.imsave("../test_images_output/" + current_file, processed_image)
 
-pipeline = Pipeline(camera_calibrator=camera_calibrator)
+if __name__ == '__main__':
+    camera_calibrator = CameraCalibrator()
+    # load the calibration from the cache (or compute it) before the first frame
+    camera_calibrator.initialize_transformation_matrix()
 
-white_output = '../output.mp4'
-clip1 = VideoFileClip("../project_video.mp4")  # .subclip(0,5)
-white_clip = clip1.fl_image(pipeline.pipeline)  # NOTE: this function expects color images!!
-white_clip.write_videofile(white_output, audio=False)
+    process_pictures(camera_calibrator)
+    process_video(camera_calibrator)
@@ -0,0 +1,107 @@
+import os
+import struct
+
+import numpy as np
+
+
+class NpyAppender:
+    '''
+    Writes an array to a .npy file a piece at a time, along its first axis (e.g. records, or the frames of a video).
+    The header of the file has room for any length, and it is rewritten after every piece, so the file can be read by
+    np.load at any time, and an interrupted write only loses the last piece
+    '''
+
+    def __init__(self, path, dtype, shape=(), append=False):
+        '''
+        :param path: path of the .npy file
+        :param dtype: type of the array
+        :param shape: shape of every item of the array, e.g. (height, width, 3) for the frames of a video
+        :param append: if True, the items are added to the ones already in the file (if it exists), otherwise the
+        file is overwritten
+        '''
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.shape = tuple(shape)
+        self.item_size = self.dtype.itemsize * int(np.prod(self.shape))
+        if append and os.path.exists(path):
+            self.file = open(path, 'r+b')
+            self.count, self.header_length = self._read_header()
+            if self.header_length < self._header_room():
+                # written by np.save, with no room for a longer header: rewritten with ours
+                items = np.load(path)
+                self.file.seek(0)
+                self.file.truncate()
+                self.count, self.header_length = 0, self._header_room()
+                self._write_header()
+                self.write(items)
+            # drops the items of an interrupted write, not counted by the header
+            self.file.seek(self.header_length + self.count * self.item_size)
+            self.file.truncate()
+        else:
+            self.file = open(path, 'w+b')
+            self.count, self.header_length = 0, self._header_room()
+            self._write_header()
+
+    def write(self, items):
+        '''
+        :param items: array of shape (n,) + shape
+        :return: Nothing
+        '''
+        items = np.ascontiguousarray(items, dtype=self.dtype)
+        if items.shape[1:] != self.shape:
+            raise ValueError('expected items of shape {}, got {}'.format(self.shape, items.shape[1:]))
+        self.file.write(items.tobytes())
+        self.count += len(items)
+        # the header is updated after the items, so it never counts items that are not in the file
+        self._write_header()
+        self.file.seek(0, os.SEEK_END)
+
+    def flush(self):
+        '''
+        Flushes the file
+        :return: Nothing
+        '''
+        self.file.flush()
+
+    def close(self):
+        '''
+        Closes the file
+        :return: Nothing
+        '''
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _header(self, count):
+        return "{'descr': %r, 'fortran_order': False, 'shape': %r, }" % (
+            np.lib.format.dtype_to_descr(self.dtype), (count,) + self.shape)
+
+    def _header_room(self):
+        # length of the magic string, of the header with the longest count, and of the final newline, rounded up to
+        # a multiple of 64 like np.save does: the header is rewritten in place, so it never has to grow
+        length = 10 + len(self._header(2 ** 63 - 1)) + 1
+        return (length + 63) // 64 * 64
+
+    def _write_header(self):
+        # magic string, version 1.0 and length of the header (little endian, as the format requires), then the header
+        # padded with spaces
+        prefix = np.lib.format.magic(1, 0) + struct.pack('<H', self.header_length - 10)
+        header = self._header(self.count).ljust(self.header_length - len(prefix) - 1) + '\n'
+        self.file.seek(0)
+        self.file.write(prefix + header.encode('latin1'))
+
+    def _read_header(self):
+        version = np.lib.format.read_magic(self.file)
+        if version != (1, 0):
+            raise ValueError('unsupported .npy version: {}'.format(version))
+        shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(self.file)
+        if dtype != self.dtype or fortran_order or len(shape) == 0 or tuple(shape[1:]) != self.shape:
+            raise ValueError('{} does not contain items of type {} and shape {}'.format(self.path, self.dtype,
+                                                                                      self.shape))
+        return shape[0], self.file.tell()
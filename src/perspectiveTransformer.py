@@ -1,22 +1,55 @@
-import matplotlib
-
-matplotlib.use('TkAgg')
 import numpy as np
 import cv2
 
 
+def scale_points(points, from_size, to_size):
+    '''
+    :param points: (x, y) pixel coordinates in a picture of size from_size
+    :param from_size: (width, height) of the picture the points are defined for
+    :param to_size: (width, height) of the resized picture
+    :return: the coordinates of the same points in the resized picture
+    '''
+    scale_x = to_size[0] / float(from_size[0])
+    scale_y = to_size[1] / float(from_size[1])
+    # the coordinates refer to the centers of the pixels, like in cv2.resize
+    return [((x + 0.5) * scale_x - 0.5, (y + 0.5) * scale_y - 0.5) for x, y in points]
+
+
 class PerspectiveTransformer:
     '''
     Transforms images between camera view and birt-eye view
     '''
     def __init__(self, src=[(188, 720), (1130, 720), (769, 500), (518, 500)],
-                 dst=[(350, 720), (950, 720), (950, 500), (350, 500)]):
+                 dst=[(350, 720), (950, 720), (950, 500), (350, 500)], size=(1280, 720)):
         '''
         :param src: The Coordinates of some predefined points in the camera view image
         :param dst: The coordinates of the points defined above in the bird-eye view image
+        :param size: (width, height) of the pictures the points are defined for
         '''
+        self.src = [tuple(point) for point in src]
+        self.dst = [tuple(point) for point in dst]
+        self.size = tuple(size)
         self.transform_matrix = cv2.getPerspectiveTransform(np.float32(src), np.float32(dst))
         self.inverse_transform_matrix = cv2.getPerspectiveTransform(np.float32(dst), np.float32(src))
+        # transformers for other resolutions, by size
+        self._scaled = {}
+
+    def scaled(self, width, height):
+        '''
+        :param width: width of the pictures
+        :param height: height of the pictures
+        :return: a PerspectiveTransformer for pictures of the given size, whose points are the points of this one
+        moved to the new resolution. This one if the size is the same
+        '''
+        size = (width, height)
+        if size == self.size:
+            return self
+        transformer = self._scaled.get(size)
+        if transformer is None:
+            transformer = PerspectiveTransformer(scale_points(self.src, self.size, size),
+                                                 scale_points(self.dst, self.size, size), size)
+            self._scaled[size] = transformer
+        return transformer
 
     def to_bird_eye(self, img):
         '''
@@ -26,6 +59,17 @@ class PerspectiveTransformer:
         '''
         return cv2.warpPerspective(img, self.transform_matrix, (img.shape[1], img.shape[0]), flags=cv2.INTER_LINEAR)
 
+    def points_to_bird_eye(self, points, frame_size=None):
+        '''
+        Converts the coordinates of some points to bird-eye view, without transforming a whole picture
+        :param points: EdgePoints in camera view
+        :param frame_size: (width, height) of the bird-eye view, by default the size of the camera view
+        :return: EdgePoints in bird-eye view, one per pixel
+        '''
+        if frame_size is None:
+            frame_size = (points.shape[1], points.shape[0])
+        return points.transform(self.transform_matrix, frame_size)
+
     def to_original(self, img):
         '''
         Converts an image to camera view
@@ -1,7 +1,10 @@
 import cv2
 import numpy as np
 
+from bufferArena import get_buffer
 
+# width of the lines painted on the lane, in pixels of a bird-eye view 720 pixels high
+LINE_WIDTH = 10
 
 
 class PictureAnnotator:
@@ -12,7 +15,7 @@ class PictureAnnotator:
     def __init__(self, perspective_transformer):
         self.perspective_transformer = perspective_transformer
 
-    def decorate(self, img, left, right, curvature, offset):
+    def decorate(self, img, left, right, curvature, offset, arena=None):
         '''
         Adds all the relevant information to an image
         :param img: An image
@@ -20,12 +23,12 @@ class PictureAnnotator:
         :param right: Detected right lane line
         :param curvature: Detected curvature radius
         :param offset: Detected distance from the center of the lane
+        :param arena: optional BufferArena providing the intermediate pictures
         :return: an image decorated where the lane is highlighted in green,
         and the curvature and offset values are written as text
         '''
-        mask = self.get_mask(img, left, right)
-        mask_unwarped = self.perspective_transformer.to_original(mask)
-        final = cv2.addWeighted(img, 1, mask_unwarped, 0.8, 1)
+        final = np.copy(img)
+        self.draw_lane(final, left, right, arena)
 
         self.write_curvature(curvature, final)
 
@@ -33,20 +36,66 @@ class PictureAnnotator:
 
         return final
 
-    def get_mask(self, img, left, right):
+    def draw_lane(self, img, left, right, arena=None):
         '''
-        :param img: Original image
+        Highlights the lane on an image: the area enclosed by the left and right lane lines is green, the lines are
+        red and blue.
+        Only the vertices of the lane polygons are transformed from bird-eye view to camera view, and the image
+        is blended only inside their bounding box.
+        The lines may have been detected on a smaller copy of the image (see the processing scale of the Pipeline):
+        the lane is drawn at the resolution of the image anyway
+        Compared to the former full frame mask transformed back to camera view, the borders of the polygons are sharp
+        instead of interpolated (pixels along them differ), and the blend adds no constant (its gamma is 0 instead of
+        1), so the pixels outside the lane are not changed at all
+        :param img: An image in camera view, modified in place
         :param left: Left line
         :param right: Right line
-        :return: a black image where the area enclosed by the left and right lane lines is green
+        :param arena: optional BufferArena providing the picture of the lane
+        :return: Nothing
         '''
-        mask = np.zeros_like(img, dtype=np.uint8)
+        # the areas to paint, as polygons in bird-eye view
+        ploty = left.ploty
+        line_width = LINE_WIDTH * len(ploty) / 720.
+        polygons = [(self.get_polygon(left.best_plotx, right.best_plotx, ploty), (0, 255, 0)),
+                    (self.get_polygon(left.best_plotx, left.best_plotx + line_width, ploty), (255, 0, 0)),
+                    (self.get_polygon(right.best_plotx, right.best_plotx + line_width, ploty), (0, 0, 255))]
+        scale = img.shape[0] / float(len(ploty))
+        if scale != 1:
+            # from the bird-eye view of the detection to the bird-eye view of the image, pixel centers aligned
+            polygons = [((polygon + 0.5) * scale - 0.5, color) for polygon, color in polygons]
+        matrix = self.perspective_transformer.scaled(img.shape[1], img.shape[0]).inverse_transform_matrix
+        polygons = [(cv2.perspectiveTransform(polygon, matrix), color) for polygon, color in polygons]
+
+        # bounding box of the lane in camera view, limited to the image
+        x, y, w, h = cv2.boundingRect(np.concatenate([polygon for polygon, color in polygons]))
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + w, img.shape[1]), min(y + h, img.shape[0])
+        if x1 <= x0 or y1 <= y0:
+            return
+
+        mask = get_buffer(arena, 'lane', img.shape, img.dtype)
+        if mask is None:
+            mask = np.zeros((y1 - y0, x1 - x0, img.shape[2]), dtype=img.dtype)
+        else:
+            # the bounding box changes every frame: only its part of the buffer is used
+            mask = mask[:y1 - y0, :x1 - x0]
+            mask.fill(0)
+        for polygon, color in polygons:
+            cv2.fillPoly(mask, [np.round(polygon - (x0, y0)).astype(np.int32)], color)
+
+        roi = img[y0:y1, x0:x1]
+        cv2.addWeighted(roi, 1, mask, 0.8, 0, dst=roi)
 
-        for y in left.ploty:
-            mask[int(y), int(left.best_plotx[int(y)]):int(right.best_plotx[int(y)])] = [0, 255, 0]
-            mask[int(y), int(left.best_plotx[int(y)]):int(left.best_plotx[int(y)] + 10)] = [255, 0, 0]
-            mask[int(y), int(right.best_plotx[int(y)]):int(right.best_plotx[int(y)] + 10)] = [0, 0, 255]
-        return mask
+    def get_polygon(self, from_x, to_x, ploty):
+        '''
+        :param from_x: x coordinates of the left border of the area, for every y coordinate
+        :param to_x: x coordinates of the right border of the area, for every y coordinate
+        :param ploty: the y coordinates
+        :return: the polygon enclosing the area, as expected by cv2.perspectiveTransform
+        '''
+        left_border = np.column_stack((from_x, ploty))
+        right_border = np.column_stack((to_x, ploty))[::-1]
+        return np.concatenate((left_border, right_border)).astype(np.float32).reshape(-1, 1, 2)
 
     def write_offset(self, final, offset):
         '''
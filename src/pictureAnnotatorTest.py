@@ -0,0 +1,51 @@
+from unittest import TestCase
+
+import cv2
+import matplotlib.image as mpimg
+import numpy as np
+
+from line import Line
+from perspectiveTransformer import PerspectiveTransformer
+from pictureAnnotator import PictureAnnotator
+
+
+def draw_lane_full_mask(img, left, right, perspective_transformer):
+    '''
+    Highlights the lane as PictureAnnotator.decorate used to do: a bird-eye mask painted row by row, transformed back
+    to camera view as a whole picture, and blended with the whole image (with gamma 1)
+    '''
+    mask = np.zeros_like(img, dtype=np.uint8)
+    for y in left.ploty:
+        y = int(y)
+        mask[y, int(left.best_plotx[y]):int(right.best_plotx[y])] = [0, 255, 0]
+        mask[y, int(left.best_plotx[y]):int(left.best_plotx[y] + 10)] = [255, 0, 0]
+        mask[y, int(right.best_plotx[y]):int(right.best_plotx[y] + 10)] = [0, 0, 255]
+    mask_unwarped = perspective_transformer.to_original(mask)
+    return cv2.addWeighted(img, 1, mask_unwarped, 0.8, 1), mask_unwarped
+
+
+class DrawLaneTest(TestCase):
+    '''
+    Compares the lane drawn from the vertices of its polygons with the lane drawn from a full frame mask
+    '''
+    def test_same_lane_as_full_mask(self):
+        img = mpimg.imread('../test_images/test1.jpg')
+        perspective_transformer = PerspectiveTransformer()
+        ploty = np.linspace(0, 719, 720)
+        left, right = Line(), Line()
+        left.update_fitted(np.array([2e-4, -0.2, 320.]), ploty)
+        right.update_fitted(np.array([2e-4, -0.2, 1010.]), ploty)
+
+        expected, mask = draw_lane_full_mask(img, left, right, perspective_transformer)
+        drawn = np.copy(img)
+        PictureAnnotator(perspective_transformer).draw_lane(drawn, left, right)
+
+        difference = np.abs(expected.astype(int) - drawn).max(axis=2)
+        # the full frame blend added 1 (gamma) to every pixel, and smeared the borders of the polygons
+        self.assertLess(np.mean(difference), 2)
+        self.assertLess(np.mean(difference > 10), 0.01)
+        borders = cv2.morphologyEx(mask, cv2.MORPH_GRADIENT, np.ones((3, 3), np.uint8)).max(axis=2) > 0
+        self.assertEqual(0, np.count_nonzero((difference > 10) & ~borders))
+        # the pixels outside the lane are not changed
+        outside = (mask.max(axis=2) == 0) & ~borders
+        np.testing.assert_array_equal(img[outside], drawn[outside])
@@ -1,34 +1,145 @@
-import matplotlib
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-matplotlib.use('TkAgg')
-import matplotlib.pyplot as plt
+import cv2
 
 from cameraCalibrator import CameraCalibrator
 from perspectiveTransformer import PerspectiveTransformer
 from edgesDetector import EdgesDetector
+from geometryEngine import GeometryEngine
 import linesDetector
 from line import Line
 from pictureAnnotator import PictureAnnotator
 import curvatureDetector
+from bufferArena import BufferArena, get_buffer
+from edgePoints import EdgePoints
+from telemetry import lane_telemetry
 
 debug = False
 
+# diagnostics levels of the pipeline
+# no visualization buffer is allocated
+DIAGNOSTICS_OFF = 'off'
+# the image of the detected lane pixels (and of the searched area) is built, and sent to the debug sink
+DIAGNOSTICS_OVERLAY = 'overlay'
+# the edges and their bird-eye view are sent to the debug sink as well
+DIAGNOSTICS_FULL = 'full'
+
+
+def to_image(edges):
+    '''
+    :param edges: a picture of edges, or EdgePoints
+    :return: the picture of the edges
+    '''
+    if isinstance(edges, EdgePoints):
+        return edges.to_image()
+    return edges
+
+
+class TrackedFrame:
+    '''
+    The lines of a frame, tracked by Pipeline.track_frame, and what is needed to finish the frame
+    '''
+
+    def __init__(self, frame_index, detected, left, right, curvature, offset, bird_eye_width, debug_img, artifacts):
+        '''
+        :param frame_index: index of the frame in its video
+        :param detected: whether the lines were detected on the frame, or extrapolated
+        :param left: the left line of the frame
+        :param right: the right line of the frame
+        :param curvature: the curvature radius of the lane
+        :param offset: the offset from the center of the lane
+        :param bird_eye_width: width of the bird-eye view of the last frame detected
+        :param debug_img: the image for debugging purposes, None if not built
+        :param artifacts: the debug images sent to the debug sink by name, None if there are none
+        '''
+        self.frame_index = frame_index
+        self.detected = detected
+        self.left = left
+        self.right = right
+        self.curvature = curvature
+        self.offset = offset
+        self.bird_eye_width = bird_eye_width
+        self.debug_img = debug_img
+        self.artifacts = artifacts
+
+    def snapshot(self):
+        '''
+        :return: a copy whose lines are not affected by the frames tracked later (see Line.snapshot)
+        '''
+        return TrackedFrame(self.frame_index, self.detected, self.left.snapshot(), self.right.snapshot(),
+                            self.curvature, self.offset, self.bird_eye_width, self.debug_img, self.artifacts)
+
 
 class Pipeline:
     '''
     Detects the lane lines on an image
     '''
     def __init__(self, camera_calibrator=CameraCalibrator(), perspective_transformer=PerspectiveTransformer(),
-                 edges_detector=EdgesDetector(), picture_annotator=None):
+                 edges_detector=EdgesDetector(compact=True), picture_annotator=None, geometry_engine=None,
+                 diagnostics=DIAGNOSTICS_OFF, debug_sink=None, profiler=None, crop_to_roi=True, processing_scale=1.0,
+                 detection_engines=None, adaptive_rate=None, sparse=False, telemetry_sink=None):
+        '''
+        :param diagnostics: DIAGNOSTICS_OFF, DIAGNOSTICS_OVERLAY or DIAGNOSTICS_FULL. The module variable debug forces
+        DIAGNOSTICS_FULL, and shows the images as well
+        :param debug_sink: callable receiving the index of every frame and a dictionary of its debug images by name,
+        e.g. a DebugArtifactWriter. Only called when diagnostics are enabled
+        :param profiler: StageProfiler measuring the duration of every stage, None doesn't measure anything
+        :param crop_to_roi: if True, the stateless stages only process the part of the frame where edges are kept and
+        that is visible in bird-eye view, instead of the whole frame. The result is almost the same: the bird-eye view
+        interpolated from the crop rounds a few pixels differently (by 1 gray level), which can move the fitted lines
+        by a pixel, so on some frames (e.g. straight_lines1.jpg) about 0.1% of the pixels of the annotated frame,
+        along the borders of the painted lane, differ
+        :param processing_scale: the lines are detected on a copy of the frames resized by this factor, e.g. 0.5 detects
+        them at 640x360 on 1280x720 frames. The calibration, the perspective transformation and the hyperparameters
+        are scaled accordingly, and the lane is drawn on the frames at their own resolution
+        :param detection_engines: chooses the detection engine searching the lane pixels of every frame, e.g.
+        detectionEngines.CostBasedEngines. None uses the default of linesDetector.fit_polynomial
+        :param adaptive_rate: an AdaptiveRate, skipping the detection on some frames while the tracking is stable
+        (the lines are extrapolated on them). None detects the lines on every frame
+        :param sparse: if True, only the coordinates of the edges are transformed to bird-eye view (see EdgePoints),
+        instead of the whole picture of the edges
+        :param telemetry_sink: callable receiving the telemetry of every frame (see telemetry.lane_telemetry), e.g. a
+        TelemetryWriter
+        '''
         self.camera_calibrator = camera_calibrator
         self.perspective_transformer = perspective_transformer
+        if (geometry_engine is None):
+            # undistorts and warps the frames with cached lookup maps
+            self.geometry_engine = GeometryEngine(camera_calibrator, perspective_transformer)
+        else:
+            self.geometry_engine = geometry_engine
         self.edges_detector = edges_detector
         if (picture_annotator is None):
             self.picture_annotator = PictureAnnotator(perspective_transformer)
         else:
-            self.pictureAnnotator = picture_annotator
+            self.picture_annotator = picture_annotator
         self.left = Line()
         self.right = Line()
+        self.diagnostics = diagnostics
+        self.debug_sink = debug_sink
+        self.frame_index = 0
+        self.profiler = profiler
+        self.crop_to_roi = crop_to_roi
+        # crop rectangles, computed once per resolution
+        self.crops = {}
+        self.processing_scale = processing_scale
+        self.detection_engines = detection_engines
+        self.adaptive_rate = adaptive_rate
+        self.sparse = sparse
+        # the pictures of the stages, reused from frame to frame
+        self.buffers = BufferArena()
+        self.telemetry_sink = telemetry_sink
+        # width of the bird-eye view of the last frame detected
+        self.bird_eye_width = None
+        # geometry engines for the resolutions the frames are processed at, see get_geometry_engine
+        self.geometry_engines = {}
+
+    def diagnostics_level(self):
+        '''
+        :return: the diagnostics level currently in use
+        '''
+        return DIAGNOSTICS_FULL if debug else self.diagnostics
 
     def pipeline(self, img):
         '''
@@ -36,31 +147,345 @@ class Pipeline:
         :return: (hopefully) the image where the most central lane is highlighted in green, and the curvature radius
         and the distance between the center of the picture and the center of the lane is printed
         '''
-        undistorted = self.camera_calibrator.undistort(img)
-
-        edges = self.edges_detector.detectEdges(undistorted)
-
-        warped = self.perspective_transformer.to_bird_eye(edges)
-
-        self.left, self.right, debug_img = linesDetector.fit_polynomial(warped, self.left, self.right)
+        return self.process_frame(img, True)[0]
 
-        curvature = curvatureDetector.measure_curvature_real(self.left, self.right)
-
-        offset = curvatureDetector.measure_offset_real(self.left, self.right, img.shape[1])
+    def analyze(self, img):
+        '''
+        Telemetry mode: runs the pipeline without annotating the frame
+        :param img: An image representing a road with lane lines
+        :return: the telemetry of the frame, as a record of telemetry.TELEMETRY_DTYPE
+        '''
+        return self.process_frame(img, False)[1]
 
-        final = self.picture_annotator.decorate(img, self.left, self.right, curvature, offset)
+    def process_frame(self, img, render, state=None):
+        '''
+        Processes a frame with the steps start_frame, detect, track_frame and finish_frame
+        :param img: An image representing a road with lane lines
+        :param render: whether to annotate the frame
+        :param state: the tracking state of the video the frame belongs to (see track_frame), None is the pipeline
+        itself
+        :return: the annotated frame (None if not rendered), and the telemetry of the frame (None if it is neither
+        returned nor sent to the telemetry sink)
+        '''
+        self.start_frame()
+        edges = warped = None
+        if self.should_detect(state):
+            # the edges are only needed until the next frame, unless they are sent to the debug sink
+            edges, warped = self.detect(img, reuse_outputs=self.diagnostics_level() != DIAGNOSTICS_FULL)
+        tracked = self.track_frame(edges, warped, state)
+        final, record = self.finish_frame(img, tracked, render, state)
 
-        if (debug):
+        if (debug and tracked.detected and final is not None):
             print("pipeline is in debug mode")
+            # imported only here, so the pipeline starts fast and works without a display
+            import matplotlib.pyplot as plt
             f, (ax1, ax2, ax3) = plt.subplots(1, 3, figsize=(24, 9))
             f.tight_layout()
-            ax1.imshow(edges)
+            ax1.imshow(to_image(edges))
             ax1.set_title('edges', fontsize=50)
-            ax2.imshow(debug_img)
+            ax2.imshow(tracked.debug_img)
             ax2.set_title('lines', fontsize=50)
             ax3.imshow(final)
             ax3.set_title('final', fontsize=50)
             plt.subplots_adjust(left=0., right=1, top=0.9, bottom=0.)
             plt.show()
 
-        return final
+        return final, record
+
+    def start_frame(self):
+        '''
+        First step of a frame: starts measuring it on the current thread
+        :return: Nothing
+        '''
+        if self.profiler is not None:
+            self.profiler.start_frame()
+        self.buffers.start_frame()
+
+    def detach_frame(self):
+        '''
+        Lets the next steps of the frame started on the current thread run on another thread (see attach_frame)
+        :return: the measurement of the frame, None if there is no profiler
+        '''
+        if self.profiler is None:
+            return None
+        return self.profiler.detach_frame()
+
+    def attach_frame(self, frame):
+        '''
+        Goes on measuring a frame on the current thread
+        :param frame: the measurement returned by detach_frame
+        :return: Nothing
+        '''
+        if self.profiler is not None:
+            self.profiler.attach_frame(frame)
+
+    def should_detect(self, state=None):
+        '''
+        :param state: the tracking state of a video (see track_frame), None is the pipeline itself
+        :return: whether the next frame of the video has to be detected, or its lines are extrapolated
+        '''
+        state = self if state is None else state
+        return state.adaptive_rate is None or state.adaptive_rate.should_detect()
+
+    def track_frame(self, edges, warped, state=None):
+        '''
+        Stateful step of a frame: updates the lines of a video with the edges of its next frame, or extrapolates them
+        if the adaptive rate skips the frame (its edges are then ignored). Frames must be passed in order
+        :param edges: the edges of the frame returned by detect, None if the frame has not been detected
+        :param warped: the edges in bird-eye view returned by detect, None if the frame has not been detected
+        :param state: the tracking state of the video: an object with the left, right, frame_index, bird_eye_width,
+        adaptive_rate, detection_engines, telemetry_sink and debug_sink attributes of a Pipeline, e.g. a
+        laneService.StreamState. None is the pipeline itself
+        :return: the TrackedFrame, to be passed to finish_frame
+        '''
+        state = self if state is None else state
+        detected = self.should_detect(state)
+        debug_img = artifacts = None
+        if not detected:
+            # the tracking is stable: the lines of this frame are extrapolated from the last detections
+            left, right, curvature, offset = self.run_stage('extrapolate', self.extrapolate, state)
+        else:
+            if warped is None:
+                raise ValueError("the frame has to be detected")
+            diagnostics = self.diagnostics_level()
+            state.left, state.right, curvature, offset, debug_img = self.track_lines(
+                warped, state.left, state.right, diagnostics != DIAGNOSTICS_OFF, state.detection_engines)
+            state.bird_eye_width = warped.shape[1]
+            left, right = state.left, state.right
+            if state.adaptive_rate is not None:
+                state.adaptive_rate.update(left, right, warped.shape[1], state.frame_index)
+            if diagnostics != DIAGNOSTICS_OFF and state.debug_sink is not None and debug_img is not None:
+                artifacts = {'lines': debug_img}
+                if diagnostics == DIAGNOSTICS_FULL:
+                    artifacts['edges'] = to_image(edges)
+                    artifacts['warped'] = to_image(warped)
+
+        tracked = TrackedFrame(state.frame_index, detected, left, right, curvature, offset, state.bird_eye_width,
+                               debug_img, artifacts)
+        state.frame_index += 1
+        return tracked
+
+    def finish_frame(self, img, tracked, render, state=None):
+        '''
+        Last step of a frame: annotates it, sends its telemetry and its debug images to the sinks of the video, and
+        ends its measurement. Frames must be passed in order
+        :param img: the frame
+        :param tracked: the TrackedFrame returned by track_frame
+        :param render: whether to annotate the frame
+        :param state: the tracking state of the video (see track_frame), None is the pipeline itself
+        :return: the annotated frame (None if not rendered), and the telemetry of the frame (None if it is neither
+        returned nor sent to the telemetry sink)
+        '''
+        state = self if state is None else state
+        final = record = None
+        if render:
+            final = self.run_stage('decorate', self.picture_annotator.decorate, img, tracked.left, tracked.right,
+                                   tracked.curvature, tracked.offset, arena=self.buffers)
+        if not render or state.telemetry_sink is not None:
+            record = lane_telemetry(tracked.frame_index, tracked.detected, tracked.left, tracked.right,
+                                    tracked.curvature, tracked.offset, tracked.bird_eye_width)
+            if state.telemetry_sink is not None:
+                state.telemetry_sink(record)
+        if tracked.artifacts is not None and state.debug_sink is not None:
+            state.debug_sink(tracked.frame_index, tracked.artifacts)
+        if self.profiler is not None:
+            self.profiler.end_frame(tracked.frame_index)
+        return final, record
+
+    def process_batch(self, images, workers=None):
+        '''
+        Detects the lane lines on a batch of independent pictures (not frames of the same video).
+        The calibration and the geometry are shared, every picture is tracked with its own fresh lines, and the
+        state of the pipeline is not changed. Pictures are processed by a thread pool, so pictures with the same
+        resolution share the cached lookup maps and masks
+        :param images: list of images representing a road with lane lines
+        :param workers: number of threads, None uses the default of ThreadPoolExecutor
+        :return: the list of annotated images, in the same order
+        '''
+        self.ensure_calibrated()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            detected = list(executor.map(self.detect, images))
+            return list(executor.map(self._process_still, images, detected))
+
+    def ensure_calibrated(self):
+        '''
+        Calibrates the camera if it is not calibrated yet. Called before frames are detected on several threads, so
+        the calibration is computed (or loaded from the cache) once, not by every thread
+        :return: Nothing
+        '''
+        camera_calibrator = self.geometry_engine.camera_calibrator
+        if camera_calibrator.mtx is None:
+            camera_calibrator.initialize_transformation_matrix()
+
+    def _process_still(self, img, detected):
+        edges, warped = detected
+        left, right, curvature, offset, debug_img = self.track_lines(warped, Line(), Line(), False)
+        return self.run_stage('decorate', self.picture_annotator.decorate, img, left, right, curvature, offset,
+                              arena=self.buffers)
+
+    def fit_polynomial(self, warped, left, right, debug_image, detection_engines=None):
+        '''
+        Detects the lines with the detection engine chosen for the frame, telling the engines how long it took
+        :param detection_engines: chooses the detection engine, None uses the detection engines of the pipeline
+        :return: the same values as linesDetector.fit_polynomial
+        '''
+        detection_engines = self.detection_engines if detection_engines is None else detection_engines
+        if detection_engines is None:
+            return self.run_stage('fit_polynomial', linesDetector.fit_polynomial, warped, left, right, debug_image)
+        engine = detection_engines.select(left, right)
+        start = time.perf_counter()
+        result = self.run_stage('fit_polynomial', linesDetector.fit_polynomial, warped, left, right, debug_image,
+                                engine=engine)
+        detection_engines.record(engine, (time.perf_counter() - start) * 1000)
+        return result
+
+    def run_stage(self, stage, function, *args, **kwargs):
+        '''
+        Runs a stage of the pipeline, measuring it if there is a profiler
+        :param stage: name of the stage
+        :param function: the function implementing the stage
+        :param args: arguments of the function
+        :param kwargs: keyword arguments of the function
+        :return: the result of the function
+        '''
+        if self.profiler is None:
+            return function(*args, **kwargs)
+        return self.profiler.time(stage, function, *args, **kwargs)
+
+    def processing_size(self, width, height):
+        '''
+        :param width: width of the frames
+        :param height: height of the frames
+        :return: the size (width, height) the frames are processed at
+        '''
+        if self.processing_scale == 1:
+            return width, height
+        return max(int(round(width * self.processing_scale)), 1), max(int(round(height * self.processing_scale)), 1)
+
+    def resize(self, img):
+        '''
+        :param img: a frame
+        :return: the frame resized to the processing size, the frame itself if the processing scale is 1
+        '''
+        size = self.processing_size(img.shape[1], img.shape[0])
+        if size == (img.shape[1], img.shape[0]):
+            return img
+        resized = self.buffers.get('resized', (size[1], size[0]) + img.shape[2:], img.dtype)
+        return cv2.resize(img, size, dst=resized, interpolation=cv2.INTER_AREA)
+
+    def get_geometry_engine(self, width, height):
+        '''
+        :param width: width of the processed frames
+        :param height: height of the processed frames
+        :return: the GeometryEngine for the processed frames: the calibration and the perspective transformation of
+        the geometry engine of the pipeline, moved from the resolution they are defined for to the given one
+        '''
+        engine = self.geometry_engines.get((width, height))
+        if engine is None:
+            camera_calibrator = self.geometry_engine.camera_calibrator.scaled(width, height)
+            perspective_transformer = self.geometry_engine.perspective_transformer.scaled(width, height)
+            if (camera_calibrator is self.geometry_engine.camera_calibrator and
+                    perspective_transformer is self.geometry_engine.perspective_transformer):
+                engine = self.geometry_engine
+            else:
+                engine = GeometryEngine(camera_calibrator, perspective_transformer)
+            self.geometry_engines[(width, height)] = engine
+        return engine
+
+    def get_crop(self, width, height):
+        '''
+        :param width: width of the frames
+        :param height: height of the frames
+        :return: the rectangle (x, y, width, height) of the frames processed by the stateless stages: the region
+        where edges are kept, intersected with the part of the frame visible in bird-eye view.
+        The whole frame if crop_to_roi is False
+        '''
+        crop = self.crops.get((width, height))
+        if crop is None:
+            crop = (0, 0, width, height)
+            if self.crop_to_roi:
+                roi_x, roi_y, roi_w, roi_h = self.edges_detector.get_roi_rect(width, height)
+                view_x, view_y, view_w, view_h = self.get_geometry_engine(width, height).bird_eye_footprint(
+                    (width, height))
+                # 2 more pixels on every side, so the Sobel kernel and the bilinear interpolation of the bird-eye
+                # transformation see the same neighbours as on the whole frame
+                x0 = max(max(roi_x, view_x) - 2, 0)
+                y0 = max(max(roi_y, view_y) - 2, 0)
+                x1 = min(min(roi_x + roi_w, view_x + view_w) + 2, width)
+                y1 = min(min(roi_y + roi_h, view_y + view_h) + 2, height)
+                if x1 > x0 and y1 > y0:
+                    crop = (x0, y0, x1 - x0, y1 - y0)
+            self.crops[(width, height)] = crop
+        return crop
+
+    def detect(self, img, reuse_outputs=False):
+        '''
+        Stateless stages of the pipeline: they can run on several frames at the same time
+        :param img: An image representing a road with lane lines
+        :param reuse_outputs: if True, the returned pictures are buffers of the arena, overwritten by the next frame
+        detected on the same thread. Otherwise they are new arrays, which can be kept while other frames are detected
+        :return: the detected edges (only in the crop rectangle, see get_crop), and the edges transformed to
+        bird-eye view, both at the processing scale. In sparse mode both are EdgePoints
+        '''
+        if self.processing_scale != 1:
+            # a calibration set by hand refers to the frames, not to their resized copies
+            self.geometry_engine.camera_calibrator.assume_size(img.shape[1], img.shape[0])
+            img = self.run_stage('resize', self.resize, img)
+        frame_size = (img.shape[1], img.shape[0])
+        geometry_engine = self.get_geometry_engine(*frame_size)
+        crop = self.get_crop(*frame_size)
+        origin = crop[:2]
+
+        undistorted = self.buffers.get('undistorted', (crop[3], crop[2]) + img.shape[2:], img.dtype)
+        undistorted = self.run_stage('undistort', geometry_engine.undistort, img, roi=crop, dst=undistorted)
+
+        if self.sparse:
+            edges = self.run_stage('detectEdges', self.edges_detector.detectEdgePoints, undistorted, origin=origin,
+                                   frame_size=frame_size, arena=self.buffers)
+            warped = self.run_stage('to_bird_eye', geometry_engine.perspective_transformer.points_to_bird_eye, edges,
+                                    frame_size=frame_size)
+            return edges, warped
+
+        outputs = self.buffers if reuse_outputs else None
+        edges = self.run_stage('detectEdges', self.edges_detector.detectEdges, undistorted, origin=origin,
+                               frame_size=frame_size, arena=self.buffers,
+                               dst=get_buffer(outputs, 'edges', undistorted.shape[:2]))
+
+        warped = self.run_stage('to_bird_eye', geometry_engine.to_bird_eye, edges, origin=origin,
+                                frame_size=frame_size,
+                                dst=get_buffer(outputs, 'warped', (frame_size[1], frame_size[0]) + edges.shape[2:],
+                                               edges.dtype))
+
+        return edges, warped
+
+    def track_lines(self, warped, left, right, debug_image, detection_engines=None):
+        '''
+        Fits the lines of a frame and measures the lane, without storing them (see track_frame)
+        :param warped: the edges of a frame, in bird-eye view
+        :param left: the left line of the previous frames
+        :param right: the right line of the previous frames
+        :param debug_image: whether to build the image for debugging purposes
+        :param detection_engines: chooses the detection engine, None uses the detection engines of the pipeline
+        :return: the updated left and right lines, the curvature radius, the offset from the center of the lane,
+        and an image for debugging purposes (None if not built)
+        '''
+        left, right, debug_img = self.fit_polynomial(warped, left, right, debug_image, detection_engines)
+
+        curvature = self.run_stage('curvature', curvatureDetector.measure_curvature_real, left, right,
+                                   warped.shape[1])
+
+        offset = self.run_stage('offset', curvatureDetector.measure_offset_real, left, right, warped.shape[1])
+
+        return left, right, curvature, offset, debug_img
+
+    def extrapolate(self, state=None):
+        '''
+        Stateful stage replacing detect and track on the frames skipped by the adaptive rate
+        :param state: the tracking state of the video (see track_frame), None is the pipeline itself
+        :return: the lines extrapolated to the frame, the curvature radius and the offset from the center of the lane
+        '''
+        state = self if state is None else state
+        left, right = state.adaptive_rate.extrapolate(state.left, state.right, state.frame_index)
+        curvature = curvatureDetector.measure_curvature_real(left, right, state.bird_eye_width)
+        offset = curvatureDetector.measure_offset_real(left, right, state.bird_eye_width)
+        return left, right, curvature, offset
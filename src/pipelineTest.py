@@ -0,0 +1,100 @@
+import time
+from unittest import TestCase
+
+import matplotlib.image as mpimg
+import numpy as np
+
+from cameraCalibrator import CameraCalibrator
+from pipeline import Pipeline
+
+
+def hand_set_calibrator():
+    '''
+    :return: a CameraCalibrator whose mtx and dist are set by hand, without the size of the calibration pictures
+    '''
+    calibrated = CameraCalibrator()
+    calibrated.initialize_transformation_matrix()
+    calibrator = CameraCalibrator(cache_path=None)
+    calibrator.mtx = np.array(calibrated.mtx)
+    calibrator.dist = np.array(calibrated.dist)
+    return calibrator
+
+
+class HandSetCalibrationTest(TestCase):
+    '''
+    Checks that a calibration without the size of its pictures can be used by the pipeline
+    '''
+    def test_same_result_as_calibrated_pipeline(self):
+        img = mpimg.imread('../test_images/test1.jpg')
+        expected = Pipeline().pipeline(img)
+
+        final = Pipeline(camera_calibrator=hand_set_calibrator()).pipeline(img)
+        np.testing.assert_array_equal(expected, final)
+
+    def test_processing_scale(self):
+        img = mpimg.imread('../test_images/test1.jpg')
+        expected = Pipeline(processing_scale=0.5).pipeline(img)
+
+        calibrator = hand_set_calibrator()
+        final = Pipeline(camera_calibrator=calibrator, processing_scale=0.5).pipeline(img)
+        # the calibration refers to the frames, not to their resized copies
+        self.assertEqual((img.shape[1], img.shape[0]), calibrator.img_size)
+        np.testing.assert_array_equal(expected, final)
+
+
+class ProcessBatchTest(TestCase):
+    '''
+    Checks that the pictures of a batch are processed like by their own pipelines
+    '''
+    def test_same_result_as_fresh_pipelines(self):
+        names = ['test1.jpg', 'straight_lines1.jpg', 'test5.jpg', 'test2.jpg', 'test1.jpg', 'straight_lines2.jpg']
+        images = [mpimg.imread('../test_images/' + name) for name in names]
+        expected = [Pipeline().pipeline(img) for img in images]
+
+        pipeline = Pipeline()
+        results = pipeline.process_batch(images, workers=3)
+        self.assertEqual(len(expected), len(results))
+        for expected_image, image in zip(expected, results):
+            np.testing.assert_array_equal(expected_image, image)
+        # the state of the pipeline is not changed
+        self.assertEqual(0, pipeline.frame_index)
+        self.assertIsNone(pipeline.left.best_fit)
+
+    def test_calibrates_once(self):
+        images = [mpimg.imread('../test_images/' + name) for name in ['test1.jpg', 'test2.jpg', 'test5.jpg']]
+        calibrated = hand_set_calibrator()
+        calibrator = CameraCalibrator(cache_path=None)
+        calibrations = []
+
+        def initialize_transformation_matrix():
+            calibrations.append(time.perf_counter())
+            # slow enough for the threads of the pool to ask for the calibration at the same time
+            time.sleep(0.1)
+            calibrator.dist = calibrated.dist
+            calibrator.mtx = calibrated.mtx
+        calibrator.initialize_transformation_matrix = initialize_transformation_matrix
+
+        Pipeline(camera_calibrator=calibrator).process_batch(images, workers=3)
+        self.assertEqual(1, len(calibrations))
+
+
+class CropToRoiTest(TestCase):
+    '''
+    Checks that processing only the road area of the frames gives almost the same result as the whole frames
+    '''
+    def test_same_result_as_whole_frames(self):
+        for name in ['straight_lines1', 'straight_lines2', 'test1', 'test2', 'test3', 'test4', 'test5', 'test6']:
+            img = mpimg.imread('../test_images/' + name + '.jpg')
+            cropped, whole = Pipeline(crop_to_roi=True), Pipeline(crop_to_roi=False)
+
+            warped = cropped.detect(img)[1]
+            expected_warped = whole.detect(img)[1]
+            np.testing.assert_allclose(expected_warped.astype(int), warped.astype(int), atol=1, err_msg=name)
+
+            final = cropped.pipeline(img)
+            expected = whole.pipeline(img)
+            for line, expected_line in [(cropped.left, whole.left), (cropped.right, whole.right)]:
+                np.testing.assert_allclose(expected_line.best_plotx, line.best_plotx, atol=1, err_msg=name)
+            # the pixels along the borders of the painted lane
+            different = np.any(final != expected, axis=2)
+            self.assertLess(np.mean(different), 0.005, name)
@@ -0,0 +1,75 @@
+'''
+Least squares fitting of the 2nd grade polynomials x = A * y ** 2 + B * y + C describing the lane lines.
+
+Instead of np.polyfit, the points of every line are reduced to the 3x3 matrix and the vector of the normal equations
+(their moments), and the equations of all the lines are solved at once. Points can be weighted.
+The coefficients are returned in the same order as np.polyfit: [A, B, C]
+'''
+import numpy as np
+
+
+def moments(x, y, weights=None, scale=1.):
+    '''
+    :param x: x coordinates of the points
+    :param y: y coordinates of the points
+    :param weights: optional weight of every point in the sum of the squared errors, by default 1 for all of them
+    :param scale: the y coordinates are divided by this value (e.g. the height of the picture) before computing the
+    moments, so their powers stay close to 1 and the equations are well conditioned. Pass the same value to solve
+    :return: the 3x3 matrix and the vector of the normal equations of the points
+    '''
+    t = np.asarray(y, dtype=np.float64) / scale
+    powers = np.vstack((t * t, t, np.ones_like(t)))
+    weighted = powers if weights is None else powers * np.asarray(weights, dtype=np.float64)
+    return weighted.dot(powers.T), weighted.dot(np.asarray(x, dtype=np.float64))
+
+
+def solve(matrices, vectors, scale=1.):
+    '''
+    Solves the normal equations of several lines at once
+    :param matrices: the 3x3 matrices of the normal equations, see moments
+    :param vectors: the vectors of the normal equations
+    :param scale: the value the y coordinates have been divided by
+    :return: the coefficients of the polynomial of every line (an array of shape (n, 3)), and for every line whether
+    its equations could be solved: the points of a line must lie on at least 3 different rows
+    '''
+    matrices = np.asarray(matrices, dtype=np.float64)
+    vectors = np.asarray(vectors, dtype=np.float64)
+    solved = np.linalg.matrix_rank(matrices) == 3
+    coefficients = np.zeros(vectors.shape)
+    if np.any(solved):
+        coefficients[solved] = np.linalg.solve(matrices[solved], vectors[solved][..., np.newaxis])[..., 0]
+    # back to the original y coordinates
+    coefficients[:, 0] /= scale * scale
+    coefficients[:, 1] /= scale
+    return coefficients, solved
+
+
+def fit_lines(points, scale=1.):
+    '''
+    :param points: for every line, a tuple (x, y, weights) with the coordinates of its points and their weights
+    (None for equal weights)
+    :param scale: a value in the order of magnitude of the y coordinates, e.g. the height of the picture
+    :return: the coefficients of the polynomial of every line, and whether it could be fitted (see solve)
+    '''
+    equations = [moments(x, y, weights, scale) for x, y, weights in points]
+    return solve([matrix for matrix, vector in equations], [vector for matrix, vector in equations], scale)
+
+
+def to_meters(fit, xm, ym):
+    '''
+    Converts the coefficients of a polynomial from pixels to meters, without fitting it again
+    :param fit: coefficients [A, B, C] of the polynomial in pixels
+    :param xm: meters per pixel in x dimension
+    :param ym: meters per pixel in y dimension
+    :return: the coefficients of the same curve, with x and y in meters
+    '''
+    return np.array([fit[0] * xm / (ym * ym), fit[1] * xm / ym, fit[2] * xm])
+
+
+def curvature_radius(fit, y):
+    '''
+    :param fit: coefficients [A, B, C] of the polynomial
+    :param y: y coordinate where the radius is computed, in the same unit as the polynomial
+    :return: the curvature radius of the polynomial in y
+    '''
+    return ((1 + (2 * fit[0] * y + fit[1]) ** 2) ** 1.5) / np.absolute(2 * fit[0])
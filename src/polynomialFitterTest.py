@@ -0,0 +1,64 @@
+from unittest import TestCase
+
+import numpy as np
+
+import polynomialFitter
+import linesDetector
+from line import Line
+
+
+class PolynomialFitterTest(TestCase):
+    '''
+    Compares the fits solved from the normal equations with np.polyfit
+    '''
+    def setUp(self):
+        random_state = np.random.RandomState(0)
+        self.y = random_state.randint(0, 720, 5000)
+        self.x = (300 + 0.1 * self.y - 0.0003 * self.y ** 2 + random_state.normal(0, 5, self.y.shape)).astype(int)
+        self.weights = random_state.uniform(0.1, 2, self.y.shape)
+
+    def test_fit(self):
+        fits, fitted = polynomialFitter.fit_lines([(self.x, self.y, None), (self.x + 600, self.y, None)], scale=720)
+        np.testing.assert_allclose(np.polyfit(self.y, self.x, 2), fits[0], rtol=1e-7, atol=1e-9)
+        np.testing.assert_allclose(np.polyfit(self.y, self.x + 600, 2), fits[1], rtol=1e-7, atol=1e-9)
+        self.assertTrue(np.all(fitted))
+
+    def test_weighted_fit(self):
+        fits, fitted = polynomialFitter.fit_lines([(self.x, self.y, self.weights)], scale=720)
+        # np.polyfit weights the residuals, not their squares
+        expected = np.polyfit(self.y, self.x, 2, w=np.sqrt(self.weights))
+        np.testing.assert_allclose(expected, fits[0], rtol=1e-7, atol=1e-9)
+
+    def test_not_enough_rows(self):
+        fits, fitted = polynomialFitter.fit_lines([(self.x, self.y, None), (np.array([1, 2]), np.array([3, 4]), None),
+                                                   (np.array([]), np.array([]), None)], scale=720)
+        self.assertEqual([True, False, False], list(fitted))
+
+    def test_curvature_in_meters(self):
+        xm, ym = 3.7 / 600, 40 / 720.
+        fit = np.polyfit(self.y, self.x, 2)
+        ploty = np.arange(720.)
+        plotx = np.polyval(fit, ploty)
+        expected = np.polyfit(ploty * ym, plotx * xm, 2)
+        np.testing.assert_allclose(expected, polynomialFitter.to_meters(fit, xm, ym), rtol=1e-6)
+        # x = 0.0003 y^2 + 0.1 y: at y = 0 the radius is (1 + 0.1^2)^1.5 / 0.0006
+        self.assertAlmostEqual((1 + 0.1 ** 2) ** 1.5 / 0.0006,
+                               polynomialFitter.curvature_radius([0.0003, 0.1, 5.], 0.))
+
+    def test_artificial_point_weight(self):
+        binary_warped = np.zeros((720, 1280), dtype=np.uint8)
+        # the left line is visible only in the bottom windows, the rest of its fit relies on the artificial points
+        ys = np.arange(480, 720)
+        binary_warped[ys, 300 + (720 - ys) // 4] = 1
+        binary_warped[ys, 301 + (720 - ys) // 4] = 1
+        binary_warped[:, 1000:1006] = 1
+        left_pixels, right_pixels, left_artificial, right_artificial, out_img = linesDetector.sliding_window_search(
+            binary_warped, False)
+        self.assertGreater(len(left_artificial[0]), 0)
+
+        left, right, out_img = linesDetector.fit_polynomial(binary_warped, Line(), Line(), False,
+                                                            artificial_point_weight=0.)
+        np.testing.assert_allclose(np.polyfit(left_pixels[1], left_pixels[0], 2), left.current_fit, atol=1e-6)
+        left, right, out_img = linesDetector.fit_polynomial(binary_warped, Line(), Line(), False)
+        leftx, lefty = linesDetector.join_points(left_pixels, left_artificial)
+        np.testing.assert_allclose(np.polyfit(lefty, leftx, 2), left.current_fit, atol=1e-6)
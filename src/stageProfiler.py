@@ -0,0 +1,181 @@
+import csv
+import json
+import threading
+import time
+from collections import OrderedDict, deque
+
+import numpy as np
+
+# the stages of the Pipeline, in the order they run: the columns of the CSV trace
+PIPELINE_STAGES = ('resize', 'undistort', 'detectEdges', 'to_bird_eye', 'fit_polynomial', 'curvature', 'offset',
+                   'extrapolate', 'decorate')
+
+
+class StageProfiler:
+    '''
+    Measures the wall-clock time of the stages of the Pipeline.
+    Keeps rolling statistics per stage, optionally writes a trace with the timings of every frame (JSON lines or CSV),
+    and notifies the subscribed hooks at the end of every frame.
+    A Pipeline without profiler doesn't measure anything
+    '''
+
+    def __init__(self, window=1000, trace_path=None, trace_format='jsonl', stages=PIPELINE_STAGES):
+        '''
+        :param window: number of most recent measurements per stage used for the statistics
+        :param trace_path: File system path of the per frame trace, None doesn't write it
+        :param trace_format: 'jsonl' (one JSON object per frame) or 'csv'
+        :param stages: names of all the stages that can be measured, the columns of the CSV trace (followed by
+        'total'). The cells of the stages that didn't run on a frame are empty, and the stages that are not in the
+        list are written to the last column, 'other', as a JSON object
+        '''
+        if trace_format not in ('jsonl', 'csv'):
+            raise ValueError("unknown trace format: " + str(trace_format))
+        self.window = window
+        self.trace_path = trace_path
+        self.trace_format = trace_format
+        self.stages = list(stages)
+        if set(self.stages) & {'frame', 'total', 'other'}:
+            raise ValueError("'frame', 'total' and 'other' are columns of the CSV trace, not stages")
+        self.hooks = []
+        # most recent measurements in milliseconds, by stage name
+        self.samples = OrderedDict()
+        self._lock = threading.Lock()
+        # timings of the frame being processed by the current thread
+        self._local = threading.local()
+        self._trace_file = None
+        self._csv_writer = None
+
+    def add_hook(self, hook):
+        '''
+        :param hook: callable receiving the index of every frame and the dictionary of its timings in milliseconds
+        by stage name (including 'total')
+        :return: Nothing
+        '''
+        self.hooks.append(hook)
+
+    def remove_hook(self, hook):
+        self.hooks.remove(hook)
+
+    def start_frame(self):
+        '''
+        Starts measuring a new frame on the current thread
+        :return: Nothing
+        '''
+        self._local.start = time.perf_counter()
+        self._local.timings = OrderedDict()
+
+    def detach_frame(self):
+        '''
+        Stops measuring the frame of the current thread, so its next stages can be measured on another thread
+        (see attach_frame)
+        :return: the frame, None if no frame is measured on the current thread
+        '''
+        timings = getattr(self._local, 'timings', None)
+        if timings is None:
+            return None
+        self._local.timings = None
+        return self._local.start, timings
+
+    def attach_frame(self, frame):
+        '''
+        Goes on measuring a frame on the current thread. Its total duration is measured from start_frame anyway
+        :param frame: the frame returned by detach_frame
+        :return: Nothing
+        '''
+        if frame is not None:
+            self._local.start, self._local.timings = frame
+
+    def time(self, stage, function, *args, **kwargs):
+        '''
+        Calls a function, measuring how long it takes
+        :param stage: name of the stage
+        :param function: the function implementing the stage
+        :param args: arguments of the function
+        :param kwargs: keyword arguments of the function
+        :return: the result of the function
+        '''
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        self.record(stage, (time.perf_counter() - start) * 1000)
+        return result
+
+    def record(self, stage, milliseconds):
+        '''
+        Records the duration of a stage
+        :param stage: name of the stage
+        :param milliseconds: its duration
+        :return: Nothing
+        '''
+        with self._lock:
+            samples = self.samples.get(stage)
+            if samples is None:
+                samples = self.samples[stage] = deque(maxlen=self.window)
+            samples.append(milliseconds)
+        timings = getattr(self._local, 'timings', None)
+        if timings is not None:
+            timings[stage] = milliseconds
+
+    def end_frame(self, frame_index):
+        '''
+        Ends the frame started on the current thread: records its total duration, writes it to the trace and
+        notifies the hooks
+        :param frame_index: index of the frame
+        :return: the timings of the frame in milliseconds, by stage name
+        '''
+        timings = getattr(self._local, 'timings', None)
+        if timings is None:
+            return None
+        self.record('total', (time.perf_counter() - self._local.start) * 1000)
+        self._local.timings = None
+
+        if self.trace_path is not None:
+            self._write_trace(frame_index, timings)
+        for hook in self.hooks:
+            hook(frame_index, timings)
+        return timings
+
+    def statistics(self):
+        '''
+        :return: for every stage, the number of measurements in the window and their mean, p50, p95 and p99
+        in milliseconds
+        '''
+        with self._lock:
+            samples = [(stage, np.array(values)) for stage, values in self.samples.items()]
+        statistics = OrderedDict()
+        for stage, values in samples:
+            p50, p95, p99 = np.percentile(values, [50, 95, 99])
+            statistics[stage] = {'count': len(values), 'mean': float(np.mean(values)),
+                                 'p50': float(p50), 'p95': float(p95), 'p99': float(p99)}
+        return statistics
+
+    def close(self):
+        '''
+        Closes the trace file
+        :return: Nothing
+        '''
+        with self._lock:
+            if self._trace_file is not None:
+                self._trace_file.close()
+                self._trace_file = None
+                self._csv_writer = None
+
+    def _write_trace(self, frame_index, timings):
+        row = OrderedDict([('frame', frame_index)])
+        row.update((stage, round(milliseconds, 4)) for stage, milliseconds in timings.items())
+        with self._lock:
+            if self._trace_file is None:
+                self._trace_file = open(self.trace_path, 'w', newline='')
+                if self.trace_format == 'csv':
+                    # the columns are all the known stages, not only the ones of the first frame
+                    self._csv_writer = csv.DictWriter(self._trace_file,
+                                                      fieldnames=['frame'] + self.stages + ['total', 'other'])
+                    self._csv_writer.writeheader()
+            if self._csv_writer is not None:
+                # the stages without a column are kept in the last one, instead of failing the frame
+                other = OrderedDict((stage, row.pop(stage)) for stage in list(row)
+                                    if stage not in self._csv_writer.fieldnames)
+                if other:
+                    row['other'] = json.dumps(other)
+                self._csv_writer.writerow(row)
+            else:
+                self._trace_file.write(json.dumps(row) + '\n')
@@ -0,0 +1,78 @@
+import csv
+import json
+import os
+import tempfile
+from unittest import TestCase
+
+import matplotlib.image as mpimg
+
+from adaptiveRate import AdaptiveRate
+
+from pipeline import Pipeline
+from stageProfiler import StageProfiler
+
+
+class StageProfilerTest(TestCase):
+    '''
+    Checks the timings collected by StageProfiler while running the Pipeline
+    '''
+    def test_profile_pipeline(self):
+        img = mpimg.imread('../test_images/test1.jpg')
+        with tempfile.TemporaryDirectory() as tmp:
+            trace_path = os.path.join(tmp, 'trace.jsonl')
+            profiler = StageProfiler(trace_path=trace_path)
+            frames = []
+            profiler.add_hook(lambda frame_index, timings: frames.append(frame_index))
+
+            pipeline = Pipeline(profiler=profiler)
+            for idx in range(3):
+                pipeline.pipeline(img)
+            profiler.close()
+
+            stages = ['undistort', 'detectEdges', 'to_bird_eye', 'fit_polynomial', 'curvature', 'offset',
+                      'decorate', 'total']
+            statistics = profiler.statistics()
+            self.assertEqual(sorted(stages), sorted(statistics))
+            for stage in stages:
+                self.assertEqual(3, statistics[stage]['count'])
+                self.assertLessEqual(statistics[stage]['p50'], statistics[stage]['p99'])
+            self.assertEqual([0, 1, 2], frames)
+
+            with open(trace_path) as f:
+                trace = [json.loads(line) for line in f]
+            self.assertEqual([0, 1, 2], [row['frame'] for row in trace])
+            self.assertEqual(['frame'] + stages, list(trace[0]))
+
+    def test_csv_trace_has_the_stages_of_later_frames(self):
+        img = mpimg.imread('../test_images/test1.jpg')
+        with tempfile.TemporaryDirectory() as tmp:
+            trace_path = os.path.join(tmp, 'trace.csv')
+            profiler = StageProfiler(trace_path=trace_path, trace_format='csv')
+            # the first frames are detected, the following ones extrapolated
+            pipeline = Pipeline(profiler=profiler, adaptive_rate=AdaptiveRate(max_interval=2))
+            for idx in range(6):
+                pipeline.pipeline(img)
+            profiler.close()
+
+            with open(trace_path, newline='') as f:
+                trace = list(csv.DictReader(f))
+            self.assertEqual(6, len(trace))
+            self.assertEqual('', trace[0]['extrapolate'])
+            self.assertTrue(any(row['extrapolate'] != '' for row in trace))
+
+    def test_csv_trace_keeps_unknown_stages(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            trace_path = os.path.join(tmp, 'trace.csv')
+            profiler = StageProfiler(trace_path=trace_path, trace_format='csv')
+            for frame_index in range(2):
+                profiler.start_frame()
+                profiler.record('undistort', 2.)
+                if frame_index == 1:
+                    profiler.record('unknown', 1.)
+                self.assertIsNotNone(profiler.end_frame(frame_index))
+            profiler.close()
+
+            with open(trace_path, newline='') as f:
+                trace = list(csv.DictReader(f))
+            self.assertEqual(['', '{"unknown": 1.0}'], [row['other'] for row in trace])
+            self.assertEqual(['2.0', '2.0'], [row['undistort'] for row in trace])
@@ -0,0 +1,162 @@
+import queue
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# marks the end of the stream in the queues
+_END = object()
+
+
+class StreamingExecutor:
+    '''
+    Runs a Pipeline on a stream of frames, overlapping the steps of consecutive frames (see Pipeline.process_frame):
+    decoding, the stateless stages (Pipeline.detect, on a thread pool), the stateful stage (Pipeline.track_frame, one
+    frame at a time and in order) and the annotation/encoding (Pipeline.finish_frame, which also feeds the sinks and
+    the profiler of the pipeline).
+    The results are the same as Pipeline.process_frame. Since the frames are detected ahead of the tracking, with an
+    adaptive rate the frames it skips are still detected, only their tracking is replaced by the extrapolation.
+    The stages are connected by bounded queues, so a slow stage blocks the ones before it instead of accumulating frames.
+    Threads are enough, since OpenCV releases the GIL while it works.
+    '''
+
+    def __init__(self, pipeline, queue_size=4, workers=2):
+        '''
+        :param pipeline: the Pipeline to run
+        :param queue_size: maximum number of frames waiting between two stages
+        :param workers: number of threads running the stateless stages
+        '''
+        self.pipeline = pipeline
+        self.queue_size = queue_size
+        self.workers = workers
+        # the queue in front of every stage, by stage name
+        self.queues = OrderedDict()
+        # occupancy statistics of the queues: [samples, sum of the sizes, max size], by stage name
+        self.occupancy_samples = OrderedDict()
+        self.frames = 0
+
+    def run(self, frames, sink):
+        '''
+        Processes a stream of frames
+        :param frames: iterable of images (e.g. a generator decoding a video); it is consumed on a separate thread
+        :param sink: callable receiving the annotated frames in order (e.g. a video encoder)
+        :return: the number of processed frames
+        '''
+        self.queues = OrderedDict((name, queue.Queue(self.queue_size)) for name in ('detect', 'track', 'annotate'))
+        self.occupancy_samples = OrderedDict((name, [0, 0, 0]) for name in self.queues)
+        self.frames = 0
+        stop = threading.Event()
+        errors = []
+
+        self.pipeline.ensure_calibrated()
+        pool = ThreadPoolExecutor(max_workers=self.workers)
+        stages = [(self._decode, (frames,)), (self._detect, (pool,)), (self._track, ())]
+        threads = [threading.Thread(target=self._run_stage, args=(stage, args, stop, errors), daemon=True)
+                   for stage, args in stages]
+        for thread in threads:
+            thread.start()
+        try:
+            self._annotate(sink, stop)
+        except BaseException as e:
+            errors.append(e)
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+            pool.shutdown()
+        if errors:
+            raise errors[0]
+        return self.frames
+
+    def queue_occupancy(self):
+        '''
+        :return: for every stage, the current, mean and maximum number of frames waiting in its queue, and the capacity
+        '''
+        occupancy = OrderedDict()
+        for name, q in self.queues.items():
+            samples, total, maximum = self.occupancy_samples[name]
+            occupancy[name] = {'current': q.qsize(),
+                               'mean': total / float(samples) if samples else 0.0,
+                               'max': maximum,
+                               'capacity': self.queue_size}
+        return occupancy
+
+    def _run_stage(self, stage, args, stop, errors):
+        try:
+            stage(*args, stop=stop)
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+
+    def _put(self, name, item, stop):
+        # blocks while the queue is full (backpressure), unless the executor is stopping
+        q = self.queues[name]
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _get(self, name, stop):
+        q = self.queues[name]
+        stats = self.occupancy_samples[name]
+        size = q.qsize()
+        stats[0] += 1
+        stats[1] += size
+        stats[2] = max(stats[2], size)
+        while not stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        return _END
+
+    def _decode(self, frames, stop):
+        try:
+            for frame in frames:
+                if not self._put('detect', frame, stop):
+                    return
+        finally:
+            self._put('detect', _END, stop)
+
+    def _detect(self, pool, stop):
+        # the futures are queued in order, so the tracking stage receives the frames in order
+        try:
+            item = self._get('detect', stop)
+            while item is not _END:
+                if not self._put('track', (item, pool.submit(self._detect_frame, item)), stop):
+                    return
+                item = self._get('detect', stop)
+        finally:
+            self._put('track', _END, stop)
+
+    def _detect_frame(self, img):
+        # runs on the thread pool: the measurement of the frame starts here, and goes on in the next stages
+        self.pipeline.start_frame()
+        edges, warped = self.pipeline.detect(img)
+        return edges, warped, self.pipeline.detach_frame()
+
+    def _track(self, stop):
+        try:
+            item = self._get('track', stop)
+            while item is not _END:
+                img, future = item
+                edges, warped, frame = future.result()
+                self.pipeline.attach_frame(frame)
+                # a snapshot of the lines, since the next frame will update them while this one is annotated
+                tracked = self.pipeline.track_frame(edges, warped).snapshot()
+                if not self._put('annotate', (img, tracked, self.pipeline.detach_frame()), stop):
+                    return
+                item = self._get('track', stop)
+        finally:
+            self._put('annotate', _END, stop)
+
+    def _annotate(self, sink, stop):
+        item = self._get('annotate', stop)
+        while item is not _END:
+            img, tracked, frame = item
+            self.pipeline.attach_frame(frame)
+            sink(self.pipeline.finish_frame(img, tracked, True)[0])
+            self.frames += 1
+            item = self._get('annotate', stop)
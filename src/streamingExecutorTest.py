@@ -0,0 +1,73 @@
+from unittest import TestCase
+
+import matplotlib.image as mpimg
+import numpy as np
+
+from adaptiveRate import AdaptiveRate
+from pipeline import Pipeline, DIAGNOSTICS_OVERLAY
+from stageProfiler import StageProfiler
+from streamingExecutor import StreamingExecutor
+
+
+class StreamingExecutorTest(TestCase):
+    '''
+    Checks that overlapping the stages of consecutive frames doesn't change the result of the pipeline
+    '''
+    def test_same_result_as_sequential_pipeline(self):
+        frames = [mpimg.imread('../test_images/test' + str(idx) + '.jpg') for idx in [1, 2, 3, 4, 5, 6, 1, 2]]
+
+        sequential = Pipeline()
+        expected = [sequential.pipeline(frame) for frame in frames]
+
+        results = []
+        executor = StreamingExecutor(Pipeline(), queue_size=2, workers=3)
+        self.assertEqual(len(frames), executor.run(iter(frames), results.append))
+
+        self.assertEqual(len(expected), len(results))
+        for expected_frame, frame in zip(expected, results):
+            np.testing.assert_array_equal(expected_frame, frame)
+        for occupancy in executor.queue_occupancy().values():
+            self.assertLessEqual(occupancy['max'], 2)
+
+    def test_errors_are_raised(self):
+        def frames():
+            yield mpimg.imread('../test_images/test1.jpg')
+            raise IOError('broken stream')
+
+        with self.assertRaises(IOError):
+            StreamingExecutor(Pipeline()).run(frames(), lambda frame: None)
+
+    def test_same_sinks_as_sequential_pipeline(self):
+        frames = [mpimg.imread('../test_images/test' + str(idx) + '.jpg') for idx in [1, 1, 1, 1, 1, 2, 3, 3]]
+
+        def run(process):
+            telemetry, artifacts, timings = [], [], []
+            profiler = StageProfiler()
+            profiler.add_hook(lambda frame_index, frame_timings: timings.append((frame_index, sorted(frame_timings))))
+            pipeline = Pipeline(adaptive_rate=AdaptiveRate(max_interval=2), telemetry_sink=telemetry.append,
+                                diagnostics=DIAGNOSTICS_OVERLAY,
+                                debug_sink=lambda frame_index, images: artifacts.append((frame_index, images)),
+                                profiler=profiler)
+            results = process(pipeline)
+            return results, telemetry, artifacts, timings
+
+        expected = run(lambda pipeline: [pipeline.pipeline(frame) for frame in frames])
+        results = []
+        streamed = run(lambda pipeline: StreamingExecutor(pipeline, queue_size=2, workers=3).run(iter(frames),
+                                                                                                 results.append))
+        self.assertEqual(len(frames), streamed[0])
+
+        for expected_frame, frame in zip(expected[0], results):
+            np.testing.assert_array_equal(expected_frame, frame)
+        # some frames were extrapolated
+        self.assertFalse(all(record['detected'] for record in expected[1]))
+        np.testing.assert_array_equal(np.array(expected[1]), np.array(streamed[1]))
+        self.assertEqual([frame_index for frame_index, images in expected[2]],
+                         [frame_index for frame_index, images in streamed[2]])
+        for (frame_index, expected_images), (frame_index, images) in zip(expected[2], streamed[2]):
+            np.testing.assert_array_equal(expected_images['lines'], images['lines'])
+        # the frames skipped by the adaptive rate are detected anyway, ahead of the tracking
+        self.assertEqual([frame_index for frame_index, stages in expected[3]],
+                         [frame_index for frame_index, stages in streamed[3]])
+        for (frame_index, expected_stages), (frame_index, stages) in zip(expected[3], streamed[3]):
+            self.assertLessEqual(set(expected_stages), set(stages))
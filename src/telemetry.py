@@ -0,0 +1,97 @@
+import numpy as np
+
+from npyAppender import NpyAppender
+
+# the telemetry of a frame: the polynomials x = a*y^2 + b*y + c of the lines (average of the last fits, in pixels of
+# the bird-eye view, NaN if the line has never been fitted), whether they were found on the frame, the curvature
+# radius and the offset from the center of the lane in meters, and the size of the bird-eye view.
+# 'detected' is False on the frames where the lines were extrapolated instead of detected (see AdaptiveRate)
+TELEMETRY_DTYPE = np.dtype([('frame', np.int64),
+                            ('detected', np.bool_),
+                            ('left_detected', np.bool_),
+                            ('right_detected', np.bool_),
+                            ('left_fit', np.float64, (3,)),
+                            ('right_fit', np.float64, (3,)),
+                            ('curvature', np.float64),
+                            ('offset', np.float64),
+                            ('width', np.int32),
+                            ('height', np.int32)])
+
+
+def lane_telemetry(frame_index, detected, left, right, curvature, offset, width):
+    '''
+    :param frame_index: index of the frame
+    :param detected: whether the lines were detected on the frame, or extrapolated
+    :param left: the left line of the frame
+    :param right: the right line of the frame
+    :param curvature: the curvature radius of the lane
+    :param offset: the offset from the center of the lane
+    :param width: width of the bird-eye view
+    :return: the telemetry of the frame, as a record of TELEMETRY_DTYPE
+    '''
+    record = np.zeros((), dtype=TELEMETRY_DTYPE)
+    record['frame'] = frame_index
+    record['detected'] = detected
+    record['left_detected'] = left.detected
+    record['right_detected'] = right.detected
+    record['left_fit'] = np.nan if left.best_fit is None else left.best_fit
+    record['right_fit'] = np.nan if right.best_fit is None else right.best_fit
+    record['curvature'] = curvature
+    record['offset'] = offset
+    record['width'] = width or 0
+    record['height'] = 0 if left.ploty is None else len(left.ploty)
+    return record
+
+
+class TelemetryWriter:
+    '''
+    Writes the telemetry of the frames to a .npy file (see NpyAppender), as a record array of TELEMETRY_DTYPE that
+    np.load reads back. The records are written in batches, so an interrupted run only loses the last batch.
+    Can be used as the telemetry sink of a Pipeline
+    '''
+
+    def __init__(self, path, batch_size=256, append=False):
+        '''
+        :param path: path of the .npy file
+        :param batch_size: number of records written at once
+        :param append: if True, the records are added to the ones already in the file (if it exists), otherwise the
+        file is overwritten
+        '''
+        self.file = NpyAppender(path, TELEMETRY_DTYPE, append=append)
+        self.batch = np.empty(batch_size, dtype=TELEMETRY_DTYPE)
+        self.pending = 0
+
+    def __call__(self, record):
+        '''
+        :param record: the telemetry of a frame, a record of TELEMETRY_DTYPE
+        :return: Nothing
+        '''
+        self.batch[self.pending] = record
+        self.pending += 1
+        if self.pending == len(self.batch):
+            self.flush()
+
+    def flush(self):
+        '''
+        Writes the records received since the last batch
+        :return: Nothing
+        '''
+        if self.pending > 0:
+            self.file.write(self.batch[:self.pending])
+            self.pending = 0
+        self.file.flush()
+
+    def close(self):
+        '''
+        Writes the last records, and closes the file
+        :return: Nothing
+        '''
+        if self.file.file is not None:
+            self.flush()
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,82 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+import matplotlib.image as mpimg
+import numpy as np
+
+from adaptiveRate import AdaptiveRate
+from pipeline import Pipeline
+from telemetry import TELEMETRY_DTYPE, TelemetryWriter
+
+
+class TelemetryWriterTest(TestCase):
+    '''
+    Checks that the telemetry files can be read by np.load after every batch, and appended to
+    '''
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'telemetry.npy')
+        self.records = np.zeros(10, dtype=TELEMETRY_DTYPE)
+        self.records['frame'] = np.arange(10)
+        self.records['left_fit'] = np.random.RandomState(0).rand(10, 3)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_batches(self):
+        with TelemetryWriter(self.path, batch_size=4) as writer:
+            for record in self.records[:6]:
+                writer(record)
+            # only the first batch is written
+            np.testing.assert_array_equal(self.records[:4], np.load(self.path))
+            for record in self.records[6:]:
+                writer(record)
+        np.testing.assert_array_equal(self.records, np.load(self.path))
+
+    def test_append(self):
+        with TelemetryWriter(self.path) as writer:
+            for record in self.records[:3]:
+                writer(record)
+        # an interrupted batch, not counted by the header
+        with open(self.path, 'ab') as f:
+            f.write(self.records[3:5].tobytes()[:-7])
+        with TelemetryWriter(self.path, append=True) as writer:
+            for record in self.records[3:]:
+                writer(record)
+        np.testing.assert_array_equal(self.records, np.load(self.path))
+
+    def test_append_to_saved_array(self):
+        np.save(self.path, self.records[:9])
+        with TelemetryWriter(self.path, append=True) as writer:
+            writer(self.records[9])
+        np.testing.assert_array_equal(self.records, np.load(self.path))
+
+
+class PipelineTelemetryTest(TestCase):
+    '''
+    Checks that the telemetry mode reports the same lines as the annotated frames
+    '''
+    def test_same_lines_as_pipeline(self):
+        frames = [mpimg.imread('../test_images/test' + str(idx) + '.jpg') for idx in [1, 2, 3, 4, 5, 6]]
+        records = []
+        pipeline = Pipeline(telemetry_sink=records.append)
+        telemetry = Pipeline()
+        for frame in frames:
+            pipeline.pipeline(frame)
+            record = telemetry.analyze(frame)
+            np.testing.assert_array_equal(pipeline.left.best_fit, record['left_fit'])
+            np.testing.assert_array_equal(pipeline.right.best_fit, record['right_fit'])
+        records = np.array(records)
+        np.testing.assert_array_equal(np.arange(len(frames)), records['frame'])
+        self.assertTrue(np.all(records['detected']))
+        self.assertTrue(np.all(records['width'] == 1280) and np.all(records['height'] == 720))
+
+    def test_extrapolated_frames(self):
+        frame = mpimg.imread('../test_images/straight_lines1.jpg')
+        pipeline = Pipeline(adaptive_rate=AdaptiveRate())
+        records = np.array([pipeline.analyze(frame) for _ in range(8)])
+        self.assertFalse(np.all(records['detected']))
+        self.assertTrue(np.all(np.isfinite(records['left_fit'])))
+        self.assertTrue(np.all(np.isfinite(records['curvature'])))
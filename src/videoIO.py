@@ -0,0 +1,537 @@
+import inspect
+import json
+import math
+import os
+import queue
+import shutil
+import subprocess
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+from npyAppender import NpyAppender
+
+# marks the end of the frames in the read ahead queue
+_END = object()
+
+
+class VideoReader:
+    '''
+    Base class of the video decoders: reads the frames of a video as RGB pictures, starting from any frame.
+    Subclasses set frame_count, fps and size in _open, and implement _seek and _read
+    '''
+
+    def __init__(self, path):
+        '''
+        :param path: File system path of the video
+        '''
+        self.path = path
+        # number of frames reported by the container (it may be approximate), frames per second, (width, height)
+        self.frame_count = 0
+        self.fps = 0.
+        self.size = (0, 0)
+        # index of the frame returned by the next read
+        self.position = 0
+        self._open()
+
+    def seek(self, frame):
+        '''
+        Moves to a frame: the next read returns exactly that frame
+        :param frame: index of the frame
+        :return: Nothing
+        '''
+        frame = max(int(frame), 0)
+        if frame != self.position:
+            self._seek(frame)
+            self.position = frame
+
+    def seek_time(self, seconds):
+        '''
+        Moves to the first frame shown at or after a time
+        :param seconds: time from the beginning of the video
+        :return: Nothing
+        '''
+        self.seek(int(math.ceil(seconds * self.fps - 1e-6)))
+
+    def read(self):
+        '''
+        :return: the next frame as an RGB picture, None at the end of the video
+        '''
+        frame = self._read()
+        if frame is not None:
+            self.position += 1
+        return frame
+
+    def frames(self, start=0, end=None):
+        '''
+        :param start: index of the first frame
+        :param end: index after the last frame, None reads until the end of the video
+        :return: generator of the frames from start to end, as RGB pictures
+        '''
+        self.seek(start)
+        while end is None or self.position < end:
+            frame = self.read()
+            if frame is None:
+                return
+            yield frame
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _open(self):
+        raise NotImplementedError()
+
+    def _seek(self, frame):
+        raise NotImplementedError()
+
+    def _read(self):
+        raise NotImplementedError()
+
+
+class OpenCVReader(VideoReader):
+    '''
+    Decodes a video with cv2.VideoCapture
+    '''
+
+    def _open(self):
+        self.capture = cv2.VideoCapture(self.path)
+        if not self.capture.isOpened():
+            raise IOError('OpenCV cannot open ' + self.path)
+        self.frame_count = int(self.capture.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.fps = self.capture.get(cv2.CAP_PROP_FPS)
+        self.size = (int(self.capture.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                     int(self.capture.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+
+    def _seek(self, frame):
+        # the decoder starts from the previous keyframe and decodes forward
+        self.capture.set(cv2.CAP_PROP_POS_FRAMES, frame)
+        if int(self.capture.get(cv2.CAP_PROP_POS_FRAMES)) != frame:
+            # the container doesn't support seeking: the frames before are decoded and dropped
+            self.capture.release()
+            self.capture = cv2.VideoCapture(self.path)
+            for _ in range(frame):
+                if not self.capture.grab():
+                    break
+
+    def _read(self):
+        ret, frame = self.capture.read()
+        if not ret:
+            return None
+        # the pipeline works on RGB pictures, OpenCV on BGR
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+    def close(self):
+        self.capture.release()
+
+
+class FFmpegReader(VideoReader):
+    '''
+    Decodes a video with an ffmpeg process, reading the raw RGB frames from a pipe.
+    Seeking restarts the process from the time of the frame, computed from the frame rate and the start time of the
+    video stream. It is frame exact on videos with a constant frame rate, and best effort on the others (e.g. variable
+    frame rate, or streams with missing timestamps)
+    '''
+
+    def __init__(self, path, ffmpeg='ffmpeg', ffprobe='ffprobe'):
+        '''
+        :param path: File system path of the video
+        :param ffmpeg: the ffmpeg executable
+        :param ffprobe: the ffprobe executable, reading the format of the video
+        '''
+        self.ffmpeg = ffmpeg
+        self.ffprobe = ffprobe
+        self.process = None
+        # seconds from the start of the file to the first frame of the video stream (e.g. after the audio)
+        self.start_offset = 0.
+        VideoReader.__init__(self, path)
+
+    def _open(self):
+        output = subprocess.check_output([self.ffprobe, '-v', 'error', '-select_streams', 'v:0', '-show_entries',
+                                          'stream=width,height,r_frame_rate,nb_frames,duration,start_time'
+                                          ':format=start_time', '-of', 'json', self.path])
+        probe = json.loads(output.decode())
+        stream = probe['streams'][0]
+        self.size = (int(stream['width']), int(stream['height']))
+        numerator, denominator = stream['r_frame_rate'].split('/')
+        self.fps = float(numerator) / float(denominator)
+        if str(stream.get('nb_frames', '')).isdigit():
+            self.frame_count = int(stream['nb_frames'])
+        elif 'duration' in stream:
+            self.frame_count = int(round(float(stream['duration']) * self.fps))
+        try:
+            # -ss is relative to the start time of the file, not of the video stream
+            self.start_offset = max(float(stream['start_time']) - float(probe['format']['start_time']), 0.)
+        except (KeyError, ValueError):
+            # unknown start times, e.g. "N/A"
+            self.start_offset = 0.
+
+    def _seek(self, frame):
+        # the next read starts a new decoder from the frame
+        self._stop()
+
+    def _read(self):
+        if self.process is None:
+            self._start(self.position)
+        frame = np.empty((self.size[1], self.size[0], 3), dtype=np.uint8)
+        if self.process.stdout.readinto(memoryview(frame).cast('B')) < frame.nbytes:
+            return None
+        return frame
+
+    def _start(self, frame):
+        args = [self.ffmpeg, '-v', 'error']
+        if frame > 0:
+            # half a frame earlier, so rounding doesn't skip the frame
+            args += ['-ss', '{:.6f}'.format(self.start_offset + (frame - 0.5) / self.fps)]
+        args += ['-i', self.path, '-map', '0:v:0', '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-']
+        self.process = subprocess.Popen(args, stdout=subprocess.PIPE)
+
+    def _stop(self):
+        if self.process is not None:
+            self.process.kill()
+            self.process.stdout.close()
+            self.process.wait()
+            self.process = None
+
+    def close(self):
+        self._stop()
+
+
+class MoviePyReader(VideoReader):
+    '''
+    Decodes a video with moviepy, when neither OpenCV nor ffmpeg can
+    '''
+
+    def _open(self):
+        # imported only here, so the other backends don't pay for loading moviepy
+        from moviepy.editor import VideoFileClip
+        self.clip = VideoFileClip(self.path, audio=False)
+        self.fps = self.clip.fps
+        self.size = tuple(self.clip.size)
+        self.frame_count = int(round(self.clip.duration * self.fps))
+
+    def _seek(self, frame):
+        # every frame is read by its time
+        pass
+
+    def _read(self):
+        if self.position >= self.frame_count:
+            return None
+        return self.clip.get_frame(self.position / self.fps)
+
+    def close(self):
+        self.clip.close()
+
+
+class NpyReader(VideoReader):
+    '''
+    Reads the frames of a raw .npy dump (see NpyWriter)
+    '''
+
+    def __init__(self, path, fps=25.):
+        '''
+        :param path: File system path of the .npy file
+        :param fps: frames per second, which the file doesn't store
+        '''
+        self.frames_array = np.load(path, mmap_mode='r')
+        VideoReader.__init__(self, path)
+        self.fps = fps
+
+    def _open(self):
+        self.frame_count = len(self.frames_array)
+        self.size = (self.frames_array.shape[2], self.frames_array.shape[1])
+
+    def _seek(self, frame):
+        pass
+
+    def _read(self):
+        if self.position >= self.frame_count:
+            return None
+        return np.array(self.frames_array[self.position])
+
+    def close(self):
+        self.frames_array = None
+
+
+class OpenCVWriter:
+    '''
+    Encodes a video with cv2.VideoWriter
+    '''
+
+    def __init__(self, path, fps, size, codec='mp4v'):
+        '''
+        :param path: File system path of the video
+        :param fps: frames per second
+        :param size: (width, height) of the frames
+        :param codec: fourcc of the codec
+        '''
+        if len(codec) != 4:
+            raise IOError('OpenCV codecs are fourcc codes, not ' + codec)
+        self.writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*codec), fps, size)
+        if not self.writer.isOpened():
+            raise IOError('OpenCV cannot write ' + path + ' with codec ' + codec)
+
+    def write(self, frame):
+        '''
+        :param frame: an RGB picture
+        :return: Nothing
+        '''
+        self.writer.write(cv2.cvtColor(frame, cv2.COLOR_RGB2BGR))
+
+    def close(self):
+        self.writer.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class FFmpegWriter:
+    '''
+    Encodes a video with an ffmpeg process, writing the raw RGB frames to a pipe.
+    The options are checked when the writer is created, encoding a black frame, so a missing encoder or an invalid
+    option raises an IOError before the video is processed (and open_writer can fall back to another backend)
+    '''
+
+    def __init__(self, path, fps, size, codec='libx264', preset=None, threads=None, pixel_format='yuv420p',
+                 extra_args=(), ffmpeg='ffmpeg', probe=True):
+        '''
+        :param path: File system path of the video
+        :param fps: frames per second
+        :param size: (width, height) of the frames
+        :param codec: ffmpeg encoder, e.g. libx264, libx265 or mpeg4
+        :param preset: encoder preset (e.g. ultrafast or slow for libx264), None uses the default of the encoder
+        :param threads: number of encoder threads, None lets ffmpeg choose
+        :param pixel_format: pixel format of the video
+        :param extra_args: more ffmpeg output options, e.g. ('-crf', '20')
+        :param ffmpeg: the ffmpeg executable
+        :param probe: whether to check the options before starting the encoder
+        '''
+        args = [ffmpeg, '-y', '-v', 'error', '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', '{}x{}'.format(*size),
+                '-r', repr(float(fps)), '-i', '-', '-an', '-c:v', codec, '-pix_fmt', pixel_format]
+        if preset is not None:
+            args += ['-preset', preset]
+        if threads is not None:
+            args += ['-threads', str(threads)]
+        args += list(extra_args)
+        self.process = None
+        if probe:
+            self._probe(args, size)
+        self.process = subprocess.Popen(args + [path], stdin=subprocess.PIPE)
+
+    def _probe(self, args, size):
+        # encodes a black frame with the same options, discarding the result
+        black = bytes(size[0] * size[1] * 3)
+        probe = subprocess.run(args + ['-frames:v', '1', '-f', 'null', '-'], input=black, stdout=subprocess.DEVNULL,
+                               stderr=subprocess.PIPE)
+        if probe.returncode != 0:
+            raise IOError('ffmpeg cannot encode with these options: ' +
+                          probe.stderr.decode(errors='replace').strip())
+
+    def write(self, frame):
+        '''
+        :param frame: an RGB picture
+        :return: Nothing
+        '''
+        try:
+            self.process.stdin.write(memoryview(np.ascontiguousarray(frame, dtype=np.uint8)).cast('B'))
+        except BrokenPipeError:
+            # the encoder has stopped, e.g. the disk is full
+            raise IOError('ffmpeg exited with code {}'.format(self.process.wait()))
+
+    def close(self):
+        if self.process is not None:
+            try:
+                self.process.stdin.close()
+            except BrokenPipeError:
+                # the encoder has already stopped, its exit code tells why
+                pass
+            returncode = self.process.wait()
+            self.process = None
+            if returncode != 0:
+                raise IOError('ffmpeg failed with exit code {}'.format(returncode))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class MoviePyWriter:
+    '''
+    Encodes a video with moviepy, when neither OpenCV nor ffmpeg can
+    '''
+
+    def __init__(self, path, fps, size, codec='libx264', preset='medium', threads=None):
+        '''
+        :param path: File system path of the video
+        :param fps: frames per second
+        :param size: (width, height) of the frames
+        :param codec: ffmpeg encoder
+        :param preset: encoder preset
+        :param threads: number of encoder threads, None lets ffmpeg choose
+        '''
+        # imported only here, so the other backends don't pay for loading moviepy
+        from moviepy.video.io.ffmpeg_writer import FFMPEG_VideoWriter
+        self.writer = FFMPEG_VideoWriter(path, size, fps, codec=codec, preset=preset, threads=threads)
+
+    def write(self, frame):
+        self.writer.write_frame(frame)
+
+    def close(self):
+        self.writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class NpyWriter:
+    '''
+    Dumps the raw RGB frames to a .npy file, which np.load reads back as an array of shape (frames, height, width, 3)
+    '''
+
+    def __init__(self, path, fps, size, append=False):
+        '''
+        :param path: File system path of the .npy file
+        :param fps: frames per second, not stored
+        :param size: (width, height) of the frames
+        :param append: if True, the frames are added to the ones already in the file
+        '''
+        self.file = NpyAppender(path, np.uint8, (size[1], size[0], 3), append)
+
+    def write(self, frame):
+        self.file.write(frame[np.newaxis])
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+# the video backends by name. open_reader and open_writer try them in this order, when no backend is chosen
+READERS = OrderedDict([('opencv', OpenCVReader), ('ffmpeg', FFmpegReader), ('moviepy', MoviePyReader),
+                       ('npy', NpyReader)])
+WRITERS = OrderedDict([('ffmpeg', FFmpegWriter), ('opencv', OpenCVWriter), ('moviepy', MoviePyWriter),
+                       ('npy', NpyWriter)])
+
+
+def is_npy(path):
+    '''
+    :return: whether the path is the one of a raw .npy dump
+    '''
+    return os.path.splitext(path)[1].lower() == '.npy'
+
+
+def _candidates(path, backend, backends):
+    if backend is not None:
+        return [backend]
+    if is_npy(path):
+        return ['npy']
+    # ffmpeg is only tried if it is installed
+    return [name for name in backends if name != 'npy' and (name != 'ffmpeg' or shutil.which('ffmpeg') is not None)]
+
+
+def _backend_options(backend_class, options, backend):
+    # a backend tried in turn only receives the options it accepts (e.g. not the preset of ffmpeg), while a backend
+    # chosen explicitly receives all of them, so a misspelled option is an error
+    if backend is not None:
+        return options
+    parameters = inspect.signature(backend_class.__init__).parameters
+    return {name: value for name, value in options.items() if name in parameters}
+
+
+def open_reader(path, backend=None, **options):
+    '''
+    :param path: File system path of the video, or of a .npy dump
+    :param backend: name of the backend in READERS, None uses the first one that can open the video
+    :param options: options of the backend. When the backend is not chosen, every backend tried receives the options
+    it accepts
+    :return: a VideoReader
+    '''
+    errors = []
+    for name in _candidates(path, backend, READERS):
+        try:
+            return READERS[name](path, **_backend_options(READERS[name], options, backend))
+        except (IOError, OSError, ImportError, subprocess.CalledProcessError) as e:
+            errors.append('{}: {}'.format(name, e))
+    raise IOError('cannot read {} ({})'.format(path, '; '.join(errors)))
+
+
+def open_writer(path, fps, size, backend=None, **options):
+    '''
+    :param path: File system path of the video, or of a .npy dump
+    :param fps: frames per second
+    :param size: (width, height) of the frames
+    :param backend: name of the backend in WRITERS, None uses the first one that can write the video
+    :param options: options of the backend, e.g. the codec. When the backend is not chosen, every backend tried
+    receives the options it accepts, and the ones that can't use them (e.g. OpenCV with the codec libx264) are skipped
+    :return: a writer, with the methods write(frame) and close()
+    '''
+    errors = []
+    for name in _candidates(path, backend, WRITERS):
+        try:
+            return WRITERS[name](path, fps, size, **_backend_options(WRITERS[name], options, backend))
+        except (IOError, OSError, ImportError) as e:
+            errors.append('{}: {}'.format(name, e))
+    raise IOError('cannot write {} ({})'.format(path, '; '.join(errors)))
+
+
+def read_ahead(frames, size=8):
+    '''
+    Decodes frames on a separate thread, keeping some of them ready
+    :param frames: iterable of frames, e.g. VideoReader.frames()
+    :param size: maximum number of frames decoded in advance
+    :return: generator of the same frames
+    '''
+    ready = queue.Queue(size)
+    stop = threading.Event()
+    errors = []
+
+    def put(item):
+        # blocks while the queue is full, unless the frames are not needed anymore
+        while not stop.is_set():
+            try:
+                ready.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def decode():
+        try:
+            for frame in frames:
+                if not put(frame):
+                    return
+        except BaseException as e:
+            errors.append(e)
+        put(_END)
+
+    thread = threading.Thread(target=decode, daemon=True)
+    thread.start()
+    try:
+        item = ready.get()
+        while item is not _END:
+            yield item
+            item = ready.get()
+        if errors:
+            raise errors[0]
+    finally:
+        stop.set()
+        thread.join()
@@ -0,0 +1,127 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import TestCase, mock
+
+import numpy as np
+
+import videoIO
+
+
+def frame_with_index(idx, size=(128, 96)):
+    '''
+    :return: a frame showing the bits of its index as black and white stripes, which survive a lossy codec
+    '''
+    bits = (idx >> np.arange(8)) & 1
+    stripes = np.repeat(bits * 255, size[0] // 8).astype(np.uint8)
+    return np.repeat(np.repeat(stripes[np.newaxis, :, np.newaxis], size[1], axis=0), 3, axis=2)
+
+
+def index_of_frame(frame):
+    stripe_width = frame.shape[1] // 8
+    bits = frame[:, stripe_width // 2::stripe_width, 0].mean(axis=0) > 127
+    return int(np.sum(bits << np.arange(8)))
+
+
+class VideoIOTest(TestCase):
+    '''
+    Writes videos with every backend available, and checks that the frames are read back in order from any frame
+    '''
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write_video(self, name, frames=60, backend=None):
+        path = os.path.join(self.directory, name)
+        with videoIO.open_writer(path, 25, (128, 96), backend) as writer:
+            for idx in range(frames):
+                writer.write(frame_with_index(idx))
+        return path
+
+    def assertSeeks(self, reader, frames=60):
+        self.assertEqual((128, 96), reader.size)
+        self.assertEqual(list(range(frames)), [index_of_frame(frame) for frame in reader.frames()])
+        self.assertIsNone(reader.read())
+        for idx in [37, 5, frames - 1, 0, 24]:
+            reader.seek(idx)
+            self.assertEqual(idx, index_of_frame(reader.read()))
+        reader.seek_time(1.0)
+        self.assertEqual(25, index_of_frame(reader.read()))
+        self.assertEqual(list(range(10, 20)), [index_of_frame(frame) for frame in reader.frames(10, 20)])
+
+    def test_opencv(self):
+        path = self.write_video('video.mp4', backend='opencv')
+        with videoIO.open_reader(path, 'opencv') as reader:
+            self.assertEqual(60, reader.frame_count)
+            self.assertEqual(25, reader.fps)
+            self.assertSeeks(reader)
+
+    @unittest.skipIf(shutil.which('ffmpeg') is None or shutil.which('ffprobe') is None, 'ffmpeg is not installed')
+    def test_ffmpeg(self):
+        path = self.write_video('video.mp4', backend='ffmpeg')
+        with videoIO.open_reader(path, 'ffmpeg') as reader:
+            self.assertSeeks(reader)
+
+    @unittest.skipIf(shutil.which('ffmpeg') is None, 'ffmpeg is not installed')
+    def test_ffmpeg_unknown_encoder(self):
+        with self.assertRaises(IOError):
+            videoIO.FFmpegWriter(os.path.join(self.directory, 'video.mp4'), 25, (128, 96), codec='no_such_encoder')
+
+    @unittest.skipIf(shutil.which('false') is None, 'no false executable')
+    def test_ffmpeg_failures_are_found_before_encoding(self):
+        # an ffmpeg that fails whatever it is asked
+        with self.assertRaises(IOError):
+            videoIO.FFmpegWriter(os.path.join(self.directory, 'video.mp4'), 25, (128, 96), ffmpeg='false')
+
+    @unittest.skipIf(shutil.which('false') is None, 'no false executable')
+    def test_fallback_with_ffmpeg_options(self):
+        path = os.path.join(self.directory, 'video.mp4')
+        # an ffmpeg that is installed, but fails whatever it is asked
+        with mock.patch.object(videoIO.shutil, 'which', return_value='false'):
+            writer = videoIO.open_writer(path, 25, (128, 96), preset='fast', threads=2, ffmpeg='false')
+            self.assertIsInstance(writer, videoIO.OpenCVWriter)
+            writer.close()
+
+            # OpenCV can't use an ffmpeg encoder: it is skipped like ffmpeg
+            try:
+                writer = videoIO.open_writer(path, 25, (128, 96), codec='libx264', preset='fast', ffmpeg='false')
+            except IOError as e:
+                self.assertIn('opencv', str(e))
+            else:
+                self.assertIsInstance(writer, videoIO.MoviePyWriter)
+                writer.close()
+
+    def test_npy(self):
+        path = self.write_video('video.npy')
+        frames = np.load(path)
+        self.assertEqual((60, 96, 128, 3), frames.shape)
+        np.testing.assert_array_equal(frame_with_index(59), frames[59])
+        with videoIO.open_reader(path) as reader:
+            self.assertIsInstance(reader, videoIO.NpyReader)
+            self.assertSeeks(reader)
+
+    def test_read_ahead(self):
+        path = self.write_video('video.npy')
+        with videoIO.open_reader(path) as reader:
+            frames = videoIO.read_ahead(reader.frames(), 4)
+            self.assertEqual(list(range(60)), [index_of_frame(frame) for frame in frames])
+            # stopping early stops the decoding thread
+            frames = videoIO.read_ahead(reader.frames(), 2)
+            self.assertEqual(0, index_of_frame(next(frames)))
+            frames.close()
+
+        def broken():
+            yield frame_with_index(0)
+            raise IOError('broken stream')
+        with self.assertRaises(IOError):
+            list(videoIO.read_ahead(broken()))
+
+    def test_unreadable(self):
+        path = os.path.join(self.directory, 'video.mp4')
+        with open(path, 'w') as f:
+            f.write('not a video')
+        with self.assertRaises(IOError):
+            videoIO.open_reader(path, 'opencv')
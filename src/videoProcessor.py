@@ -0,0 +1,153 @@
+import math
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from cameraCalibrator import CameraCalibrator
+from npyAppender import NpyAppender
+from pipeline import Pipeline
+from videoIO import is_npy, open_reader, open_writer, read_ahead
+
+
+class VideoProcessor:
+    '''
+    Runs the pipeline on a video using several processes.
+    The video is split in chunks of consecutive frames, and every chunk is processed by a separate Pipeline instance.
+    Every chunk starts some frames earlier (warm up), so the history of the detected lines has converged when the
+    first frame of the chunk is emitted. The chunks are finally joined in order.
+    The videos are read and written through videoIO, so every chunk starts exactly at its first frame
+    '''
+
+    def __init__(self, camera_calibrator=None, workers=None, chunk_frames=None, warmup_frames=25,
+                 pipeline_factory=Pipeline, reader=None, writer=None, writer_options=None, read_ahead_frames=8):
+        '''
+        :param camera_calibrator: the CameraCalibrator shared by all the pipelines
+        :param workers: number of processes, None uses all the CPUs
+        :param chunk_frames: number of frames per chunk, None splits the video in one chunk per process
+        :param warmup_frames: number of frames processed (and discarded) before the first frame of every chunk
+        :param pipeline_factory: callable creating a new pipeline from a CameraCalibrator. Must be picklable
+        :param reader: name of the backend decoding the video (see videoIO.READERS), None chooses one
+        :param writer: name of the backend encoding the video (see videoIO.WRITERS), None chooses one. An output
+        path ending with .npy is written as a raw dump of the frames
+        :param writer_options: options of the writer, e.g. {'codec': 'libx264', 'preset': 'fast', 'threads': 2}
+        :param read_ahead_frames: number of frames every process decodes in advance, on a separate thread
+        '''
+        self.camera_calibrator = CameraCalibrator() if camera_calibrator is None else camera_calibrator
+        self.workers = os.cpu_count() if workers is None else workers
+        self.chunk_frames = chunk_frames
+        self.warmup_frames = warmup_frames
+        self.pipeline_factory = pipeline_factory
+        self.reader = reader
+        self.writer = writer
+        self.writer_options = {} if writer_options is None else writer_options
+        self.read_ahead_frames = read_ahead_frames
+
+    def process(self, input_path, output_path):
+        '''
+        Detects the lane lines on every frame of a video
+        :param input_path: File system path of the video to process
+        :param output_path: File system path where the annotated video is written
+        :return: Nothing
+        '''
+        # calibrate (or load the calibration) once, instead of in every process
+        if self.camera_calibrator.mtx is None:
+            self.camera_calibrator.initialize_transformation_matrix()
+
+        with open_reader(input_path, self.reader) as reader:
+            frame_count, fps, size = reader.frame_count, reader.fps, reader.size
+
+        tmp_dir = tempfile.mkdtemp(prefix='chunks_', dir=os.path.dirname(os.path.abspath(output_path)))
+        try:
+            chunks = self.split(frame_count)
+            # the chunks have the format of the output, so they can be joined without encoding them again
+            extension = os.path.splitext(output_path)[1]
+            tasks = [(input_path, os.path.join(tmp_dir, 'chunk_{:05d}{}'.format(idx, extension)), start, end, fps,
+                      size) for idx, (start, end) in enumerate(chunks)]
+            if self.workers == 1 or len(tasks) == 1:
+                chunk_paths = [self._process_chunk(task) for task in tasks]
+            else:
+                with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                    # the results of executor.map keep the order of the chunks
+                    chunk_paths = list(executor.map(self._process_chunk, tasks))
+            join_videos(chunk_paths, output_path, fps, size, self.writer, **self.writer_options)
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def split(self, frame_count):
+        '''
+        :param frame_count: number of frames of the video
+        :return: list of (start, end) frame indexes of the chunks. The end of the last chunk is None, so the frames
+        are read until the end of the video even if the frame count reported by the container is not exact
+        '''
+        chunk_frames = self.chunk_frames
+        if chunk_frames is None:
+            chunk_frames = max(1, int(math.ceil(frame_count / float(max(1, self.workers)))))
+        starts = list(range(0, max(frame_count, 1), chunk_frames))
+        ends = starts[1:] + [None]
+        return list(zip(starts, ends))
+
+    def _process_chunk(self, task):
+        input_path, chunk_path, start, end, fps, size = task
+        pipeline = self.pipeline_factory(camera_calibrator=self.camera_calibrator)
+
+        # start from the first warm up frame
+        first = max(0, start - self.warmup_frames)
+        with open_reader(input_path, self.reader) as reader, \
+                open_writer(chunk_path, fps, size, self.writer, **self.writer_options) as writer:
+            for idx, frame in enumerate(read_ahead(reader.frames(first, end), self.read_ahead_frames), first):
+                final = pipeline.pipeline(frame)
+                if idx >= start:
+                    writer.write(final)
+        return chunk_path
+
+
+def join_videos(paths, output_path, fps, size, writer=None, **writer_options):
+    '''
+    Concatenates videos with the same format.
+    Raw .npy dumps are just appended. For the other videos ffmpeg is used when available, since it just copies the
+    streams, otherwise the frames are encoded again
+    :param paths: File system paths of the videos, in order
+    :param output_path: File system path of the concatenated video
+    :param fps: frames per second of the videos
+    :param size: (width, height) of the videos
+    :param writer: name of the backend encoding the concatenated video, when it has to be encoded again
+    :param writer_options: options of the writer
+    :return: Nothing
+    '''
+    if is_npy(output_path):
+        with NpyAppender(output_path, np.uint8, (size[1], size[0], 3)) as output:
+            for path in paths:
+                frames = np.load(path, mmap_mode='r')
+                # a few frames at a time, so the chunk is not loaded in memory
+                for idx in range(0, len(frames), 32):
+                    output.write(frames[idx:idx + 32])
+        return
+
+    ffmpeg = shutil.which('ffmpeg')
+    if ffmpeg is not None:
+        list_path = output_path + '.txt'
+        with open(list_path, 'w') as f:
+            for path in paths:
+                f.write("file '" + os.path.abspath(path) + "'\n")
+        try:
+            subprocess.check_call([ffmpeg, '-y', '-loglevel', 'error', '-f', 'concat', '-safe', '0',
+                                   '-i', list_path, '-c', 'copy', output_path])
+        finally:
+            os.remove(list_path)
+        return
+
+    with open_writer(output_path, fps, size, writer, **writer_options) as output:
+        for path in paths:
+            with open_reader(path) as reader:
+                for frame in reader.frames():
+                    output.write(frame)
+
+
+if __name__ == '__main__':
+    # usage: python videoProcessor.py input.mp4 output.mp4 [workers]
+    VideoProcessor(workers=int(sys.argv[3]) if len(sys.argv) > 3 else None).process(sys.argv[1], sys.argv[2])
@@ -0,0 +1,49 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+import matplotlib.image as mpimg
+import numpy as np
+
+from cameraCalibrator import CameraCalibrator
+from pipeline import Pipeline
+from videoProcessor import VideoProcessor
+
+
+class VideoProcessorTest(TestCase):
+    '''
+    Checks how VideoProcessor splits a video in chunks
+    '''
+    def test_split_in_one_chunk_per_worker(self):
+        processor = VideoProcessor(camera_calibrator=CameraCalibrator(), workers=4)
+        self.assertEqual([(0, 250), (250, 500), (500, 750), (750, None)], processor.split(1000))
+
+    def test_split_in_fixed_chunks(self):
+        processor = VideoProcessor(camera_calibrator=CameraCalibrator(), workers=2, chunk_frames=300)
+        self.assertEqual([(0, 300), (300, 600), (600, 900), (900, None)], processor.split(1000))
+
+
+class VideoProcessorChunksTest(TestCase):
+    '''
+    Processes a raw .npy video in chunks, checking that the chunks start exactly at their first frame
+    '''
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_chunks_are_frame_accurate(self):
+        frames = np.array([mpimg.imread('../test_images/test' + str(idx) + '.jpg') for idx in [1, 2, 3, 4, 5, 6, 1]])
+        input_path = os.path.join(self.directory, 'input.npy')
+        output_path = os.path.join(self.directory, 'output.npy')
+        np.save(input_path, frames)
+
+        # the warm up of every chunk starts from the first frame, so the result is the same as the whole video
+        processor = VideoProcessor(camera_calibrator=CameraCalibrator(), workers=1, chunk_frames=3, warmup_frames=6)
+        processor.process(input_path, output_path)
+
+        pipeline = Pipeline()
+        expected = [pipeline.pipeline(frame) for frame in frames]
+        np.testing.assert_array_equal(np.array(expected), np.load(output_path))